@@ -12,19 +12,19 @@ LLMAAS_OPENAI_API_KEY = os.environ.get("LLMAAS_OPENAI_API_KEY")
 
 # %%
 from langgraph.graph import MessagesState
-from langchain_tavily import TavilySearch, TavilyExtract
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
 from langchain_openai import ChatOpenAI
 from langgraph.prebuilt import ToolNode, tools_condition
 from langgraph.graph import MessagesState
 from langgraph.graph import StateGraph, START, END
-from langgraph.checkpoint.memory import MemorySaver
 import random
+import uuid
 
 # Parse LLM output
 from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional, Dict, Any
 from langchain_core.output_parsers.pydantic import PydanticOutputParser
+from langchain_core.runnables import RunnableConfig
 from langchain_core.prompts.chat import HumanMessagePromptTemplate
 import json
 
@@ -33,6 +33,8 @@ import customLogging
 
 #For Throttling
 import time
+import threading
+from collections import OrderedDict
 
 #For Statistics
 import ai_counter
@@ -40,6 +42,15 @@ import ai_counter
 #Custom imports
 from config import Config
 from prompt_template import SECTION_TEMPLATES, messagePromptInstruction
+from tool_executor import ConcurrentToolNode
+import transport
+from evidence_store import EvidenceStore
+import postprocess
+import hedging
+import checkpoint_store
+import name_variants
+import profiling
+import search_stats
 
 # Initialize global tracker
 usage_tracker = ai_counter.UsageTracker()
@@ -111,33 +122,118 @@ def embed_in_transaction_format(sections_json_str: str, transaction_id: str) ->
 
     return wrapper
 
+def salvage_sections(sections_json_str: str) -> List[Dict[str, Any]]:
+    """
+    Recover the complete section objects from a truncated or malformed JSON array
+
+    Returns:
+        List of the sections that parsed completely, in order
+    """
+    clean_json_str = sections_json_str.replace('```json\n', '').replace('\n```', '')
+    decoder = json.JSONDecoder()
+    sections = []
+    index = clean_json_str.find('[') + 1
+    while 0 < index < len(clean_json_str):
+        while index < len(clean_json_str) and clean_json_str[index] in ' \t\r\n,':
+            index += 1
+        try:
+            section, index = decoder.raw_decode(clean_json_str, index)
+        except ValueError:
+            break
+        if isinstance(section, dict) and "label" in section:
+            sections.append(section)
+    return sections
+
+def embed_partial_result(sections_json_str: str, transaction_id: str, partial: bool):
+    """
+    Embed the model output into transaction format, falling back to the complete sections
+    when the output does not parse; the result is marked "partial" when incomplete
+    """
+    try:
+        wrapper = embed_in_transaction_format(sections_json_str, transaction_id)
+    except ValueError:
+        if not partial:
+            raise
+        sections = salvage_sections(sections_json_str)
+        logger.warning(f"Deadline output did not parse, salvaged {len(sections)} complete sections")
+        wrapper = {"TransactionId": transaction_id, "InfoSectionList": sections}
+    if partial:
+        wrapper["partial"] = True
+    return wrapper
+
+def deadline_reached(config, reserve=Config.DEADLINE_FINAL_ANSWER_RESERVE) -> bool:
+    """True when less than reserve seconds remain before the deadline in the run config"""
+    deadline = (config or {}).get("configurable", {}).get("deadline")
+    return deadline is not None and time.monotonic() >= deadline - reserve
+
+def report_progress(config, event, **data):
+    """Forward a progress event to the callback in the run config, if any (see job_queue.JobProgress)"""
+    progress = (config or {}).get("configurable", {}).get("progress")
+    if progress is not None:
+        progress(event, **data)
+
 
 # %%
 # Create the Tavily search tool
-def initialize_tavily_tools(max_results=Config.TAVILY_MAXSEARCH, search_topic=Config.TAVILY_SEARCHTOPIC):
+def initialize_tavily_tools(max_results=Config.TAVILY_MAXSEARCH, search_topic=Config.TAVILY_SEARCHTOPIC, search_depth=None):
     """
     Initialize Tavily search and extract tools
     
     Args:
         max_results (int): Maximum search results to return
         search_topic (str): Topic for search filtering
+        search_depth (str): "basic" or "advanced", None for the Tavily default
     
     Returns:
-        tuple: (tavily_search_tool, tavily_extract_tool)
+        tuple: (tavily_search_tool, tavily_extract_tool), the extract tool being the shared
+            one of get_extract_tool() and None while the evidence store is disabled
     """
     # Initialize Tavily Search Tool
-    tavily_search_tool = TavilySearch(
+    tavily_search_tool = transport.PooledTavilySearch(
         max_results=max_results or 5,  # Default to 5 if not provided
         topic=search_topic or "general",  # Default topic
         summarize=True,  # Enable summarization
+        search_depth=search_depth,
+        api_wrapper=transport.PooledTavilySearchAPIWrapper(),  # Shared keep-alive session with retries
     )
     
-    # Initialize Tavily Extract Tool
-    tavily_extract_tool = TavilyExtract()
-    
-    return tavily_search_tool, tavily_extract_tool
+    return tavily_search_tool, get_extract_tool()
+
+_extract_tool = None
+_extract_tool_lock = threading.Lock()
 
-def initialize_chat_model(api_key=LLMAAS_OPENAI_API_KEY, api_base=Config.LLMAAS_BASEURL, model_name=Config.LLMAAS_MODELNAME, tools=None, temperature=Config.LLM_TEMPERATURE):
+def get_extract_tool():
+    """
+    Return the Tavily extract tool of the evidence store, built once per container
+
+    Returns:
+        transport.PooledTavilyExtract or None: None while Config.EVIDENCE_STORE_ENABLED is off
+    """
+    global _extract_tool
+    if not Config.EVIDENCE_STORE_ENABLED:
+        return None
+    with _extract_tool_lock:
+        if _extract_tool is None:
+            logger.info("Initialize Tavily Extract Tool")
+            _extract_tool = transport.PooledTavilyExtract(apiwrapper=transport.PooledTavilyExtractAPIWrapper())
+        return _extract_tool
+
+def guardrail_extra_body(guardrail_profile=None):
+    """
+    Build the LLMaaS extra_body for a guardrail profile in Config.GUARDRAIL_PROFILES
+
+    Returns:
+        dict or None: None keeps the platform default guardrails
+    """
+    if guardrail_profile is None:
+        return None
+    if guardrail_profile not in Config.GUARDRAIL_PROFILES:
+        raise ValueError(f"Unknown guardrail profile '{guardrail_profile}'. Available profiles: {list(Config.GUARDRAIL_PROFILES.keys())}")
+    guardrails = Config.GUARDRAIL_PROFILES[guardrail_profile]
+    return {"llmaas": {"guardrails": guardrails}} if guardrails is not None else None
+
+def initialize_chat_model(api_key=LLMAAS_OPENAI_API_KEY, api_base=Config.LLMAAS_BASEURL, model_name=Config.LLMAAS_MODELNAME, tools=None, temperature=Config.LLM_TEMPERATURE,
+                          guardrail_profile=None):
     """
     Initialize ChatOpenAI model with optional tools binding
     
@@ -146,6 +242,7 @@ def initialize_chat_model(api_key=LLMAAS_OPENAI_API_KEY, api_base=Config.LLMAAS_
         api_base (str): Base URL for API
         model_name (str): Model name to use
         tools (list): List of tools to bind to model
+        guardrail_profile (str): Name of a Config.GUARDRAIL_PROFILES entry, None for the platform default
     
     Returns:
         ChatOpenAI: Configured chat model
@@ -155,6 +252,10 @@ def initialize_chat_model(api_key=LLMAAS_OPENAI_API_KEY, api_base=Config.LLMAAS_
         openai_api_base=api_base,
         model=model_name or "gpt-4o-mini-prd-gcc2-lb",
         temperature=0 or temperature,
+        http_client=transport.get_llm_http_client(),  # Shared keep-alive pool
+        timeout=transport.LLM_TIMEOUT,
+        max_retries=0,  # Retries are handled by the transport
+        extra_body=guardrail_extra_body(guardrail_profile),
     )
     
     if tools:
@@ -163,7 +264,9 @@ def initialize_chat_model(api_key=LLMAAS_OPENAI_API_KEY, api_base=Config.LLMAAS_
     return model
 
 #Create Assistant Node
-def create_assistant_node(model_with_tools, system_message=SystemMessage(content=Config.SYSTEM_CONTENT),throttleSec=Config.THROTTLESPEED,model_name="gpt4omini"):
+def create_assistant_node(model_with_tools, system_message=SystemMessage(content=Config.SYSTEM_CONTENT),throttleSec=Config.THROTTLESPEED,model_name="gpt4omini",
+                          guardrail_profile=None, hedge_policy=None, final_model=None, max_tool_rounds=None,
+                          context_budget=None):
     """
     Create assistant node function for the graph
     
@@ -171,11 +274,37 @@ def create_assistant_node(model_with_tools, system_message=SystemMessage(content
         model_with_tools: Chat model with tools bound
         system_message: Optional system message to prepend
         enable_streaming: Whether to enable streaming output
+        guardrail_profile: Guardrail profile of the model, used to label latency metrics
+        hedge_policy: Optional hedging.HedgePolicy applied to each model call
+        final_model: Tool-free model used to force a final answer once the run deadline approaches
+        max_tool_rounds: Force the final answer after this many search rounds, None for no limit
+        context_budget: Force the final answer once the conversation reaches this many tokens, None for no limit
     Returns:
         function: Assistant node function
     """
-    def assistant(state: MessagesState):
+    def force_reason(messages, config):
+        if final_model is None:
+            return None
+        if deadline_reached(config):
+            return "deadline"
+        if max_tool_rounds is not None:
+            rounds = sum(1 for message in messages_since_last_human(messages) if getattr(message, "tool_calls", None))
+            if rounds >= max_tool_rounds:
+                return "tool_rounds"
+        if context_budget is not None and ai_counter.count_messages_tokens(messages, model_name) >= context_budget:
+            return "context_budget"
+        return None
+
+    def assistant(state: MessagesState, config: RunnableConfig):
         messages = state['messages']
+        model = model_with_tools
+        reason = force_reason(messages, config)
+        forced = reason == "deadline"
+        if reason:
+            logger.warning(f"Forcing a final answer without further searches ({reason} limit reached)")
+            model = final_model
+            prompt = Config.DEADLINE_FINAL_ANSWER_PROMPT if forced else Config.SEARCH_LIMIT_FINAL_ANSWER_PROMPT
+            messages = list(messages) + [HumanMessage(content=prompt)]
         
         # Log incoming request with timestamp
         logger.info(f"Assistant node called with {len(messages)} messages")
@@ -201,10 +330,25 @@ def create_assistant_node(model_with_tools, system_message=SystemMessage(content
         # Increment request counter
         usage_tracker.increment_request()
 
-        response = model_with_tools.invoke(messages)
+        invoke_start = time.perf_counter()
+        if hedge_policy:
+            response = hedge_policy.invoke(model.invoke, messages)
+        else:
+            response = model.invoke(messages)
+        if forced:
+            response.response_metadata["deadline_forced"] = True
+        if reason:
+            response.response_metadata["forced_reason"] = reason
+        add_variant_searches(response, state['messages'], config)
+        if getattr(response, "tool_calls", None):
+            report_progress(config, "tool_round")
+            ai_counter.record_tool_round()
+        invoke_seconds = time.perf_counter() - invoke_start
 
         # Count output tokens
         output_tokens = ai_counter.count_tokens(response.content, model_name)
+        ai_counter.latency_tracker.record(f"llm:guardrail:{guardrail_profile or 'default'}", invoke_seconds,
+                                          tokens=input_tokens + output_tokens)
 
         # Update token counters
         usage_tracker.add_tokens(input_tokens, output_tokens)
@@ -236,7 +380,7 @@ def build_graph(assistant_node, tavily_search_tool, use_memory=True):
 
     graph_builder = StateGraph(MessagesState)
     graph_builder.add_node('assistant', assistant_node)
-    graph_builder.add_node('tools', ToolNode(tavily_search_tool))
+    graph_builder.add_node('tools', ConcurrentToolNode(tavily_search_tool))
     graph_builder.set_entry_point('assistant')
     graph_builder.add_conditional_edges(
         'assistant',
@@ -245,8 +389,8 @@ def build_graph(assistant_node, tavily_search_tool, use_memory=True):
     graph_builder.add_edge('tools','assistant')
     graph_builder.set_finish_point('assistant')
 
-    #add memory
-    memory = MemorySaver() if use_memory else None
+    #add memory, shared across graphs and bounded in size
+    memory = checkpoint_store.checkpointer if use_memory else None
     graph = graph_builder.compile(checkpointer=memory)
     logger.info("Graph compilation completed")
 
@@ -256,63 +400,326 @@ def build_graph(assistant_node, tavily_search_tool, use_memory=True):
 # %%
 
 
-def process_messages(name=None, countryName=None, designation="", transaction_id="", system_content_template=Config.SYSTEM_CONTENT,
-                    human_message_template=Config.HUMAN_MESSAGE_TEMPLATE, sectionNameList=["main_particulars","education","career","appointments","reference"], 
-                    graph=None):
-
-    sectionInstructions = [messagePromptInstruction(sectionName) for sectionName in sectionNameList]
-    output_format = sections_to_json(sectionName for sectionName in sectionNameList)
-    logger.info(f"Output format of the human message: {output_format}")
-
-    formatted_human_message_template = human_message_template.format(
-        name=name,
-        countryName=countryName,
-        designation=designation,
-        sectionInstructions=sectionInstructions,
-        output_format=output_format
-    )
-    
-    # Create the message objects
-
-    human_message = HumanMessage(content=formatted_human_message_template)
-    logger.info(f"Generated full human message: {human_message}")
-
+def resolve_thread_id(transaction_id=""):
+    """Use the transaction id as thread id, generating one if none is given"""
     if transaction_id == "":
         logger.info("No transaction id is given.  To generate a transaction id. ")
         thread_id = str(random.randint(1, 1000000))
-        logger.info(f"Generated Transaction ID is {transaction_id}")
+        logger.info(f"Generated Transaction ID is {thread_id}")
     else:
         logger.info(f"Transaction ID is {transaction_id}")
         thread_id = transaction_id
+    return thread_id
 
-    thread = {"configurable": {"thread_id": thread_id}}
-
-    # Check if this is a new thread and initialize if needed
+def initialize_thread(graph, thread, system_content):
+    """Seed a new thread with the system message; existing threads are left untouched"""
+    thread_id = thread["configurable"]["thread_id"]
     try:
         state = graph.get_state(thread)
         if not state.values.get('messages'):
             # New thread - initialize with system message
             logger.info(f"Initializing new thread {thread_id} with system message")
-            graph.update_state(thread, {"messages": [SystemMessage(content=system_content_template)]})
+            graph.update_state(thread, {"messages": [SystemMessage(content=system_content)]})
         else:
             logger.info(f"Thread {thread_id} already has {len(state.values['messages'])} messages")
     except Exception as e:
         # Thread doesn't exist or error occurred - initialize with system message
         logger.info(f"Thread {thread_id} doesn't exist or error occurred: {e}")
         logger.info(f"Creating and initializing thread {thread_id}")
-        graph.update_state(thread, {"messages": [SystemMessage(content=Config.SYSTEM_CONTENT)]})
+        graph.update_state(thread, {"messages": [SystemMessage(content=system_content)]})
+
+def messages_since_last_human(messages):
+    """Return the messages produced by the current run, i.e. after the last human message"""
+    for index in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[index], HumanMessage):
+            return messages[index + 1:]
+    return list(messages)
+
+def extract_search_results(messages) -> List[Dict[str, Any]]:
+    """
+    Collect Tavily search results from tool messages, de-duplicated by URL
+
+    Args:
+        messages: Messages of a graph run
+    Returns:
+        List of result dicts with url, title and content, in the order first seen
+    """
+    results = {}
+    for message in messages:
+        if not isinstance(message, ToolMessage) or getattr(message, "status", None) == "error":
+            continue
+        try:
+            payload = json.loads(message.content)
+        except (TypeError, ValueError):
+            continue
+        if not isinstance(payload, dict):
+            continue
+        for result in payload.get("results", []):
+            url = result.get("url")
+            if url and url not in results:
+                results[url] = {"url": url, "title": result.get("title") or url, "content": result.get("content") or ""}
+    return list(results.values())
+
+def compact_evidence(results, max_results=Config.EVIDENCE_MAX_RESULTS, max_chars=Config.EVIDENCE_MAX_CHARS) -> str:
+    """Render search results as a numbered, truncated evidence list for the formatting call"""
+    lines = []
+    for index, result in enumerate(results[:max_results], start=1):
+        content = " ".join(result["content"].split())[:max_chars]
+        lines.append(f"[{index}] {result['title']} ({result['url']})\n{content}")
+    return "\n\n".join(lines) if lines else "No evidence found."
+
+def prompt_section_names(sectionNameList) -> List[str]:
+    """Sections the LLM has to write; the reference section is built in code when DETERMINISTIC_REFERENCES is set"""
+    if Config.DETERMINISTIC_REFERENCES:
+        return [sectionName for sectionName in sectionNameList if sectionName != "reference"]
+    return list(sectionNameList)
+
+def build_reference_section(results) -> Dict[str, Any]:
+    """Build the reference section from the URLs and titles returned by the search tool"""
+    template = SECTION_TEMPLATES["reference"]
+    return {
+        "label": template["label"],
+        "type": template["type"],
+        "fields": [{"name": result["title"], "value": result["url"], "type": "TXT"} for result in results]
+    }
+
+def add_reference_section(formatMsg, results, sectionNameList):
+    """Insert the deterministic reference section into a transaction formatted response, in sectionNameList order"""
+    if not Config.DETERMINISTIC_REFERENCES or "reference" not in sectionNameList:
+        return formatMsg
+    order = {SECTION_TEMPLATES[sectionName]["label"]: index for index, sectionName in enumerate(sectionNameList)
+             if sectionName in SECTION_TEMPLATES}
+    sections = [section for section in formatMsg["InfoSectionList"] if section.get("label") != SECTION_TEMPLATES["reference"]["label"]]
+    sections.append(build_reference_section(results))
+    formatMsg["InfoSectionList"] = sorted(sections, key=lambda section: order.get(section.get("label"), len(order)))
+    logger.info(f"Added reference section with {len(results)} links from tool results")
+    return formatMsg
+
+def report_sections_done(config, formatMsg, sectionNameList):
+    """Report every requested section of the parsed answer as done to the progress callback, if any"""
+    section_names = {SECTION_TEMPLATES[sectionName]["label"]: sectionName for sectionName in sectionNameList
+                     if sectionName in SECTION_TEMPLATES}
+    for section in formatMsg.get("InfoSectionList", []):
+        if isinstance(section, dict) and section.get("label") in section_names:
+            report_progress(config, "section_done", name=section_names[section["label"]])
+
+def record_search_stats(run_messages, sectionNameList, name, countryName, formatMsg):
+    """Record the search yield of a graph run per section, for the adaptive search limits"""
+    section_names = {SECTION_TEMPLATES[sectionName]["label"]: sectionName for sectionName in sectionNameList
+                     if sectionName in SECTION_TEMPLATES}
+    sections = {
+        section_names[section.get("label")]: section.get("fields", [])
+        for section in formatMsg.get("InfoSectionList", [])
+        if isinstance(section, dict) and section.get("label") in section_names
+    }
+    # URLs the answer lists as references; with deterministic references every result is listed anyway
+    cited_urls = None
+    if "reference" in sections and not Config.DETERMINISTIC_REFERENCES:
+        cited_urls = [str(field.get("value", "")) for field in sections["reference"]]
+    search_stats.search_stats.record_run(
+        sectionNameList, countryName,
+        tool_rounds=sum(1 for message in run_messages if getattr(message, "tool_calls", None)),
+        searches=sum(1 for message in run_messages
+                     if isinstance(message, ToolMessage) and getattr(message, "status", None) != "error"),
+        limited=any(getattr(message, "response_metadata", {}).get("forced_reason") == "tool_rounds" for message in run_messages),
+        yields=search_stats.section_yield(sections, extract_search_results(run_messages), cited_urls, name=name),
+    )
+
+def invoke_format_model(format_model, messages, model_name="gpt4omini", guardrail_profile=None):
+    """Invoke a tool-free model once, recording token usage and latency like the assistant node"""
+    input_tokens = ai_counter.count_messages_tokens(messages, model_name)
+    usage_tracker.increment_request()
+    invoke_start = time.perf_counter()
+    if Config.HEDGE_ENABLED:
+        response = hedging.llm_hedge_policy.invoke(format_model.invoke, messages)
+    else:
+        response = format_model.invoke(messages)
+    invoke_seconds = time.perf_counter() - invoke_start
+    output_tokens = ai_counter.count_tokens(response.content, model_name)
+    ai_counter.latency_tracker.record(f"llm:guardrail:{guardrail_profile or 'default'}", invoke_seconds,
+                                      tokens=input_tokens + output_tokens)
+    usage_tracker.add_tokens(input_tokens, output_tokens)
+    logger.info(f"Format call - Input tokens: {input_tokens}, Output tokens: {output_tokens}")
+    return response
+
+
+_name_variant_models = {}
+_name_variant_models_lock = threading.Lock()
+
+def expand_name_variants(name, countryName, deadline=None, execution_profile=None):
+    """
+    Cached or newly expanded name variants, empty when disabled
+
+    The model lookup uses the execution profile's model and is skipped when less than
+    Config.NAME_VARIANT_MIN_REMAINING seconds are left before the deadline.
+    """
+    if not Config.NAME_VARIANTS_ENABLED or not name:
+        return {"native": [], "romanised": []}
+    llm = None
+    if Config.NAME_VARIANT_LLM:
+        if deadline is not None and deadline - time.monotonic() < Config.NAME_VARIANT_MIN_REMAINING:
+            logger.info("Deadline is close, expanding name variants without the model")
+        else:
+            model_name = (execution_profile or Config.EXECUTION_PROFILES[Config.EXECUTION_PROFILE])["model"]
+            with _name_variant_models_lock:
+                if model_name not in _name_variant_models:
+                    _name_variant_models[model_name] = initialize_chat_model(api_key=LLMAAS_OPENAI_API_KEY,
+                                                                             model_name=model_name, temperature=0)
+                model = _name_variant_models[model_name]
+            llm = lambda prompt: invoke_format_model(model, [HumanMessage(content=prompt)]).content
+    return name_variants.expand_name(name, countryName, llm=llm)
+
+def add_variant_searches(response, messages, config):
+    """
+    Add searches for the name variants to the first search round of a run
+
+    The queries come from config["configurable"]["name_variant_queries"]; queries the
+    model already issued are not repeated.
+    """
+    queries = (config or {}).get("configurable", {}).get("name_variant_queries")
+    if not queries or not getattr(response, "tool_calls", None):
+        return
+    if any(getattr(message, "tool_calls", None) for message in messages_since_last_human(messages)):
+        return
+    issued = {" ".join(str(call["args"].get("query", "")).lower().split()) for call in response.tool_calls}
+    tool_name = response.tool_calls[0]["name"]
+    for query in queries:
+        if " ".join(query.lower().split()) not in issued:
+            response.tool_calls.append({"name": tool_name, "args": {"query": query},
+                                        "id": f"call_variant_{uuid.uuid4().hex[:16]}", "type": "tool_call"})
+    logger.info(f"First search round extended with name variant queries: {queries}")
+
+
+@profiling.profiled
+def process_messages(name=None, countryName=None, designation="", transaction_id="", system_content_template=Config.SYSTEM_CONTENT,
+                    human_message_template=Config.HUMAN_MESSAGE_TEMPLATE, sectionNameList=["main_particulars","education","career","appointments","reference"], 
+                    graph=None, deadline=None, progress=None, execution_profile=None):
+
+    promptSectionNames = prompt_section_names(sectionNameList)
+    sectionInstructions = [messagePromptInstruction(sectionName) for sectionName in promptSectionNames]
+    output_format = sections_to_json(sectionName for sectionName in promptSectionNames)
+    logger.info(f"Output format of the human message: {output_format}")
+
+    with profiling.span("name_variants"):
+        variants = expand_name_variants(name, countryName, deadline=deadline, execution_profile=execution_profile)
+    nameVariants = name_variants.format_variants(variants)
+    formatted_human_message_template = human_message_template.format(
+        name=name,
+        countryName=countryName,
+        designation=designation,
+        sectionInstructions=sectionInstructions,
+        output_format=output_format,
+        nameVariants=nameVariants
+    )
+    
+    # Create the message objects
+
+    human_message = HumanMessage(content=formatted_human_message_template)
+    logger.info(f"Generated full human message: {human_message}")
+
+    thread_id = resolve_thread_id(transaction_id)
+    thread = {"configurable": {"thread_id": thread_id, "deadline": deadline, "progress": progress,
+                               "name_variant_queries": name_variants.search_queries(variants, countryName)}}
+    initialize_thread(graph, thread, system_content_template)
 
     logger.info(f"Invoke graph with human message and threadID {thread_id}")
 
     
 
-    messages = graph.invoke({"messages": [human_message]}, thread)
+    with profiling.span("graph"):
+        messages = graph.invoke({"messages": [human_message]}, thread)
     logger.info("=== Full list of messages ===")
     # logger.info(messages['messages'][-1].pretty_print())
     for m in messages['messages']:
         logger.info(m)
 
-    formatMsg = embed_in_transaction_format(messages['messages'][-1].content, thread_id)
+    final_message = messages['messages'][-1]
+    partial = bool(final_message.response_metadata.get("deadline_forced"))
+    run_messages = messages_since_last_human(messages['messages'])
+    formatMsg = embed_partial_result(final_message.content, thread_id, partial)
+    formatMsg = add_reference_section(formatMsg, extract_search_results(run_messages), sectionNameList)
+    if Config.POSTPROCESS_ENABLED:
+        with profiling.span("postprocess"):
+            formatMsg = postprocess.postprocess_profile(formatMsg)
+    report_sections_done(thread, formatMsg, sectionNameList)
+    record_search_stats(run_messages, sectionNameList, name, countryName, formatMsg)
+    return formatMsg, thread_id
+
+
+@profiling.profiled
+def process_messages_two_phase(name=None, countryName=None, designation="", transaction_id="",
+                               sectionNameList=["main_particulars","education","career","appointments","reference"],
+                               graph=None, format_model=None, extract_tool=None, format_guardrail_profile=None,
+                               deadline=None, progress=None, execution_profile=None):
+    """
+    Gather evidence with a lean tool loop, then write the CV in one tool-free call
+
+    Phase one runs the graph with a short research prompt, so the large section
+    instructions are not re-sent on every search round. Phase two sends the compacted
+    evidence and the section schemas to format_model exactly once. With
+    Config.EVIDENCE_STORE_ENABLED, the top pages are fetched with extract_tool and
+    each section only receives its top-k retrieved chunks. When the deadline cuts
+    phase one short, the result is marked partial. progress receives tool rounds, the
+    current phase and each section once the answer is parsed.
+
+    Returns:
+        tuple: (transaction formatted response, thread id)
+    """
+    with profiling.span("name_variants"):
+        variants = expand_name_variants(name, countryName, deadline=deadline, execution_profile=execution_profile)
+    nameVariants = name_variants.format_variants(variants)
+
+    thread_id = resolve_thread_id(transaction_id)
+    thread = {"configurable": {"thread_id": thread_id, "deadline": deadline, "progress": progress,
+                               "name_variant_queries": name_variants.search_queries(variants, countryName)}}
+    initialize_thread(graph, thread, Config.GATHER_SYSTEM_CONTENT)
+    report_progress(thread, "stage", name="gathering")
+
+    gather_message = HumanMessage(content=Config.GATHER_HUMAN_MESSAGE_TEMPLATE.format(
+        name=name,
+        countryName=countryName,
+        designation=designation,
+        sectionNames=", ".join(sectionNameList),
+        nameVariants=nameVariants
+    ))
+    logger.info(f"Phase one: gathering evidence in thread {thread_id}")
+    with profiling.span("graph"):
+        messages = graph.invoke({"messages": [gather_message]}, thread)
+    run_messages = messages_since_last_human(messages['messages'])
+    results = extract_search_results(run_messages)
+    partial = bool(messages['messages'][-1].response_metadata.get("deadline_forced"))
+    logger.info(f"Phase one collected {len(results)} unique search results")
+
+    with profiling.span("evidence"):
+        if Config.EVIDENCE_STORE_ENABLED and extract_tool is not None:
+            store = EvidenceStore(extract_tool)
+            store.add_search_results(results)
+            store.fetch_pages([result["url"] for result in results[:Config.EVIDENCE_FETCH_TOP_URLS]])
+            evidence = store.section_evidence(sectionNameList, name=name)
+        else:
+            evidence = compact_evidence(results)
+
+    logger.info("Phase two: formatting CV from evidence")
+    report_progress(thread, "stage", name="formatting")
+    format_message = HumanMessage(content=Config.FORMAT_HUMAN_MESSAGE_TEMPLATE.format(
+        name=name,
+        countryName=countryName,
+        designation=designation,
+        evidence=evidence,
+        sectionInstructions=[messagePromptInstruction(sectionName) for sectionName in prompt_section_names(sectionNameList)],
+        output_format=sections_to_json(prompt_section_names(sectionNameList))
+    ))
+    with profiling.span("format"):
+        response = invoke_format_model(format_model, [SystemMessage(content=Config.FORMAT_SYSTEM_CONTENT), format_message],
+                                       guardrail_profile=format_guardrail_profile)
+
+    formatMsg = embed_partial_result(response.content, thread_id, partial)
+    formatMsg = add_reference_section(formatMsg, results, sectionNameList)
+    if Config.POSTPROCESS_ENABLED:
+        with profiling.span("postprocess"):
+            formatMsg = postprocess.postprocess_profile(formatMsg)
+    report_sections_done(thread, formatMsg, sectionNameList)
+    record_search_stats(run_messages, sectionNameList, name, countryName, formatMsg)
     return formatMsg, thread_id
 
 
@@ -324,20 +731,32 @@ def process_messages(name=None, countryName=None, designation="", transaction_id
 # for m in messages['messages']:
 #     m.pretty_print()
 
-def create_graph():
+def create_graph(guardrail_profile=Config.GUARDRAIL_PROFILE, execution_profile=None):
+    """
+    Build the search graph
+
+    Args:
+        guardrail_profile: Name of a Config.GUARDRAIL_PROFILES entry
+        execution_profile: Entry of Config.EXECUTION_PROFILES, None for Config.EXECUTION_PROFILE
+    """
+    execution_profile = execution_profile or Config.EXECUTION_PROFILES[Config.EXECUTION_PROFILE]
 
     logger.info("Initialize Tavily Tool")
     # 1. Initialize tools
-    tavily_search_tool, tavily_extract_tool = initialize_tavily_tools(
-        max_results=Config.TAVILY_MAXSEARCH,
-        search_topic=Config.TAVILY_SEARCHTOPIC
+    tavily_search_tool, _ = initialize_tavily_tools(
+        max_results=execution_profile["max_results"],
+        search_topic=Config.TAVILY_SEARCHTOPIC,
+        search_depth=execution_profile["search_depth"]
     )
     
     # 2. Initialize model
     logger.info("Initialize Chat Model")
     model_with_tools = initialize_chat_model(
         api_key=LLMAAS_OPENAI_API_KEY,
-        tools=[tavily_search_tool]
+        model_name=execution_profile["model"],
+        tools=[tavily_search_tool],
+        temperature=execution_profile["temperature"],
+        guardrail_profile=guardrail_profile
     )
     # model_with_tools = initialize_chat_model(
     #     api_key=OPENAI_API_KEY,
@@ -345,13 +764,26 @@ def create_graph():
     #     model_name="gpt-4o-mini"
     # )
     
+    # Tool-free model used to force a final answer near the deadline or at the search limits
+    final_model = initialize_chat_model(
+        api_key=LLMAAS_OPENAI_API_KEY,
+        model_name=execution_profile["model"],
+        temperature=execution_profile["temperature"],
+        guardrail_profile=guardrail_profile
+    )
+    
     # 3. Create system message
     logger.info("Initialize System Message")
     system_message = SystemMessage(content=Config.SYSTEM_CONTENT)
     
     # 4. Create assistant node
     logger.info("Create assistant node")
-    assistant_node = create_assistant_node(model_with_tools, system_message)
+    assistant_node = create_assistant_node(model_with_tools, system_message, throttleSec=execution_profile["throttle"],
+                                           guardrail_profile=guardrail_profile,
+                                           hedge_policy=hedging.llm_hedge_policy if Config.HEDGE_ENABLED else None,
+                                           final_model=final_model,
+                                           max_tool_rounds=execution_profile["max_tool_rounds"],
+                                           context_budget=execution_profile["context_budget"])
     
     # 5. Build graph
     logger.info("Build graph")
@@ -359,3 +791,35 @@ def create_graph():
 
     return graph
 
+_graph_cache = OrderedDict()
+_graph_cache_lock = threading.Lock()
+
+def get_graph(guardrail_profile=Config.GUARDRAIL_PROFILE, execution_profile=None):
+    """
+    Return the compiled graph of a guardrail and execution profile, built once per container
+
+    Compiled graphs keep no per-run state (that lives in the checkpointer under the thread id),
+    so one graph serves every request with the same settings. The Config.GRAPH_CACHE_MAXENTRIES
+    most recently used graphs are kept. With Config.GRAPH_CACHE_ENABLED off, a new graph is
+    built on every call.
+    """
+    execution_profile = execution_profile or Config.EXECUTION_PROFILES[Config.EXECUTION_PROFILE]
+    if not Config.GRAPH_CACHE_ENABLED:
+        return create_graph(guardrail_profile=guardrail_profile, execution_profile=execution_profile)
+    key = (guardrail_profile, json.dumps(execution_profile, sort_keys=True, default=str))
+    with _graph_cache_lock:
+        if key not in _graph_cache:
+            _graph_cache[key] = create_graph(guardrail_profile=guardrail_profile, execution_profile=execution_profile)
+            while len(_graph_cache) > Config.GRAPH_CACHE_MAXENTRIES:
+                _graph_cache.popitem(last=False)
+        else:
+            logger.info("Reusing compiled graph")
+            _graph_cache.move_to_end(key)
+        return _graph_cache[key]
+
+def create_format_model(guardrail_profile=Config.GUARDRAIL_FORMAT_PROFILE, execution_profile=None):
+    """Create the tool-free chat model used for the formatting phase"""
+    execution_profile = execution_profile or Config.EXECUTION_PROFILES[Config.EXECUTION_PROFILE]
+    logger.info("Initialize Format Model")
+    return initialize_chat_model(api_key=LLMAAS_OPENAI_API_KEY, model_name=execution_profile["model"],
+                                 temperature=execution_profile["temperature"], guardrail_profile=guardrail_profile)
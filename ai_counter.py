@@ -1,10 +1,42 @@
 import tiktoken
-from typing import Dict, Any
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
 #Logging
 import customLogging
 
+#Custom imports
+import profiling
+
 logger = customLogging.safe_logger_setup()
 
+# Usage of the run tracked in this context by track_run_usage(), None outside one
+_run_usage: contextvars.ContextVar[Optional[Dict[str, int]]] = contextvars.ContextVar("run_usage", default=None)
+
+@contextmanager
+def track_run_usage():
+    """Collect the model requests, tokens, search rounds and hedges of the calls made inside the block, e.g. one profile run"""
+    usage = {"requests": 0, "input_tokens": 0, "output_tokens": 0, "tool_rounds": 0, "hedges": 0, "hedge_wins": 0}
+    token = _run_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _run_usage.reset(token)
+
+def record_tool_round():
+    """Count a search round of the run tracked in this context"""
+    run_usage = _run_usage.get()
+    if run_usage is not None:
+        run_usage["tool_rounds"] += 1
+
+def record_hedge(won: bool = False):
+    """Count a hedged model call of the run tracked in this context, and whether the hedge answered first"""
+    run_usage = _run_usage.get()
+    if run_usage is not None:
+        run_usage["hedges" if not won else "hedge_wins"] += 1
+
 # Global counters (you might want to move these to a class or config)
 class UsageTracker:
     def __init__(self):
@@ -15,11 +47,18 @@ class UsageTracker:
     
     def increment_request(self):
         self.total_requests += 1
+        run_usage = _run_usage.get()
+        if run_usage is not None:
+            run_usage["requests"] += 1
     
     def add_tokens(self, input_tokens: int, output_tokens: int):
         self.total_input_tokens += input_tokens
         self.total_output_tokens += output_tokens
         self.total_tokens += (input_tokens + output_tokens)
+        run_usage = _run_usage.get()
+        if run_usage is not None:
+            run_usage["input_tokens"] += input_tokens
+            run_usage["output_tokens"] += output_tokens
     
     def get_stats(self) -> Dict[str, int]:
         return {
@@ -29,8 +68,79 @@ class UsageTracker:
             "total_tokens": self.total_tokens
         }
 
+class LatencyTracker:
+    """Keeps recent latency samples per category (e.g. "llm:guardrail:enforced") for percentiles"""
+    def __init__(self, max_samples: int = 500):
+        self.max_samples = max_samples
+        self._samples: Dict[str, deque] = {}
+        self._totals: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, category: str, seconds: float, tokens: Optional[int] = None):
+        """Record one sample; tokens (input plus output) let calls of different sizes be compared"""
+        with self._lock:
+            self._samples.setdefault(category, deque(maxlen=self.max_samples)).append(seconds)
+            totals = self._totals.setdefault(category, {"count": 0, "total_seconds": 0.0, "tokens": 0,
+                                                        "token_seconds": 0.0})
+            totals["count"] += 1
+            totals["total_seconds"] += seconds
+            if tokens:
+                totals["tokens"] += tokens
+                totals["token_seconds"] += seconds
+
+    def percentile(self, category: str, percent: float) -> Optional[float]:
+        """Return the given percentile of the recent samples, or None without samples"""
+        with self._lock:
+            samples = sorted(self._samples.get(category, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(percent / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def sample_count(self, category: str) -> int:
+        with self._lock:
+            return len(self._samples.get(category, ()))
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        stats = {}
+        with self._lock:
+            categories = list(self._totals.keys())
+        for category in categories:
+            with self._lock:
+                totals = dict(self._totals[category])
+            stats[category] = {
+                "count": totals["count"],
+                "mean_seconds": totals["total_seconds"] / max(1, totals["count"]),
+                "p50_seconds": self.percentile(category, 50),
+                "p95_seconds": self.percentile(category, 95),
+                "mean_tokens": totals["tokens"] / max(1, totals["count"]),
+                "seconds_per_1k_tokens": totals["token_seconds"] / totals["tokens"] * 1000 if totals["tokens"] else None,
+            }
+        return stats
+
 # Initialize global tracker
 usage_tracker = UsageTracker()
+latency_tracker = LatencyTracker()
+
+# Map model names to encodings
+MODEL_ENCODINGS = {
+    "gpt-4": "cl100k_base",
+    "gpt-4o": "cl100k_base",
+    "gpt4omini": "cl100k_base",  # Alternative naming
+    "gpt-3.5-turbo": "cl100k_base",
+    "claude": "cl100k_base",  # Approximation for Claude
+    "text-davinci-003": "p50k_base",
+}
+
+def preload_encodings(encoding_names=("cl100k_base",)) -> None:
+    """
+    Load tiktoken encodings ahead of the first token count
+
+    Raises:
+        Exception: When an encoding cannot be loaded (e.g. no network and no local cache)
+    """
+    for encoding_name in encoding_names:
+        tiktoken.get_encoding(encoding_name).encode("warm-up")
 
 def count_tokens(text: str, model_name: str = "gpt4omini") -> int:
     """
@@ -43,20 +153,10 @@ def count_tokens(text: str, model_name: str = "gpt4omini") -> int:
         int: Number of tokens
     """
     try:
-        # Map model names to encodings
-        # Map model names to encodings
-        model_encodings = {
-            "gpt-4": "cl100k_base",
-            "gpt-4o": "cl100k_base",
-            "gpt4omini": "cl100k_base",  # Alternative naming
-            "gpt-3.5-turbo": "cl100k_base",
-            "claude": "cl100k_base",  # Approximation for Claude
-            "text-davinci-003": "p50k_base",
-        }
-
-        encoding_name = model_encodings.get(model_name, "cl100k_base")
-        encoding = tiktoken.get_encoding(encoding_name)
-        return len(encoding.encode(text))
+        encoding_name = MODEL_ENCODINGS.get(model_name, "cl100k_base")
+        with profiling.span("tiktoken"):
+            encoding = tiktoken.get_encoding(encoding_name)
+            return len(encoding.encode(text))
     except Exception as e:
         logger.warning(f"Error counting tokens: {e}")
         # Fallback approximation: ~4 chars per token
@@ -96,6 +196,40 @@ def get_usage_statistics() -> Dict[str, int]:
     """Get current usage statistics"""
     return usage_tracker.get_stats()
 
+# Helper function to get the latency cost of each guardrail profile
+def get_guardrail_latency_cost(baseline: str = "relaxed") -> Dict[str, Dict[str, float]]:
+    """
+    Estimate the share of LLM call latency each guardrail profile adds over a baseline profile
+
+    Calls of different profiles differ in size (long gathering turns, short format calls),
+    so profiles are compared by seconds per 1000 tokens. The guardrail share of a call
+    is the difference to the baseline rate applied to the profile's mean tokens per call.
+
+    Returns:
+        Dict of profile name to its latency stats plus "overhead_seconds" per call and
+        "overhead_share" of its mean latency versus the baseline, None without baseline samples
+    """
+    stats = {category.split(":", 2)[2]: values for category, values in latency_tracker.get_stats().items()
+             if category.startswith("llm:guardrail:")}
+    baseline_rate = stats.get(baseline, {}).get("seconds_per_1k_tokens")
+    for values in stats.values():
+        if baseline_rate is None or values["seconds_per_1k_tokens"] is None:
+            values["overhead_seconds"] = values["overhead_share"] = None
+            continue
+        overhead = (values["seconds_per_1k_tokens"] - baseline_rate) * values["mean_tokens"] / 1000
+        values["overhead_seconds"] = overhead
+        values["overhead_share"] = overhead / values["mean_seconds"] if values["mean_seconds"] else None
+    return stats
+
+def log_guardrail_latency_cost(baseline: str = "relaxed"):
+    """Log the guardrail latency comparison of get_guardrail_latency_cost"""
+    for profile, values in get_guardrail_latency_cost(baseline).items():
+        overhead = "n/a" if values["overhead_seconds"] is None else f"{values['overhead_seconds']:+.3f}s"
+        if values["overhead_share"] is not None:
+            overhead += f" ({values['overhead_share']:+.0%})"
+        logger.info(f"Guardrail {profile}: {values['count']} calls, mean {values['mean_seconds']:.2f}s, "
+                    f"~{values['mean_tokens']:.0f} tokens, overhead vs {baseline} {overhead}")
+
 # Helper function to reset usage statistics
 def reset_usage_statistics():
     """Reset usage statistics"""
@@ -0,0 +1,284 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Sequence, Set, Tuple
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+#Logging
+import customLogging
+
+#Custom imports
+from config import Config
+
+logger = customLogging.safe_logger_setup()
+
+
+BLOB_MARKER = "\x00blob:sha256:"
+
+
+def _payload_size(typed: Tuple[str, bytes]) -> int:
+    return len(typed[1]) if typed and typed[1] else 0
+
+
+class BlobStore:
+    """
+    Thread-safe content-addressed store of message contents, reference counted per thread
+
+    Blobs are keyed by the SHA-256 of their content, so a tool result repeated in every
+    checkpoint of a thread, or shared by several threads, is held once.
+    """
+
+    def __init__(self):
+        self._blobs: Dict[str, str] = {}
+        self._refcounts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.bytes = 0
+
+    def put(self, content: str) -> str:
+        digest = hashlib.sha256(content.encode("utf-8", "surrogatepass")).hexdigest()
+        with self._lock:
+            if digest not in self._blobs:
+                self._blobs[digest] = content
+                self._refcounts[digest] = 0
+                self.bytes += len(content)
+        collected = getattr(self._local, "collected", None)
+        if collected is not None:
+            collected.add(digest)
+        return digest
+
+    def get(self, digest: str) -> Optional[str]:
+        with self._lock:
+            return self._blobs.get(digest)
+
+    @contextmanager
+    def collecting(self):
+        """Collect the digests of every blob put by this thread inside the block"""
+        self._local.collected = collected = set()
+        try:
+            yield collected
+        finally:
+            self._local.collected = None
+
+    def incref(self, digests: Set[str]):
+        with self._lock:
+            for digest in digests:
+                if digest in self._refcounts:
+                    self._refcounts[digest] += 1
+
+    def decref(self, digests: Set[str]):
+        """Release references, pruning blobs that no thread refers to any more"""
+        with self._lock:
+            for digest in digests:
+                if digest not in self._refcounts:
+                    continue
+                self._refcounts[digest] -= 1
+                if self._refcounts[digest] <= 0:
+                    del self._refcounts[digest]
+                    self.bytes -= len(self._blobs.pop(digest))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._blobs)
+
+
+class ContentAddressedSerializer:
+    """
+    Checkpoint serializer that stores large message contents once in a BlobStore
+
+    Message contents of at least min_chars characters are replaced by a hash marker
+    before serialisation and restored on load, so each checkpoint of a growing
+    MessagesState only adds references to contents already stored.
+
+    Args:
+        blob_store: Store holding the contents
+        min_chars: Smallest content moved to the store
+        inner: Serializer of the remaining data, JsonPlusSerializer by default
+    """
+
+    def __init__(self, blob_store: BlobStore, min_chars: int = Config.CHECKPOINT_BLOB_MIN_CHARS, inner=None):
+        self.blob_store = blob_store
+        self.min_chars = min_chars
+        self.inner = inner or JsonPlusSerializer()
+
+    def _externalise(self, value: Any) -> Any:
+        if isinstance(value, (list, tuple)):
+            return type(value)(self._externalise(item) for item in value)
+        if isinstance(value, BaseMessage) and isinstance(value.content, str) and len(value.content) >= self.min_chars:
+            return value.model_copy(update={"content": BLOB_MARKER + self.blob_store.put(value.content)})
+        return value
+
+    def _restore(self, value: Any) -> Any:
+        if isinstance(value, (list, tuple)):
+            return type(value)(self._restore(item) for item in value)
+        if isinstance(value, BaseMessage) and isinstance(value.content, str) and value.content.startswith(BLOB_MARKER):
+            digest = value.content[len(BLOB_MARKER):]
+            content = self.blob_store.get(digest)
+            if content is None:
+                logger.warning(f"Checkpoint blob {digest} is no longer stored")
+                content = "[content evicted]"
+            value.content = content
+        return value
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        return self.inner.dumps_typed(self._externalise(obj))
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        return self._restore(self.inner.loads_typed(data))
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.inner.dumps(self._externalise(obj))
+
+    def loads(self, data: bytes) -> Any:
+        return self._restore(self.inner.loads(data))
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    MemorySaver that keeps warm-container thread state within fixed bounds
+
+    Threads are tracked in least-recently-used order with the approximate number of
+    serialised bytes they hold. After every write, threads idle for longer than
+    ttl_seconds are dropped, then the least recently used threads are dropped until
+    both max_threads and max_bytes are respected. The thread being written is never
+    evicted by its own write, so a running graph keeps its state.
+
+    With a blob_store, large message contents are stored once through a
+    ContentAddressedSerializer; evicting a thread releases its blobs.
+
+    Args:
+        max_threads: Maximum number of threads kept
+        max_bytes: Approximate ceiling of serialised checkpoint, write and blob bytes
+        ttl_seconds: Idle time after which a thread is dropped
+        blob_store: Content-addressed store for large message contents, or None
+    """
+
+    def __init__(self, max_threads: int = Config.CHECKPOINT_MAX_THREADS, max_bytes: int = Config.CHECKPOINT_MAX_BYTES,
+                 ttl_seconds: float = Config.CHECKPOINT_TTL, blob_store: Optional[BlobStore] = None, **kwargs):
+        if blob_store is not None:
+            kwargs.setdefault("serde", ContentAddressedSerializer(blob_store))
+        super().__init__(**kwargs)
+        self.blob_store = blob_store
+        # thread id -> digests of the blobs its checkpoints refer to
+        self._thread_blobs: Dict[str, Set[str]] = {}
+        self.max_threads = max_threads
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.RLock()
+        # thread id -> [last access (monotonic seconds), approximate bytes]
+        self._threads: "OrderedDict[str, list]" = OrderedDict()
+        self._total_bytes = 0
+        self.evictions = {"ttl": 0, "lru": 0, "bytes": 0}
+
+    @contextmanager
+    def _retaining_blobs(self, thread_id: str):
+        """Attribute the blobs written inside the block to thread_id"""
+        if self.blob_store is None:
+            yield
+            return
+        with self.blob_store.collecting() as collected:
+            yield
+        held = self._thread_blobs.setdefault(thread_id, set())
+        new = collected - held
+        self.blob_store.incref(new)
+        held.update(new)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes + (self.blob_store.bytes if self.blob_store is not None else 0)
+
+    def _touch(self, thread_id: str, added_bytes: int = 0):
+        entry = self._threads.get(thread_id)
+        if entry is None:
+            entry = self._threads[thread_id] = [0.0, 0]
+        entry[0] = time.monotonic()
+        entry[1] += added_bytes
+        self._total_bytes += added_bytes
+        self._threads.move_to_end(thread_id)
+
+    def get_tuple(self, config: RunnableConfig):
+        with self._lock:
+            thread_id = config["configurable"]["thread_id"]
+            if thread_id in self._threads:
+                self._touch(thread_id)
+            return super().get_tuple(config)
+
+    def list(self, config: Optional[RunnableConfig], **kwargs):
+        with self._lock:
+            # Materialise under the lock so eviction cannot change the storage mid-iteration
+            return iter(list(super().list(config, **kwargs)))
+
+    def put(self, config: RunnableConfig, checkpoint, metadata, new_versions) -> RunnableConfig:
+        with self._lock:
+            with self._retaining_blobs(config["configurable"]["thread_id"]):
+                result = super().put(config, checkpoint, metadata, new_versions)
+            thread_id = result["configurable"]["thread_id"]
+            checkpoint_ns = result["configurable"]["checkpoint_ns"]
+            saved = self.storage[thread_id][checkpoint_ns][checkpoint["id"]]
+            added = _payload_size(saved[0]) + _payload_size(saved[1])
+            added += sum(_payload_size(self.blobs[(thread_id, checkpoint_ns, channel, version)])
+                         for channel, version in new_versions.items())
+            self._touch(thread_id, added)
+            self._evict(keep=thread_id)
+            return result
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        with self._lock:
+            thread_id = config["configurable"]["thread_id"]
+            outer_key = (thread_id, config["configurable"].get("checkpoint_ns", ""), config["configurable"]["checkpoint_id"])
+            before = sum(_payload_size(write[2]) for write in self.writes.get(outer_key, {}).values())
+            with self._retaining_blobs(thread_id):
+                super().put_writes(config, writes, task_id, task_path)
+            after = sum(_payload_size(write[2]) for write in self.writes.get(outer_key, {}).values())
+            self._touch(thread_id, after - before)
+            self._evict(keep=thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            super().delete_thread(thread_id)
+            entry = self._threads.pop(thread_id, None)
+            if entry is not None:
+                self._total_bytes -= entry[1]
+            if self.blob_store is not None:
+                self.blob_store.decref(self._thread_blobs.pop(thread_id, set()))
+
+    def _evict(self, keep: Optional[str] = None):
+        """Drop expired threads, then least recently used ones until within bounds"""
+        now = time.monotonic()
+        for thread_id, (last_access, _) in list(self._threads.items()):
+            if thread_id != keep and now - last_access > self.ttl_seconds:
+                self.delete_thread(thread_id)
+                self.evictions["ttl"] += 1
+
+        while len(self._threads) > self.max_threads or self.total_bytes > self.max_bytes:
+            victim = next((thread_id for thread_id in self._threads if thread_id != keep), None)
+            if victim is None:
+                # Only the running thread is left; it is allowed to exceed the ceiling on its own
+                break
+            reason = "lru" if len(self._threads) > self.max_threads else "bytes"
+            logger.info(f"Evicting checkpoint thread {victim} ({reason}), {self._threads[victim][1]} bytes")
+            self.delete_thread(victim)
+            self.evictions[reason] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "threads": len(self._threads),
+                "approx_bytes": self.total_bytes,
+                "checkpoint_bytes": self._total_bytes,
+                "blobs": len(self.blob_store) if self.blob_store is not None else 0,
+                "blob_bytes": self.blob_store.bytes if self.blob_store is not None else 0,
+                "max_threads": self.max_threads,
+                "max_bytes": self.max_bytes,
+                "evictions": dict(self.evictions),
+            }
+
+
+# One saver per container, so thread state survives between warm invocations within the bounds above
+checkpointer = BoundedMemorySaver(blob_store=BlobStore() if Config.CHECKPOINT_CONTENT_ADDRESSED else None)
@@ -0,0 +1,187 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, Optional
+
+#Logging
+import customLogging
+
+#Custom imports
+from config import Config
+
+logger = customLogging.safe_logger_setup()
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open"""
+
+    def __init__(self, dependency: str, retry_after: float):
+        super().__init__(f"{dependency} circuit is open, retry in {retry_after:.0f} seconds")
+        self.dependency = dependency
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker of one dependency
+
+    Outcomes of the last window calls are kept. Once at least min_calls are recorded
+    and the share of failures reaches failure_rate, the circuit opens and calls fail
+    fast for open_seconds. It then turns half-open and lets half_open_probes calls
+    through: a successful probe closes the circuit, a failed one opens it again.
+
+    Args:
+        name: Dependency name used in logs and metrics
+        window: Number of recent calls the failure rate is computed over
+        min_calls: Calls needed in the window before the circuit can open
+        failure_rate: Failure share (0-1) that opens the circuit
+        open_seconds: Time calls fail fast before probing
+        half_open_probes: Concurrent probe calls allowed while half-open
+    """
+
+    def __init__(self, name: str, window: int = Config.CIRCUIT_WINDOW, min_calls: int = Config.CIRCUIT_MIN_CALLS,
+                 failure_rate: float = Config.CIRCUIT_FAILURE_RATE, open_seconds: float = Config.CIRCUIT_OPEN_SECONDS,
+                 half_open_probes: int = Config.CIRCUIT_HALF_OPEN_PROBES):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._outcomes: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self.metrics = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0, "closed": 0}
+
+    def _retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._probes = 0
+        self.metrics["opened"] += 1
+        logger.warning(f"{self.name} circuit opened, failing fast for {self.open_seconds} seconds")
+
+    def is_open(self) -> bool:
+        """True while calls are being rejected; does not take a half-open probe slot"""
+        with self._lock:
+            return self.state == OPEN and self._retry_after() > 0
+
+    def before_call(self):
+        """Admit a call or raise CircuitOpenError"""
+        with self._lock:
+            if self.state == OPEN:
+                if self._retry_after() > 0:
+                    self.metrics["rejected"] += 1
+                    raise CircuitOpenError(self.name, self._retry_after())
+                self.state = HALF_OPEN
+                self._probes = 0
+                logger.info(f"{self.name} circuit half-open, probing")
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    self.metrics["rejected"] += 1
+                    raise CircuitOpenError(self.name, self.open_seconds)
+                self._probes += 1
+
+    def record_success(self):
+        with self._lock:
+            self.metrics["successes"] += 1
+            if self.state == HALF_OPEN:
+                self.state = CLOSED
+                self._outcomes.clear()
+                self.metrics["closed"] += 1
+                logger.info(f"{self.name} circuit closed")
+            self._outcomes.append(True)
+
+    def record_failure(self):
+        with self._lock:
+            self.metrics["failures"] += 1
+            if self.state == HALF_OPEN:
+                self._open()
+                return
+            self._outcomes.append(False)
+            if self.state == CLOSED and len(self._outcomes) >= self.min_calls and \
+                    self._outcomes.count(False) / len(self._outcomes) >= self.failure_rate:
+                self._open()
+
+    def open_error(self) -> CircuitOpenError:
+        with self._lock:
+            return CircuitOpenError(self.name, self._retry_after())
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = len(self._outcomes)
+            return {
+                "state": self.state,
+                "window_calls": calls,
+                "window_failure_rate": round(self._outcomes.count(False) / calls, 3) if calls else 0.0,
+                "retry_after_seconds": round(self._retry_after(), 1) if self.state == OPEN else 0.0,
+                **self.metrics,
+            }
+
+
+# One breaker per dependency and container, shared by every request
+breakers = {
+    "llmaas": CircuitBreaker("llmaas"),
+    "tavily": CircuitBreaker("tavily"),
+}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Return the breaker of a dependency, creating it on first use"""
+    if name not in breakers:
+        breakers[name] = CircuitBreaker(name)
+    return breakers[name]
+
+
+def find_open_error(error: Optional[BaseException]) -> Optional[CircuitOpenError]:
+    """Return the CircuitOpenError behind an exception, following wrapped causes"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, CircuitOpenError):
+            return error
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def get_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: breaker.get_stats() for name, breaker in breakers.items()}
+
+
+class ProfileFallbackCache:
+    """
+    Last complete profile per (name, country, designation, execution profile)
+
+    Served while the LLMaaS circuit is open, so a caller gets the previous profile
+    instead of an error.
+    """
+
+    def __init__(self, max_entries: int = Config.CIRCUIT_FALLBACK_MAXENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(name: str, country: str, designation: str, profile: str) -> str:
+        return "|".join(" ".join((value or "").lower().split()) for value in (name, country, designation, profile))
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key: str, response: Dict[str, Any]):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = response
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+profile_fallback_cache = ProfileFallbackCache()
@@ -1,3 +1,6 @@
+import os
+
+
 class Config:
     LOCAL_TEST=True #Value is True for local test
     SYSTEM_CONTENT='''
@@ -11,16 +14,209 @@ class Config:
         For non-English profile, please also search foreign language websites. 
         3. Please verify accuracy of the information.  Organize accurate ones into the exact JSON structure requested by the user.
     '''
-    HUMAN_MESSAGE_TEMPLATE = """For Profile {name} from country {countryName}{designation}, generate the CV content below: \n
+    HUMAN_MESSAGE_TEMPLATE = """For Profile {name} from country {countryName}{designation}, generate the CV content below:{nameVariants} \n
+    {sectionInstructions} \n
+    Generate the output in following sample format: \n {output_format} \n
+    Your output should contain only the requested JSON structure with accurate information.  Do not include any comments.
+    Language of output is strictly English,so please translate into accurate English if output is of another language.
+    """
+    PIPELINE_MODE="single"  # "single" tool-bound call, or "two_phase" gather-then-format
+    GATHER_SYSTEM_CONTENT='''
+        You research diplomatic professionals with the Tavily search tool.
+        Search LinkedIn, official biographies and news; for non-English profiles also search foreign language websites.
+        Keep searching until you have evidence for every requested CV section, then reply only with DONE.
+        Do not write the CV.
+    '''
+    GATHER_HUMAN_MESSAGE_TEMPLATE = """Research profile {name} from country {countryName}{designation}. CV sections needed: {sectionNames}.{nameVariants}"""
+    FORMAT_SYSTEM_CONTENT='''
+        You are an intelligent assistant designed to help foreign service officers compile accurate CVs for diplomatic professionals.
+        Use only the web search evidence provided by the user and organize accurate information into the exact JSON structure requested.
+    '''
+    FORMAT_HUMAN_MESSAGE_TEMPLATE = """Web search evidence for Profile {name} from country {countryName}{designation}: \n
+    {evidence} \n
+    Using only this evidence, generate the CV content below: \n
     {sectionInstructions} \n
     Generate the output in following sample format: \n {output_format} \n
     Your output should contain only the requested JSON structure with accurate information.  Do not include any comments.
     Language of output is strictly English,so please translate into accurate English if output is of another language.
     """
+    EVIDENCE_MAX_RESULTS=40  # search results passed to the formatting call
+    EVIDENCE_MAX_CHARS=1500  # characters kept per search result
+    EVIDENCE_STORE_ENABLED=False  # two_phase only: fetch full pages and pass top-k chunks per section
+    EVIDENCE_FETCH_TOP_URLS=8  # pages fetched with TavilyExtract per profile
+    EVIDENCE_EXTRACT_BATCH=20  # URLs per TavilyExtract call
+    EVIDENCE_CHUNK_WORDS=120
+    EVIDENCE_CHUNK_OVERLAP=20
+    EVIDENCE_TOP_K=6  # chunks passed per section
+    PAGE_CACHE_TTL=86400  # seconds a fetched page is reused
+    PAGE_CACHE_MAXENTRIES=500
+    DEADLINE_SAFETY_MARGIN=5  # seconds kept free before the Lambda timeout to return the response
+    DEADLINE_FINAL_ANSWER_RESERVE=45  # seconds before the deadline at which searching stops
+    DEADLINE_FINAL_ANSWER_PROMPT = """Time is up. Do not search any further. Using only the information gathered so far, reply now in the requested format."""
+    SEARCH_LIMIT_FINAL_ANSWER_PROMPT = """The search budget for this profile is used up. Do not search any further. Using only the information gathered so far, reply now in the requested format."""
+    DETERMINISTIC_REFERENCES=False  # build the reference section from tool results instead of asking the LLM
+    POSTPROCESS_ENABLED=True  # normalise dates, de-duplicate and sort entries after parsing
+    POSTPROCESS_DEDUP_SECTIONS=["career", "appointments", "education", "languages"]  # in priority order
+    POSTPROCESS_CROSS_SECTIONS=["career", "appointments"]  # an appointment repeating a career entry is dropped
+    POSTPROCESS_SORT_SECTIONS=["career", "appointments", "education"]
+    POSTPROCESS_NEWEST_FIRST=True  # reverse-chronological order, as in the stored CVs
+    POSTPROCESS_SIMILARITY=0.8  # detail token overlap at which two entries with the same title and period are duplicates
+    DEFAULT_SECTIONS=["main_particulars", "education", "career", "appointments", "reference"]
+    SECTION_MAX_AGE_DAYS={  # update mode: sections older than this are regenerated
+        "main_particulars": 30,
+        "education": 365,
+        "career": 30,
+        "appointments": 30,
+        "languages": 365,
+        "remarks": 90,
+        "reference": 30,
+    }
+    SECTION_DEFAULT_MAX_AGE_DAYS=30
     TAVILY_MAXSEARCH=7
     TAVILY_SEARCHTOPIC="general"
     THROTTLESPEED=0.5  # seconds between requests
     LLM_TEMPERATURE=0.2
     LLMAAS_BASEURL="https://llmaas.govtext.gov.sg/gateway"
     LLMAAS_MODELNAME="gpt-4o-mini-prd-gcc2-lb"
+    GUARDRAIL_PROFILES={  # sent as extra_body.llmaas.guardrails; None keeps the platform default
+        "default": None,
+        "relaxed": {
+            "enforced": False,
+            "sentinel": {
+                "input": {"lionguard-binary": {"threshold": 0.95}},
+                "output": {"lionguard-binary": {"threshold": 0.95}},
+            },
+        },
+        "enforced": {
+            "enforced": True,
+            "sentinel": {
+                "input": {"lionguard-binary": {"threshold": 0.95}},
+                "output": {"lionguard-binary": {"threshold": 0.95}},
+            },
+        },
+    }
+    GUARDRAIL_PROFILE="default"  # single mode, where one model gathers and answers
+    GUARDRAIL_GATHER_PROFILE="relaxed"  # two_phase evidence-gathering turns
+    GUARDRAIL_FORMAT_PROFILE="enforced"  # two_phase final answer
+    EXECUTION_PROFILES={  # selected per request with the "profile" field
+        "fast": {
+            "search_depth": "basic",
+            "max_results": 5,
+            "max_tool_rounds": 2,  # search rounds before the final answer is forced
+            "context_budget": 24000,  # tokens of conversation before the final answer is forced
+            "sections": ["main_particulars", "career", "reference"],
+            "model": LLMAAS_MODELNAME,
+            "temperature": LLM_TEMPERATURE,
+            "throttle": 0,
+        },
+        "balanced": {  # the behaviour before profiles existed
+            "search_depth": None,
+            "max_results": TAVILY_MAXSEARCH,
+            "max_tool_rounds": None,
+            "context_budget": None,
+            "sections": DEFAULT_SECTIONS,
+            "model": LLMAAS_MODELNAME,
+            "temperature": LLM_TEMPERATURE,
+            "throttle": THROTTLESPEED,
+        },
+        "thorough": {
+            "search_depth": "advanced",
+            "max_results": 10,
+            "max_tool_rounds": 12,
+            "context_budget": 100000,
+            "sections": ["main_particulars", "education", "career", "appointments", "languages", "remarks", "reference"],
+            "model": LLMAAS_MODELNAME,
+            "temperature": LLM_TEMPERATURE,
+            "throttle": THROTTLESPEED,
+        },
+    }
+    EXECUTION_PROFILE="balanced"  # used when a request names no profile
+    HEDGE_ENABLED=False  # duplicate slow LLM calls; the first response wins
+    HEDGE_PERCENTILE=90  # hedge once a call runs longer than this latency percentile
+    HEDGE_MIN_SAMPLES=20  # latencies observed before hedging starts
+    HEDGE_MIN_DELAY=2.0  # seconds, lower bound of the hedge delay
+    HEDGE_BUDGET_RATIO=0.05  # at most this many hedged calls per LLM call
+    HEDGE_MAX_WORKERS=8  # hedged requests running at once per container; primary calls are not pooled
+    TOOL_MAX_WORKERS=4  # concurrent tool calls per assistant turn
+    TOOL_CALL_TIMEOUT=30  # seconds allowed for a single tool call
+    TOOL_MAX_ABANDONED=2  # timed-out tool calls still running before the tool worker pool is replaced
+    TAVILY_MIN_INTERVAL=0.2  # minimum seconds between Tavily call starts
+    SEARCH_CACHE_TTL=3600  # seconds a search result is reused
+    SEARCH_CACHE_MAXENTRIES=1000
+    TAVILY_BASEURL="https://api.tavily.com"
+    HTTP_CONNECT_TIMEOUT=5  # seconds
+    HTTP_READ_TIMEOUT=120  # seconds, LLMaaS generations can be long
+    TAVILY_READ_TIMEOUT=20  # seconds
+    HTTP_MAX_RETRIES=3  # retries on 429/5xx and connection errors
+    HTTP_BACKOFF_BASE=0.5  # seconds, doubled per attempt with full jitter
+    HTTP_BACKOFF_MAX=8  # seconds
+    HTTP_POOL_MAXSIZE=20  # keep-alive connections per dependency
+    HTTP_KEEPALIVE_EXPIRY=60  # seconds an idle connection is kept
+    CHECKPOINT_MAX_THREADS=200  # conversation threads kept in a warm container
+    CHECKPOINT_MAX_BYTES=256 * 1024 * 1024  # approximate ceiling of checkpoint memory
+    CHECKPOINT_TTL=1800  # seconds an idle thread is kept
+    CHECKPOINT_CONTENT_ADDRESSED=True  # store large message contents once, referenced by hash
+    CHECKPOINT_BLOB_MIN_CHARS=1024  # smallest message content moved to the blob store
+    RESPONSE_COMPACT=True  # no insignificant whitespace in response bodies; uses orjson when installed
+    RESPONSE_COMPRESSION=True  # gzip/br bodies when the caller's Accept-Encoding allows
+    RESPONSE_COMPRESS_MIN_BYTES=1024  # smaller bodies are sent uncompressed
+    RESPONSE_GZIP_LEVEL=6
+    RESPONSE_BROTLI_QUALITY=5
+    JOB_BACKEND="memory"  # job queue and result store: "memory" or "sqlite"
+    JOB_SQLITE_PATH="/tmp/profile_jobs.sqlite3"
+    JOB_WORKERS=2  # background worker threads per container; 0 leaves jobs to "work" invocations
+    JOB_TIME_BUDGET=840  # seconds a background job may run before it returns partial results
+    JOB_DRAIN_RESERVE=120  # a "work" invocation stops claiming jobs with less time than this left
+    JOB_RESULT_TTL=3600  # seconds finished jobs are kept for polling
+    NAME_VARIANTS_ENABLED=True  # add native-script and romanisation variants of the name to the prompt
+    NAME_VARIANT_LLM=True  # ask the model for native-script forms on a cache miss
+    NAME_VARIANT_CACHE_PATH="/tmp/name_variants.json"  # None keeps the cache in memory only
+    NAME_VARIANT_CACHE_MAXENTRIES=5000
+    NAME_VARIANT_MAX=8  # variants kept per kind (native, romanised)
+    NAME_VARIANT_SEARCHES=2  # extra first-round searches for the top variants; 0 only adds them to the prompt
+    NAME_VARIANT_MIN_REMAINING=60  # seconds left before the run deadline below which the model lookup is skipped
+    NAME_VARIANT_PROMPT = """List how the name of {name} from {countryName} is written, and how its family name {family} is written.
+    Reply only with JSON: {{"native": [native-script spellings, empty if the native script is Latin], "romanised": [other common romanised spellings],
+    "family_native": [native-script spellings of the family name, empty if the native script is Latin], "family_romanised": [other common romanised spellings of the family name]}}."""
+    PROFILING_ENABLED=os.environ.get("PROFILE_TRANSACTIONS", "").lower() in ("1", "true", "yes")  # profile every transaction; a request can also set "profiling": true
+    PROFILING_DIR=os.environ.get("PROFILE_DIR", "/tmp/profiles")  # .prof and .json artefacts, one pair per transactionId
+    PROFILING_TOP_FUNCTIONS=30  # functions listed in the JSON breakdown, by cumulative time
+    CIRCUIT_WINDOW=20  # recent calls per dependency the failure rate is computed over
+    CIRCUIT_MIN_CALLS=5  # calls needed in the window before a circuit can open
+    CIRCUIT_FAILURE_RATE=0.5  # failure share that opens the circuit
+    CIRCUIT_OPEN_SECONDS=30  # calls fail fast this long before a half-open probe
+    CIRCUIT_HALF_OPEN_PROBES=1  # concurrent probe calls while half-open
+    CIRCUIT_FALLBACK_MAXENTRIES=500  # last complete profiles kept to serve while LLMaaS is down
+    GRAPH_CACHE_ENABLED=True  # reuse compiled graphs per guardrail and execution profile within a container
+    WARMUP_CONNECTIONS=2  # keep-alive connections opened per dependency by a warm-up event
+    GRAPH_CACHE_MAXENTRIES=16  # compiled graphs kept; adaptive search limits produce several per profile
+    SEARCH_STATS_PATH="/tmp/search_stats.json"  # per-section search yield history; None keeps it in memory only
+    SEARCH_STATS_ALPHA=0.2  # weight of the newest run in the moving averages
+    SEARCH_STATS_MATCH=0.6  # share of a field's words a cited result must contain to count for its section
+    SEARCH_ADAPTIVE_ENABLED=True  # adapt max_results and tool rounds per section and country from the history
+    SEARCH_ADAPTIVE_MIN_RUNS=5  # runs of a section (per country, else overall) before its history is used
+    SEARCH_ADAPTIVE_HEADROOM=1.25  # adapted limits exceed the observed need by this factor
+    SEARCH_ADAPTIVE_MIN_RESULTS=3
+    SEARCH_ADAPTIVE_MAX_RESULTS=10  # adapted values never exceed the profile's own limits either
+    SEARCH_ADAPTIVE_MIN_ROUNDS=2  # rounds are only adapted for profiles that limit them
+    ESTIMATE_HISTORY_PATH="/tmp/run_history.json"  # per-profile run history of the estimator; None keeps it in memory only
+    ESTIMATE_HISTORY_ALPHA=0.2  # weight of the newest run in the moving averages
+    ESTIMATE_MIN_RUNS=3  # runs before a history entry is used instead of a broader one
+    ESTIMATE_DEFAULT_INPUT_TOKENS_PER_SECTION=8000  # used until a profile has history
+    ESTIMATE_DEFAULT_OUTPUT_TOKENS_PER_SECTION=600
+    ESTIMATE_DEFAULT_SECONDS_PER_SECTION=30
+    ESTIMATE_DEFAULT_TOOL_ROUNDS=4
+    LLM_INPUT_COST_PER_1K=0.00015  # currency units per 1000 tokens, for cost estimates
+    LLM_OUTPUT_COST_PER_1K=0.0006
+    ADMISSION_ENABLED=True  # estimate every synchronous request and apply the limits below
+    ADMISSION_MAX_REQUEST_TOKENS=None  # per-request estimated token budget; None disables a limit
+    ADMISSION_MAX_REQUEST_COST=None
+    ADMISSION_MAX_CONCURRENT=None  # requests running at once in a container; the limits below are per container too,
+                                   # so on Lambda (one request per container) they do not bound the function's load
+    ADMISSION_MAX_REQUESTS_PER_MINUTE=None
+    ADMISSION_MAX_TOKENS_PER_MINUTE=None  # estimated tokens admitted per minute
+    ADMISSION_MAX_COST_PER_MINUTE=None
+    ADMISSION_DOWNGRADE_ORDER=["thorough", "balanced", "fast"]  # a request may be moved to a later, cheaper profile
+    ADMISSION_QUEUE_ENABLED=False  # over the rate limits, queue the request as a job instead of rejecting it; needs a
+                                   # JOB_BACKEND shared by all containers, as a memory queue is only worked by its own container
 
@@ -0,0 +1,317 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+#Logging
+import customLogging
+
+#Custom imports
+from config import Config
+import job_queue
+
+logger = customLogging.safe_logger_setup()
+
+ALL_SECTIONS = "*"
+ALL_PROFILES = "*"
+
+ADMIT = "admit"
+DOWNGRADE = "downgrade"
+QUEUE = "queue"
+REJECT = "reject"
+
+# Reasons that go away by waiting, so the request can be queued instead of rejected
+RATE_REASONS = ("concurrency", "request_rate", "token_rate", "cost_rate")
+
+
+class RunHistory:
+    """
+    Thread-safe history of completed runs per execution profile, persisted as JSON
+
+    Each run is kept as moving averages under its exact section list and, divided by
+    the number of sections, under the profile as a whole and under all profiles, so
+    section lists and profiles that were never run can still be estimated from
+    per-section rates.
+
+    Args:
+        path: JSON file the history is loaded from and saved to; None keeps it in memory
+        alpha: Weight of the newest run in the moving averages
+    """
+
+    def __init__(self, path: Optional[str] = Config.ESTIMATE_HISTORY_PATH, alpha: float = Config.ESTIMATE_HISTORY_ALPHA):
+        self.path = path
+        self.alpha = alpha
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(profile_name: str, sectionNameList: Optional[List[str]] = None) -> str:
+        sections = ",".join(sorted(sectionNameList)) if sectionNameList is not None else ALL_SECTIONS
+        return f"{profile_name}|{sections}"
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            self._entries = {}
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path, encoding="utf-8") as f:
+                        self._entries = json.load(f)
+                    logger.info(f"Loaded run history of {len(self._entries)} keys from {self.path}")
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Could not load run history {self.path}: {str(e)}")
+        return self._entries
+
+    def _save(self, entries: Dict[str, Dict[str, Any]]):
+        if not self.path:
+            return
+        temporary = f"{self.path}.tmp"
+        try:
+            with open(temporary, "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+            os.replace(temporary, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save run history {self.path}: {str(e)}")
+
+    def _update(self, entries: Dict[str, Dict[str, Any]], key: str, observation: Dict[str, float]):
+        entry = entries.get(key)
+        if entry is None:
+            entries[key] = {**observation, "runs": 1}
+        else:
+            for name, value in observation.items():
+                entry[name] = (1 - self.alpha) * entry.get(name, value) + self.alpha * value
+            entry["runs"] += 1
+        entries[key]["updated"] = datetime.now(timezone.utc).isoformat()
+
+    def record(self, profile_name: str, sectionNameList: List[str], usage: Dict[str, int], wall_seconds: float):
+        """
+        Record a completed run
+
+        Args:
+            profile_name: Execution profile the run used
+            sectionNameList: Sections of the run
+            usage: input_tokens, output_tokens and tool_rounds of the run (ai_counter.track_run_usage)
+            wall_seconds: Duration of the run
+        """
+        observation = {
+            "input_tokens": usage.get("input_tokens", 0),
+            "output_tokens": usage.get("output_tokens", 0),
+            "tool_rounds": usage.get("tool_rounds", 0),
+            "wall_seconds": wall_seconds,
+        }
+        sections = max(1, len(sectionNameList))
+        per_section = {name: value / sections for name, value in observation.items() if name != "tool_rounds"}
+        with self._lock:
+            entries = self._load()
+            self._update(entries, self.make_key(profile_name, sectionNameList), observation)
+            for key in (self.make_key(profile_name), self.make_key(ALL_PROFILES)):
+                self._update(entries, key, {**per_section, "tool_rounds": observation["tool_rounds"]})
+            self._save(entries)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._load())}
+
+    def get_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._load().get(key)
+            return dict(entry) if entry is not None and entry["runs"] >= Config.ESTIMATE_MIN_RUNS else None
+
+    def estimate(self, profile_name: str, sectionNameList: List[str]) -> Dict[str, Any]:
+        """
+        Predict tokens, tool rounds, wall time and cost of a run
+
+        Uses the runs of the same section list, else the per-section rates of the profile,
+        else those of all profiles, else the Config.ESTIMATE_DEFAULT_* rates.
+
+        Returns:
+            dict: profile, sections, input_tokens, output_tokens, tokens, tool_rounds,
+                wall_seconds, cost and basis ("sections", "profile", "all_profiles" or "default")
+        """
+        sections = max(1, len(sectionNameList))
+        entry = self.get_entry(self.make_key(profile_name, sectionNameList))
+        basis = "sections"
+        if entry is None:
+            entry = self.get_entry(self.make_key(profile_name))
+            basis = "profile"
+            if entry is None:
+                entry = self.get_entry(self.make_key(ALL_PROFILES))
+                basis = "all_profiles"
+            if entry is None:
+                entry = {
+                    "input_tokens": Config.ESTIMATE_DEFAULT_INPUT_TOKENS_PER_SECTION,
+                    "output_tokens": Config.ESTIMATE_DEFAULT_OUTPUT_TOKENS_PER_SECTION,
+                    "tool_rounds": Config.ESTIMATE_DEFAULT_TOOL_ROUNDS,
+                    "wall_seconds": Config.ESTIMATE_DEFAULT_SECONDS_PER_SECTION,
+                }
+                basis = "default"
+            entry = {**entry, **{name: entry[name] * sections for name in ("input_tokens", "output_tokens", "wall_seconds")}}
+
+        input_tokens = round(entry["input_tokens"])
+        output_tokens = round(entry["output_tokens"])
+        return {
+            "profile": profile_name,
+            "sections": list(sectionNameList),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "tokens": input_tokens + output_tokens,
+            "tool_rounds": round(entry["tool_rounds"], 1),
+            "wall_seconds": round(entry["wall_seconds"], 1),
+            "cost": round(input_tokens / 1000 * Config.LLM_INPUT_COST_PER_1K +
+                          output_tokens / 1000 * Config.LLM_OUTPUT_COST_PER_1K, 6),
+            "basis": basis,
+        }
+
+
+run_history = RunHistory()
+
+
+def estimate_request(profile_name: str, history: RunHistory = run_history) -> Dict[str, Any]:
+    """Estimate a request run with the sections of its execution profile"""
+    return history.estimate(profile_name, list(Config.EXECUTION_PROFILES[profile_name]["sections"]))
+
+
+class AdmissionController:
+    """
+    Admission control of profile requests from their pre-flight estimates
+
+    A request is admitted with its profile when its estimate fits the per-request
+    budget, the remaining time and the rate limits over the last minute. Otherwise
+    the cheaper profiles after it in Config.ADMISSION_DOWNGRADE_ORDER are tried. When
+    none fits and the cause is load (concurrency or rate), the request is queued as
+    a job or, with queueing off, rejected with a retry delay; a request that is over
+    the per-request budget with every profile is rejected. Running out of time alone
+    never rejects a request, since the deadline already turns it into a partial result.
+    Limits set to None are not enforced.
+
+    Counters are per container. On Lambda, where a container serves one request at a
+    time, the concurrency and rate limits therefore do not bound the load of the whole
+    function; use reserved concurrency or API Gateway throttling for that. Queueing
+    needs a job backend in job_queue.SHARED_BACKENDS, since a job in the memory backend
+    can only be worked by the container that queued it.
+    """
+
+    def __init__(self, history: RunHistory = run_history, window_seconds: float = 60):
+        self.history = history
+        self.window_seconds = window_seconds
+        self._admitted: deque = deque()  # (monotonic time, estimated tokens, estimated cost)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.decisions = {ADMIT: 0, DOWNGRADE: 0, QUEUE: 0, REJECT: 0}
+
+    def _prune(self, now: float):
+        while self._admitted and now - self._admitted[0][0] > self.window_seconds:
+            self._admitted.popleft()
+
+    def _check(self, estimate: Dict[str, Any], deadline: Optional[float], now: float) -> Optional[str]:
+        """Return why the estimate cannot be admitted now, or None"""
+        if Config.ADMISSION_MAX_REQUEST_TOKENS is not None and estimate["tokens"] > Config.ADMISSION_MAX_REQUEST_TOKENS:
+            return "request_tokens"
+        if Config.ADMISSION_MAX_REQUEST_COST is not None and estimate["cost"] > Config.ADMISSION_MAX_REQUEST_COST:
+            return "request_cost"
+        if Config.ADMISSION_MAX_CONCURRENT is not None and self._in_flight >= Config.ADMISSION_MAX_CONCURRENT:
+            return "concurrency"
+        if Config.ADMISSION_MAX_REQUESTS_PER_MINUTE is not None and \
+                len(self._admitted) + 1 > Config.ADMISSION_MAX_REQUESTS_PER_MINUTE:
+            return "request_rate"
+        if Config.ADMISSION_MAX_TOKENS_PER_MINUTE is not None and \
+                sum(tokens for _, tokens, _ in self._admitted) + estimate["tokens"] > Config.ADMISSION_MAX_TOKENS_PER_MINUTE:
+            return "token_rate"
+        if Config.ADMISSION_MAX_COST_PER_MINUTE is not None and \
+                sum(cost for _, _, cost in self._admitted) + estimate["cost"] > Config.ADMISSION_MAX_COST_PER_MINUTE:
+            return "cost_rate"
+        if deadline is not None and estimate["wall_seconds"] > deadline - now:
+            return "time_budget"
+        return None
+
+    def _retry_after(self, now: float) -> int:
+        if not self._admitted:
+            return 1
+        return max(1, round(self._admitted[0][0] + self.window_seconds - now))
+
+    def decide(self, profile_name: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Decide how to handle a request and reserve its share of the limits when it runs
+
+        An admitted or downgraded request takes its in-flight slot here, under the same
+        lock as the concurrency check, so a burst cannot pass the limit; run it inside
+        running(reserved=True) to release the slot.
+
+        Args:
+            profile_name: Execution profile the request asked for
+            deadline: time.monotonic() by which the request must finish, or None
+        Returns:
+            dict: action (admit, downgrade, queue or reject), profile, estimate, reason
+                and, for rejections, retryAfterSeconds
+        """
+        order = list(Config.ADMISSION_DOWNGRADE_ORDER)
+        candidates = [profile_name] + (order[order.index(profile_name) + 1:] if profile_name in order else [])
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            first_reason = None
+            first_estimate = None
+            for candidate in candidates:
+                estimate = estimate_request(candidate, self.history)
+                reason = self._check(estimate, deadline, now)
+                if first_estimate is None:
+                    first_reason, first_estimate = reason, estimate
+                if reason is None:
+                    action = ADMIT if candidate == profile_name else DOWNGRADE
+                    return self._decision(action, candidate, estimate, first_reason, now)
+
+            if first_reason == "time_budget":
+                return self._decision(ADMIT, profile_name, first_estimate, first_reason, now)
+            if first_reason in RATE_REASONS and Config.ADMISSION_QUEUE_ENABLED:
+                if Config.JOB_BACKEND in job_queue.SHARED_BACKENDS:
+                    return self._decision(QUEUE, profile_name, first_estimate, first_reason, now)
+                logger.warning(f"Not queueing with the {Config.JOB_BACKEND} job backend, which other containers cannot work")
+            decision = self._decision(REJECT, profile_name, first_estimate, first_reason, now)
+            if first_reason in RATE_REASONS:
+                decision["retryAfterSeconds"] = self._retry_after(now)
+            return decision
+
+    def _decision(self, action: str, profile_name: str, estimate: Dict[str, Any], reason: Optional[str],
+                  now: float) -> Dict[str, Any]:
+        self.decisions[action] += 1
+        if action in (ADMIT, DOWNGRADE):
+            self._admitted.append((now, estimate["tokens"], estimate["cost"]))
+            self._in_flight += 1
+        decision = {"action": action, "profile": profile_name, "estimate": estimate, "reason": reason}
+        log = logger.info if action == ADMIT else logger.warning
+        log(f"Admission {action} with profile {profile_name} ({reason or 'within limits'}): "
+            f"~{estimate['tokens']} tokens, ~{estimate['wall_seconds']}s, ~{estimate['tool_rounds']} tool rounds")
+        return decision
+
+    @contextmanager
+    def running(self, reserved: bool = False):
+        """
+        Count a request as in flight for the concurrency limit until it finishes
+
+        Args:
+            reserved: The slot was already taken by an admitting decide(), so it is only released
+        """
+        if not reserved:
+            with self._lock:
+                self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._prune(time.monotonic())
+            return {
+                "in_flight": self._in_flight,
+                "admitted_last_window": len(self._admitted),
+                "estimated_tokens_last_window": sum(tokens for _, tokens, _ in self._admitted),
+                "decisions": dict(self.decisions),
+            }
+
+
+admission_controller = AdmissionController()
@@ -0,0 +1,210 @@
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+#Logging
+import customLogging
+
+#Custom imports
+from config import Config
+from tool_executor import tavily_rate_limiter
+
+logger = customLogging.safe_logger_setup()
+
+# Keywords used to retrieve the chunks relevant to each CV section
+SECTION_QUERIES: Dict[str, str] = {
+    "main_particulars": "born birth date birthday age nationality married wife husband children son daughter family current position",
+    "education": "education graduated graduate degree bachelor master phd doctorate university college school academy studied diploma",
+    "career": "career served position minister ambassador director deputy secretary joined appointed government ministry official",
+    "appointments": "appointment appointed board member chairman chair president advisor adviser founder committee council director",
+    "languages": "language languages speaks fluent proficient english native",
+    "remarks": "award honour honor recognised known notable father mother brother related family achievement",
+    "reference": "",
+}
+
+BOILERPLATE_PATTERN = re.compile(
+    r"(cookie|privacy policy|terms of (use|service)|all rights reserved|subscribe|sign in|log in|sign up|"
+    r"newsletter|advertisement|share this|follow us|skip to|back to top|javascript)",
+    re.IGNORECASE,
+)
+MARKDOWN_LINK_PATTERN = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def strip_boilerplate(text: str, min_words: int = 4) -> str:
+    """
+    Remove navigation, footer and repeated lines from an extracted page
+
+    Args:
+        text: Raw page content returned by TavilyExtract
+        min_words: Lines with fewer words are dropped unless they contain a digit
+    Returns:
+        str: Cleaned text, one kept line per line
+    """
+    kept = []
+    seen = set()
+    for line in text.splitlines():
+        line = MARKDOWN_LINK_PATTERN.sub(r"\1", line).strip(" \t#*|>-")
+        if not line or line in seen or BOILERPLATE_PATTERN.search(line):
+            continue
+        if len(line.split()) < min_words and not any(ch.isdigit() for ch in line):
+            continue
+        seen.add(line)
+        kept.append(line)
+    return "\n".join(kept)
+
+
+def chunk_text(text: str, chunk_words: int = Config.EVIDENCE_CHUNK_WORDS, overlap: int = Config.EVIDENCE_CHUNK_OVERLAP) -> List[str]:
+    """Split text into overlapping windows of chunk_words words"""
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, chunk_words - overlap)
+    return [" ".join(words[start:start + chunk_words]) for start in range(0, max(1, len(words) - overlap), step)]
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """Small in-memory Okapi BM25 index over text chunks"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents: List[Dict[str, Any]] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.total_length = 0
+
+    def add(self, text: str, metadata: Dict[str, Any]):
+        doc_id = len(self.documents)
+        terms = Counter(tokenize(text))
+        for term, frequency in terms.items():
+            self.postings[term].append((doc_id, frequency))
+        length = sum(terms.values())
+        self.documents.append({"text": text, **metadata})
+        self.lengths.append(length)
+        self.total_length += length
+
+    def search(self, query: str, k: int = Config.EVIDENCE_TOP_K) -> List[Dict[str, Any]]:
+        if not self.documents:
+            return []
+        average_length = self.total_length / len(self.documents)
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (len(self.documents) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / average_length)
+                scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [{**self.documents[doc_id], "score": score} for doc_id, score in ranked]
+
+
+class PageCache:
+    """Thread-safe TTL cache of cleaned page text keyed by URL, shared across profiles"""
+
+    def __init__(self, ttl_seconds: float = Config.PAGE_CACHE_TTL, max_entries: int = Config.PAGE_CACHE_MAXENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[str, Tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                return None
+            return entry[1]
+
+    def put(self, url: str, text: str):
+        with self._lock:
+            if len(self._entries) >= self.max_entries and url not in self._entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[url] = (time.monotonic(), text)
+
+
+page_cache = PageCache()
+
+
+class EvidenceStore:
+    """
+    Evidence for one profile: search snippets plus full pages of the top URLs, chunked into a BM25 index
+
+    Args:
+        extract_tool: TavilyExtract tool used to fetch full pages
+    """
+
+    def __init__(self, extract_tool=None):
+        self.extract_tool = extract_tool
+        self.index = BM25Index()
+        self.titles: Dict[str, str] = {}
+
+    def add_search_results(self, results: List[Dict[str, Any]]):
+        """Index the snippets of search results (as returned by ai.extract_search_results)"""
+        for result in results:
+            self.titles.setdefault(result["url"], result["title"])
+            if result.get("content"):
+                self.index.add(" ".join(result["content"].split()), {"url": result["url"], "title": result["title"]})
+
+    def _extract(self, urls: List[str]) -> Dict[str, str]:
+        pages = {}
+        for start in range(0, len(urls), Config.EVIDENCE_EXTRACT_BATCH):
+            batch = urls[start:start + Config.EVIDENCE_EXTRACT_BATCH]
+            tavily_rate_limiter.acquire()
+            try:
+                payload = self.extract_tool.invoke({"urls": batch})
+            except Exception as e:
+                logger.warning(f"Page extraction failed for {len(batch)} URLs: {str(e)}")
+                continue
+            if not isinstance(payload, dict) or "error" in payload:
+                logger.warning(f"Page extraction returned an error for {len(batch)} URLs")
+                continue
+            for result in payload.get("results", []):
+                if result.get("url") and result.get("raw_content"):
+                    pages[result["url"]] = strip_boilerplate(result["raw_content"])
+        return pages
+
+    def fetch_pages(self, urls: List[str]):
+        """Fetch, clean, chunk and index full pages, reusing cached pages by URL"""
+        if self.extract_tool is None:
+            return
+        pages = {}
+        missing = []
+        for url in urls:
+            cached = page_cache.get(url)
+            if cached is None:
+                missing.append(url)
+            else:
+                pages[url] = cached
+        logger.info(f"Evidence store: {len(pages)} cached pages, fetching {len(missing)}")
+        if missing:
+            fetched = self._extract(missing)
+            for url, text in fetched.items():
+                page_cache.put(url, text)
+            pages.update(fetched)
+        for url, text in pages.items():
+            for chunk in chunk_text(text):
+                self.index.add(chunk, {"url": url, "title": self.titles.get(url, url)})
+
+    def top_chunks(self, query: str, k: int = Config.EVIDENCE_TOP_K) -> List[Dict[str, Any]]:
+        return self.index.search(query, k)
+
+    def section_evidence(self, sectionNameList: List[str], name: str = "", k: int = Config.EVIDENCE_TOP_K,
+                         max_chars: int = Config.EVIDENCE_MAX_CHARS) -> str:
+        """Render the top-k chunks for every requested section as one evidence block per section"""
+        blocks = []
+        for sectionName in sectionNameList:
+            if not SECTION_QUERIES.get(sectionName):
+                continue
+            chunks = self.top_chunks(f"{name} {SECTION_QUERIES[sectionName]}", k)
+            lines = [f"- {chunk['text'][:max_chars]} ({chunk['url']})" for chunk in chunks]
+            blocks.append(f"Evidence for {sectionName}:\n" + ("\n".join(lines) if lines else "- None found"))
+        return "\n\n".join(blocks) if blocks else "No evidence found."
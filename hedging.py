@@ -0,0 +1,155 @@
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+#Logging
+import customLogging
+
+#Custom imports
+from config import Config
+import ai_counter
+
+logger = customLogging.safe_logger_setup()
+
+
+class HedgePolicy:
+    """
+    Issue a duplicate request when a call runs past a latency percentile; the first response wins
+
+    The hedge delay is the configured percentile of recent primary latencies, and no
+    hedging happens until min_samples latencies have been observed. Hedges are limited
+    by a global budget: at most budget_ratio extra calls per call made. A losing call
+    is cancelled if it has not started yet; a running one cannot be interrupted, so
+    its response is discarded when it arrives.
+
+    A call that cannot be hedged (too little history or no budget left) runs inline in
+    the calling thread. A call that may be hedged runs on its own thread, so the caller
+    can return the hedge's response without waiting for it; only hedges share the
+    max_workers pool, which bounds the extra load hedging adds. Both run in a copy of
+    the caller's context, keeping profiling spans and usage tracking.
+    """
+
+    def __init__(self, percentile: float = Config.HEDGE_PERCENTILE, min_samples: int = Config.HEDGE_MIN_SAMPLES,
+                 min_delay: float = Config.HEDGE_MIN_DELAY, budget_ratio: float = Config.HEDGE_BUDGET_RATIO,
+                 max_workers: int = Config.HEDGE_MAX_WORKERS):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.budget_ratio = budget_ratio
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self._latencies = deque(maxlen=500)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.budget_denied = 0
+        self.latency_saved = 0.0
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there is too little history"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            samples = sorted(self._latencies)
+        index = min(len(samples) - 1, int(round(self.percentile / 100 * (len(samples) - 1))))
+        return max(self.min_delay, samples[index])
+
+    def _budget_available(self) -> bool:
+        with self._lock:
+            return self.hedges + 1 <= self.budget_ratio * self.calls
+
+    def _take_budget(self) -> bool:
+        with self._lock:
+            if self.hedges + 1 > self.budget_ratio * self.calls:
+                self.budget_denied += 1
+                return False
+            self.hedges += 1
+            return True
+
+    def _record_latency(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def invoke(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Call fn(*args, **kwargs), hedging it once if it is slow and the budget allows"""
+        with self._lock:
+            self.calls += 1
+        start = time.perf_counter()
+        delay = self.hedge_delay()
+        if delay is None or not self._budget_available():
+            result = fn(*args, **kwargs)
+            self._record_latency(time.perf_counter() - start)
+            return result
+
+        primary = _start_thread(fn, *args, **kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._take_budget():
+            result = primary.result()
+            self._record_latency(time.perf_counter() - start)
+            return result
+
+        logger.info(f"Call exceeded {delay:.2f} seconds, issuing hedged request")
+        ai_counter.record_hedge()
+        hedge = self.executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    first_error = first_error or future.exception()
+                    continue
+                elapsed = time.perf_counter() - start
+                for loser in pending:
+                    loser.cancel()
+                if future is hedge:
+                    with self._lock:
+                        self.hedge_wins += 1
+                    ai_counter.record_hedge(won=True)
+                    # Credit the saving once the discarded primary finishes
+                    primary.add_done_callback(lambda _, won_at=elapsed: self._record_saving(start, won_at))
+                else:
+                    self._record_latency(elapsed)
+                return future.result()
+        raise first_error
+
+    def _record_saving(self, start: float, won_at: float):
+        primary_latency = time.perf_counter() - start
+        self._record_latency(primary_latency)
+        with self._lock:
+            self.latency_saved += max(0.0, primary_latency - won_at)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Container totals; latency_saved_seconds is credited once a discarded primary finishes"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedges": self.hedges,
+                "hedge_rate": self.hedges / max(1, self.calls),
+                "hedge_wins": self.hedge_wins,
+                "budget_denied": self.budget_denied,
+                "latency_saved_seconds": self.latency_saved,
+            }
+
+
+def _start_thread(fn: Callable[..., Any], *args, **kwargs) -> Future:
+    """Run fn on a new daemon thread in a copy of the caller's context and return its future"""
+    future = Future()
+    future.set_running_or_notify_cancel()
+    context = contextvars.copy_context()
+
+    def run():
+        try:
+            future.set_result(context.run(fn, *args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="hedge-primary", daemon=True).start()
+    return future
+
+
+# Shared by every assistant node so the hedge budget is global to the container
+llm_hedge_policy = HedgePolicy()
@@ -0,0 +1,332 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+#Logging
+import customLogging
+
+#Custom imports
+from config import Config
+import profiling
+
+logger = customLogging.safe_logger_setup()
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobBackend(ABC):
+    """
+    Queue and result store of profile jobs
+
+    Implementations must be safe to use from several worker threads. A job record
+    is a dict with jobId, status, request, progress, result, error, createdAt and updatedAt.
+    """
+
+    @abstractmethod
+    def enqueue(self, job_id: str, request: Dict[str, Any]):
+        """Store a new queued job"""
+
+    @abstractmethod
+    def claim(self, timeout: float = 0) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Take the oldest queued job and mark it running, waiting up to timeout seconds"""
+
+    @abstractmethod
+    def update(self, job_id: str, **fields):
+        """Update status, progress, result or error of a job"""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the job record, or None for an unknown job"""
+
+    @abstractmethod
+    def prune(self, max_age: float):
+        """Forget finished jobs last updated more than max_age seconds ago"""
+
+
+class MemoryJobBackend(JobBackend):
+    """In-process backend; jobs are lost when the container is recycled"""
+
+    def __init__(self):
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def enqueue(self, job_id: str, request: Dict[str, Any]):
+        now = time.time()
+        with self._lock:
+            self._jobs[job_id] = {"jobId": job_id, "status": QUEUED, "request": request, "progress": {},
+                                  "result": None, "error": None, "createdAt": now, "updatedAt": now}
+        self._queue.put(job_id)
+
+    def claim(self, timeout: float = 0) -> Optional[Tuple[str, Dict[str, Any]]]:
+        try:
+            job_id = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+        except queue.Empty:
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != QUEUED:
+                return None
+            job["status"] = RUNNING
+            job["updatedAt"] = time.time()
+            return job_id, job["request"]
+
+    def update(self, job_id: str, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields, updatedAt=time.time())
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job is not None else None
+
+    def prune(self, max_age: float):
+        cutoff = time.time() - max_age
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items()
+                           if job["status"] in (SUCCEEDED, FAILED) and job["updatedAt"] < cutoff]:
+                del self._jobs[job_id]
+
+
+class SQLiteJobBackend(JobBackend):
+    """
+    SQLite backend; several processes sharing the database file can submit and work jobs
+
+    Args:
+        path: Database file
+        poll_interval: Seconds between checks while claim waits for a job
+    """
+
+    def __init__(self, path: str = Config.JOB_SQLITE_PATH, poll_interval: float = 0.5):
+        self.path = path
+        self.poll_interval = poll_interval
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, status TEXT NOT NULL, request TEXT NOT NULL, "
+                "progress TEXT, result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived autocommit connection per call keeps the backend thread-safe
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def enqueue(self, job_id: str, request: Dict[str, Any]):
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO jobs (job_id, status, request, progress, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(request), "{}", now, now),
+            )
+
+    def _claim_once(self) -> Optional[Tuple[str, Dict[str, Any]]]:
+        with self._connect() as connection:
+            # BEGIN IMMEDIATE takes the write lock, so two workers never claim the same job
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT job_id, request FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is not None:
+                connection.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ?",
+                                   (RUNNING, time.time(), row["job_id"]))
+            connection.execute("COMMIT")
+        return (row["job_id"], json.loads(row["request"])) if row is not None else None
+
+    def claim(self, timeout: float = 0) -> Optional[Tuple[str, Dict[str, Any]]]:
+        give_up = time.monotonic() + timeout
+        while True:
+            job = self._claim_once()
+            if job is not None or time.monotonic() >= give_up:
+                return job
+            time.sleep(self.poll_interval)
+
+    def update(self, job_id: str, **fields):
+        columns = {"status": "status", "progress": "progress", "result": "result", "error": "error"}
+        assignments = []
+        values = []
+        for key, value in fields.items():
+            assignments.append(f"{columns[key]} = ?")
+            values.append(value if key in ("status", "error") else json.dumps(value))
+        with self._connect() as connection:
+            connection.execute(f"UPDATE jobs SET {', '.join(assignments)}, updated_at = ? WHERE job_id = ?",
+                               (*values, time.time(), job_id))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as connection:
+            row = connection.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "jobId": row["job_id"],
+            "status": row["status"],
+            "request": json.loads(row["request"]),
+            "progress": json.loads(row["progress"] or "{}"),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "createdAt": row["created_at"],
+            "updatedAt": row["updated_at"],
+        }
+
+    def prune(self, max_age: float):
+        with self._connect() as connection:
+            connection.execute("DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                               (SUCCEEDED, FAILED, time.time() - max_age))
+
+
+JOB_BACKENDS = {
+    "memory": MemoryJobBackend,
+    "sqlite": SQLiteJobBackend,
+}
+
+# Backends whose jobs other containers can work, given a database file they share (e.g. on EFS)
+SHARED_BACKENDS = ("sqlite",)
+
+
+def create_backend(name: str = Config.JOB_BACKEND) -> JobBackend:
+    """Instantiate a backend registered in JOB_BACKENDS"""
+    if name not in JOB_BACKENDS:
+        raise ValueError(f"Unknown job backend {name}, expected one of: {', '.join(JOB_BACKENDS)}")
+    return JOB_BACKENDS[name]()
+
+
+class JobProgress:
+    """
+    Progress callback handed to the pipeline through the graph config
+
+    Called as progress(event, **data) with the events "sections" (total), "section_done"
+    (name of a section that is final, e.g. still fresh in update mode or written by the
+    model), "tool_round" and "stage" (name); every event is written to the backend.
+    """
+
+    def __init__(self, backend: JobBackend, job_id: str):
+        self.backend = backend
+        self.job_id = job_id
+        self.state = {"stage": "starting", "tool_rounds": 0, "sections_done": 0, "sections_total": None,
+                      "completed_sections": []}
+        self._lock = threading.Lock()
+
+    def __call__(self, event: str, **data):
+        with self._lock:
+            if event == "tool_round":
+                self.state["tool_rounds"] += 1
+            elif event == "sections":
+                self.state["sections_total"] = data.get("total")
+            elif event == "section_done":
+                if data.get("name") not in self.state["completed_sections"]:
+                    self.state["completed_sections"].append(data.get("name"))
+                self.state["sections_done"] = len(self.state["completed_sections"])
+            elif event == "stage":
+                self.state["stage"] = data.get("name")
+            snapshot = {**self.state, "completed_sections": list(self.state["completed_sections"])}
+        self.backend.update(self.job_id, progress=snapshot)
+
+
+class JobQueue:
+    """
+    Submit/poll front end over a JobBackend, with a pool of worker threads
+
+    Args:
+        runner: Called as runner(request_body, deadline=..., progress=...) and returns the profile
+        backend: Queue and result store
+        workers: Number of background worker threads started on first submit; 0 only
+            queues jobs, which are then processed by drain() in a separate worker invocation
+
+    Background threads only run while the container is executing, so on Lambda use a
+    shared backend with workers=0 and dedicated "work" invocations.
+    """
+
+    def __init__(self, runner: Callable[..., Dict[str, Any]], backend: Optional[JobBackend] = None,
+                 workers: int = Config.JOB_WORKERS):
+        self.runner = runner
+        self.backend = backend or create_backend()
+        self.workers = workers
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def submit(self, request_body: Dict[str, Any]) -> str:
+        """Queue a validated request body and return its job id"""
+        job_id = uuid.uuid4().hex
+        self.backend.prune(Config.JOB_RESULT_TTL)
+        self.backend.enqueue(job_id, request_body)
+        logger.info(f"Queued job {job_id} for Transaction No {request_body.get('transactionId')}")
+        self._start_workers()
+        return job_id
+
+    def poll(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return status, progress and, once finished, the result or error of a job"""
+        job = self.backend.get(job_id)
+        if job is not None:
+            job.pop("request", None)
+        return job
+
+    def run_job(self, job_id: str, request_body: Dict[str, Any], deadline: Optional[float] = None):
+        progress = JobProgress(self.backend, job_id)
+        progress("stage", name="running")
+        budget = min(request_body.get("timeBudgetSeconds") or Config.JOB_TIME_BUDGET, Config.JOB_TIME_BUDGET)
+        job_deadline = time.monotonic() + budget
+        deadline = job_deadline if deadline is None else min(deadline, job_deadline)
+        try:
+            with profiling.transaction(request_body.get("transactionId"), enabled=profiling.is_requested(request_body)):
+                result = self.runner(request_body, deadline=deadline, progress=progress)
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            progress("stage", name="failed")
+            self.backend.update(job_id, status=FAILED, error=str(e))
+            return
+        progress("stage", name="done")
+        self.backend.update(job_id, status=SUCCEEDED, result=result)
+        logger.info(f"Job {job_id} succeeded")
+
+    def drain(self, deadline: Optional[float] = None, reserve: float = Config.JOB_DRAIN_RESERVE) -> int:
+        """
+        Work queued jobs in the calling thread until the queue is empty or the deadline is near
+
+        Args:
+            deadline: time.monotonic() by which draining must stop, or None to empty the queue
+            reserve: No new job is claimed with less than this many seconds left
+        Returns:
+            int: Number of jobs processed
+        """
+        processed = 0
+        while deadline is None or deadline - time.monotonic() > reserve:
+            job = self.backend.claim()
+            if job is None:
+                break
+            self.run_job(*job, deadline=deadline)
+            processed += 1
+        return processed
+
+    def _worker(self):
+        while True:
+            try:
+                job = self.backend.claim(timeout=1)
+                if job is not None:
+                    self.run_job(*job)
+            except Exception as e:
+                # e.g. the backend could not record the result; keep the worker alive for the next job
+                logger.error(f"Job worker error: {str(e)}")
+                time.sleep(1)
+
+    def _start_workers(self):
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._worker, name=f"job-worker-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
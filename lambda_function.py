@@ -1,11 +1,28 @@
 import json
+import time
 import customLogging
 import ai
+import ai_counter
+import transport
+import name_variants
+import search_stats
+import estimator
+import profile_refresh
+import postprocess
+import response_encoder
+import job_queue
+import profiling
+import circuit_breaker
+import hedging
 from config import Config
 
 # Set up logging
 logger = customLogging.safe_logger_setup()
 
+JOB_ACTIONS = ('submit', 'poll', 'work')
+ESTIMATE_ACTION = 'estimate'
+WARMUP_ACTION = 'warmup'
+
 def validate_request_body(body):
     """
     Validate the request body structure
@@ -36,7 +53,9 @@ def validate_request_body(body):
         }
     
     # Check for unexpected fields (optional validation)
-    allowed_fields = ['name', 'country', 'designation', 'transactionId']
+    allowed_fields = ['name', 'country', 'designation', 'transactionId',
+                      'previousInfoSectionList', 'sectionFreshness', 'refreshSections', 'guardrailProfile',
+                      'timeBudgetSeconds', 'headers', 'action', 'jobId', 'profile', 'profiling']
     unexpected_fields = [field for field in body.keys() if field not in allowed_fields]
     
     if unexpected_fields:
@@ -52,12 +71,163 @@ def validate_request_body(body):
                 'message': 'Designation must be a string or null'
             }
     
+    # Validate update mode fields if provided
+    if 'previousInfoSectionList' in body and not isinstance(body['previousInfoSectionList'], list):
+        return {
+            'valid': False,
+            'message': 'previousInfoSectionList must be a list of sections'
+        }
+    if 'sectionFreshness' in body and not isinstance(body['sectionFreshness'], dict):
+        return {
+            'valid': False,
+            'message': 'sectionFreshness must be an object of section name to ISO timestamp'
+        }
+    if 'refreshSections' in body and not isinstance(body['refreshSections'], list):
+        return {
+            'valid': False,
+            'message': 'refreshSections must be a list of section names'
+        }
+
+    if body.get('guardrailProfile') is not None and body['guardrailProfile'] not in Config.GUARDRAIL_PROFILES:
+        return {
+            'valid': False,
+            'message': f"guardrailProfile must be one of: {', '.join(Config.GUARDRAIL_PROFILES.keys())}"
+        }
+
+    if body.get('profile') is not None and body['profile'] not in Config.EXECUTION_PROFILES:
+        return {
+            'valid': False,
+            'message': f"profile must be one of: {', '.join(Config.EXECUTION_PROFILES.keys())}"
+        }
+
+    if 'timeBudgetSeconds' in body:
+        budget = body['timeBudgetSeconds']
+        if isinstance(budget, bool) or not isinstance(budget, (int, float)) or budget <= 0:
+            return {
+                'valid': False,
+                'message': 'timeBudgetSeconds must be a positive number'
+            }
+
     return {'valid': True, 'message': 'Valid'}
 
-def process_person_data(request_body):
+def resolve_deadline(request_body, context):
+    """
+    Compute the monotonic-clock deadline of this invocation from the Lambda context
+    and the optional timeBudgetSeconds request field, whichever is sooner
+    """
+    budgets = []
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        budgets.append(context.get_remaining_time_in_millis() / 1000)
+    if request_body.get('timeBudgetSeconds'):
+        budgets.append(float(request_body['timeBudgetSeconds']))
+    if not budgets:
+        return None
+    logger.info(f"Time budget for this request: {min(budgets):.1f} seconds")
+    return time.monotonic() + min(budgets) - Config.DEADLINE_SAFETY_MARGIN
+
+def run_pipeline(name, country, designation, transactionId, sectionNameList, guardrail_profile=None, deadline=None,
+                 progress=None, execution_profile=None):
+    """
+    Run the configured AI pipeline for the given sections
+
+    guardrail_profile overrides the guardrails of the call that writes the final answer;
+    deadline (time.monotonic() seconds) makes the agent stop searching in time;
+    progress is an optional job_queue.JobProgress callback;
+    execution_profile is a Config.EXECUTION_PROFILES entry (search depth, limits, model)
+    """
+    # Process messages using AI
+    if Config.PIPELINE_MODE == "two_phase":
+        logger.info("initialize build graph")
+        graph = ai.get_graph(guardrail_profile=Config.GUARDRAIL_GATHER_PROFILE, execution_profile=execution_profile)
+        format_guardrail_profile = guardrail_profile or Config.GUARDRAIL_FORMAT_PROFILE
+        response, threadid = ai.process_messages_two_phase(
+            name=name,
+            countryName=country,
+            designation=designation,
+            transaction_id=transactionId,
+            sectionNameList=sectionNameList,
+            graph=graph,
+            format_model=ai.create_format_model(guardrail_profile=format_guardrail_profile,
+                                                execution_profile=execution_profile),
+            extract_tool=ai.get_extract_tool(),
+            format_guardrail_profile=format_guardrail_profile,
+            deadline=deadline,
+            progress=progress,
+            execution_profile=execution_profile
+        )
+    else:
+        logger.info("initialize build graph")
+        graph = ai.get_graph(guardrail_profile=guardrail_profile or Config.GUARDRAIL_PROFILE,
+                             execution_profile=execution_profile)
+        response, threadid = ai.process_messages(
+            name=name,
+            countryName=country,
+            designation=designation,
+            transaction_id=transactionId,
+            human_message_template=Config.HUMAN_MESSAGE_TEMPLATE,
+            sectionNameList=sectionNameList,
+            graph=graph,
+            deadline=deadline,
+            progress=progress,
+            execution_profile=execution_profile
+        )
+
+    logger.info(f"AI processing completed. Thread ID: {threadid}")
+    return response
+
+def refresh_person_data(name, country, designation, transactionId, sectionNameList, request_body, deadline=None,
+                        progress=None, execution_profile=None):
+    """
+    Update mode: regenerate only stale or requested sections and merge them into the previous profile
+    """
+    previous_sections = request_body['previousInfoSectionList']
+    freshness = request_body.get('sectionFreshness')
+    stale_sections = profile_refresh.select_stale_sections(
+        sectionNameList, previous_sections, freshness, request_body.get('refreshSections'))
+    if progress:
+        for sectionName in sectionNameList:
+            if sectionName not in stale_sections:
+                progress("section_done", name=sectionName)
+
+    if stale_sections:
+        regenerated = run_pipeline(name, country, designation, transactionId, stale_sections,
+                                   guardrail_profile=request_body.get('guardrailProfile'), deadline=deadline,
+                                   progress=progress, execution_profile=execution_profile)
+        # Only accept the sections that were asked for, even if the model returned more
+        regenerated_sections = [section for section in regenerated['InfoSectionList']
+                                if profile_refresh.section_name_of(section) in stale_sections]
+        sections = profile_refresh.merge_sections(sectionNameList, previous_sections, regenerated_sections)
+        # A stale section the model left out, e.g. after a deadline salvage, keeps its old
+        # content and timestamp so the next update regenerates it again
+        returned = {profile_refresh.section_name_of(section) for section in regenerated_sections}
+        refreshed_sections = [sectionName for sectionName in stale_sections if sectionName in returned]
+    else:
+        logger.info("All sections are fresh, returning previous profile")
+        sections = profile_refresh.merge_sections(sectionNameList, previous_sections, [])
+        refreshed_sections = []
+
+    if Config.POSTPROCESS_ENABLED:
+        # Merged sections can repeat entries the model re-phrased
+        sections = postprocess.postprocess_profile({"InfoSectionList": sections})["InfoSectionList"]
+
+    response = {
+        "TransactionId": transactionId,
+        "InfoSectionList": sections,
+        "SectionFreshness": profile_refresh.update_freshness(freshness, refreshed_sections),
+        "RegeneratedSections": refreshed_sections
+    }
+    if stale_sections and regenerated.get('partial'):
+        response['partial'] = True
+    return response
+
+def process_person_data(request_body, deadline=None, progress=None):
     """
     Process the validated person data
+
+    While the LLMaaS circuit is open, the last complete profile of the same person
+    and execution profile is returned, marked "servedFromCache", without running the pipeline.
     """
+    fallback_key = None
     try: 
         # Extract and clean the data
         name = request_body['name'].strip()
@@ -67,35 +237,202 @@ def process_person_data(request_body):
         
         logger.info(f"Processing data for Transaction No {transactionId}: Profile Name - {name}, Country - {country}, Designation - {designation}")
         
-        # Initialize AI graph
-        logger.info("initialize build graph")
-        graph = ai.create_graph()
-        
-        # Process messages using AI
-        response, threadid = ai.process_messages(
-            name=name,
-            countryName=country,
-            designation=designation,
-            transaction_id=transactionId,
-            human_message_template=Config.HUMAN_MESSAGE_TEMPLATE,
-            sectionNameList=["main_particulars", "education", "career", "appointments", "reference"],
-            graph=graph
-        )
-        
-        logger.info(f"AI processing completed. Thread ID: {threadid}")
+        profile_name = request_body.get('profile') or Config.EXECUTION_PROFILE
+        execution_profile = Config.EXECUTION_PROFILES[profile_name]
+        logger.info(f"Execution profile: {profile_name}")
+
+        # Fail fast instead of spending the retry cycle on a dependency known to be down
+        fallback_key = circuit_breaker.ProfileFallbackCache.make_key(name, country, designation, profile_name)
+        if circuit_breaker.get_breaker("llmaas").is_open():
+            raise circuit_breaker.get_breaker("llmaas").open_error()
+
+        sectionNameList = list(execution_profile['sections'])
+        execution_profile = search_stats.adapt_profile(execution_profile, sectionNameList, country)
+        if progress:
+            progress("sections", total=len(sectionNameList))
+        run_started = time.monotonic()
+        with ai_counter.track_run_usage() as usage:
+            if 'previousInfoSectionList' in request_body:
+                response = refresh_person_data(name, country, designation, transactionId, sectionNameList, request_body,
+                                               deadline=deadline, progress=progress, execution_profile=execution_profile)
+            else:
+                response = run_pipeline(name, country, designation, transactionId, sectionNameList,
+                                        guardrail_profile=request_body.get('guardrailProfile'), deadline=deadline,
+                                        progress=progress, execution_profile=execution_profile)
+        if 'previousInfoSectionList' not in request_body:
+            # Refresh runs cover only the stale sections, so only full runs feed the estimator
+            estimator.run_history.record(profile_name, sectionNameList, usage, time.monotonic() - run_started)
+        ai_counter.log_guardrail_latency_cost()
+        if Config.HEDGE_ENABLED:
+            logger.info(f"Hedging for Transaction No {transactionId}: {usage['hedges']} hedged calls, "
+                        f"{usage['hedge_wins']} won by the hedge; container totals {hedging.llm_hedge_policy.get_stats()}")
         
+        if not response.get('partial') and 'previousInfoSectionList' not in request_body:
+            circuit_breaker.profile_fallback_cache.put(fallback_key, response)
+
        # Return the AI response and transactionId
         return response
     
     except Exception as e:
+        open_error = circuit_breaker.find_open_error(e)
+        cached = circuit_breaker.profile_fallback_cache.get(fallback_key) if open_error and fallback_key else None
+        if cached is not None:
+            logger.warning(f"{str(open_error)}; serving the last cached profile for Transaction No {transactionId}")
+            return {**cached, 'TransactionId': transactionId, 'servedFromCache': True}
         logger.error(f"Error processing person data {request_body}: {str(e)}")
         raise Exception(f"Failed to process person data: {str(e)}")
 
+_job_queue = None
+
+def get_job_queue():
+    """Return the container-wide job queue, created on first use"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = job_queue.JobQueue(runner=process_person_data)
+    return _job_queue
+
+def handle_job_action(event, context):
+    """
+    Job mode: 'submit' queues the request and returns a job id, 'poll' returns the
+    status, progress and result of a job, 'work' processes queued jobs until the
+    invocation deadline is near
+    """
+    action = event.get('action')
+    if action == 'poll':
+        if not isinstance(event.get('jobId'), str) or not event['jobId'].strip():
+            return response_encoder.build_response(400, {
+                'error': 'Validation failed',
+                'message': 'jobId is required to poll a job'
+            }, event)
+        job = get_job_queue().poll(event['jobId'].strip())
+        if job is None:
+            return response_encoder.build_response(404, {
+                'error': 'Job not found',
+                'message': f"No job with id {event['jobId']}"
+            }, event)
+        return response_encoder.build_response(200, job, event)
+
+    if action == 'work':
+        processed = get_job_queue().drain(deadline=resolve_deadline(event, context))
+        return response_encoder.build_response(200, {'processed': processed}, event)
+
+    validation_result = validate_request_body(event)
+    if not validation_result['valid']:
+        return response_encoder.build_response(400, {
+            'error': 'Validation failed',
+            'message': validation_result['message']
+        }, event)
+    request_body = {key: value for key, value in event.items() if key not in ('action', 'headers')}
+    job_id = get_job_queue().submit(request_body)
+    return response_encoder.build_response(202, {
+        'jobId': job_id,
+        'status': job_queue.QUEUED,
+        'TransactionId': request_body['transactionId']
+    }, event)
+
 def context_timestamp():
     """Generate timestamp for response"""
     from datetime import datetime
     return datetime.timezone.utc.isoformat() + 'Z'
 
+def handle_estimate(event):
+    """Return the pre-flight estimate of a request with the given (or default) execution profile, without running it"""
+    profile_name = event.get('profile') or Config.EXECUTION_PROFILE
+    if profile_name not in Config.EXECUTION_PROFILES:
+        return response_encoder.build_response(400, {
+            'error': 'Validation failed',
+            'message': f"profile must be one of: {', '.join(Config.EXECUTION_PROFILES.keys())}"
+        }, event)
+    return response_encoder.build_response(200, {'estimate': estimator.estimate_request(profile_name)}, event)
+
+def admit_request(request_body, deadline, event):
+    """
+    Apply admission control to a validated request
+
+    Returns:
+        tuple: (request body to run, possibly with a downgraded profile; admission summary
+            added to the response of a downgraded request, else None; response to return
+            instead of running when the request is queued or rejected, else None)
+    """
+    requested_profile = request_body.get('profile') or Config.EXECUTION_PROFILE
+    decision = estimator.admission_controller.decide(requested_profile, deadline)
+    summary = {'action': decision['action'], 'profile': decision['profile'], 'reason': decision['reason'],
+               'estimate': decision['estimate']}
+    if decision['action'] == estimator.QUEUE:
+        job_id = get_job_queue().submit({key: value for key, value in request_body.items() if key != 'headers'})
+        return request_body, summary, response_encoder.build_response(202, {
+            'jobId': job_id,
+            'status': job_queue.QUEUED,
+            'TransactionId': request_body['transactionId'],
+            'admission': summary
+        }, event)
+    if decision['action'] == estimator.REJECT:
+        retry_after = decision.get('retryAfterSeconds')
+        return request_body, summary, response_encoder.build_response(429, {
+            'error': 'Request not admitted',
+            'message': f"Estimated load exceeds the configured limits ({decision['reason']})",
+            'admission': summary
+        }, event, headers={'Retry-After': str(retry_after)} if retry_after else None)
+    if decision['action'] == estimator.DOWNGRADE:
+        summary['requestedProfile'] = requested_profile
+        return {**request_body, 'profile': decision['profile']}, summary, None
+    return request_body, None, None
+
+def is_warmup_event(event):
+    """A {"action": "warmup"} event, or an EventBridge scheduled ping"""
+    return isinstance(event, dict) and (event.get('action') == WARMUP_ACTION or event.get('source') == 'aws.events')
+
+def handle_warmup(event, context):
+    """
+    Initialise the expensive parts of the runtime without running an agent
+
+    Builds and caches the graph of every execution profile, as adapted to the search
+    history for the countries seen most (search_stats.warmup_profiles), loads the tiktoken
+    encodings, opens pooled connections to LLMaaS and Tavily and loads the local
+    caches. A failing step is reported and does not stop the others.
+
+    Returns:
+        dict: Seconds taken and outcome of each step
+    """
+    def build_graphs():
+        # Same guardrail profile as run_pipeline uses without a request override
+        if Config.PIPELINE_MODE == "two_phase":
+            guardrail_profile = Config.GUARDRAIL_GATHER_PROFILE
+        else:
+            guardrail_profile = Config.GUARDRAIL_PROFILE
+        # Requests run with their profile adapted to the search history, so warm those graphs
+        execution_profiles = search_stats.warmup_profiles(list(Config.EXECUTION_PROFILES.values()),
+                                                          Config.GRAPH_CACHE_MAXENTRIES)
+        for execution_profile in execution_profiles:
+            ai.get_graph(guardrail_profile=guardrail_profile, execution_profile=execution_profile)
+        return {'graphs': len(execution_profiles)}
+
+    steps = {
+        'graph': build_graphs,
+        'tiktoken': lambda: ai_counter.preload_encodings(sorted(set(ai_counter.MODEL_ENCODINGS.values()))),
+        'connections': lambda: transport.warm_connections(event.get('connections', Config.WARMUP_CONNECTIONS)),
+        'caches': lambda: {'nameVariants': name_variants.name_variant_cache.get_stats()['entries'],
+                           'searchStats': search_stats.search_stats.get_stats()['entries'],
+                           'runHistory': estimator.run_history.get_stats()['entries'],
+                           'jobBackend': type(get_job_queue().backend).__name__},
+    }
+    timings = {}
+    started = time.perf_counter()
+    for step, run in steps.items():
+        step_started = time.perf_counter()
+        try:
+            detail = run()
+            timings[step] = {'ok': True, 'seconds': round(time.perf_counter() - step_started, 4), **(detail or {})}
+        except Exception as e:
+            logger.warning(f"Warm-up step {step} failed: {str(e)}")
+            timings[step] = {'ok': False, 'seconds': round(time.perf_counter() - step_started, 4), 'error': str(e)}
+    total = round(time.perf_counter() - started, 4)
+    logger.info(f"Warm-up completed in {total} seconds: {timings}")
+    # Latency and hedging of the calls this container has served
+    return response_encoder.build_response(200, {'warmup': True, 'totalSeconds': total, 'steps': timings,
+                                                 'guardrailLatency': ai_counter.get_guardrail_latency_cost(),
+                                                 'hedging': hedging.llm_hedge_policy.get_stats()}, event)
+
 def lambda_handler(event, context):
     """
     AWS Lambda function to handle POST requests with name/country/designation JSON body
@@ -106,59 +443,62 @@ def lambda_handler(event, context):
         logger.info(f"Received event: {event}")
         
         request_body = event
+
+        if isinstance(event, dict) and event.get('action') in JOB_ACTIONS:
+            return handle_job_action(event, context)
+
+        if is_warmup_event(event):
+            return handle_warmup(event, context)
+
+        if isinstance(event, dict) and event.get('action') == ESTIMATE_ACTION:
+            return handle_estimate(event)
         
         # Validate and process the request body
         validation_result = validate_request_body(request_body)
         if not validation_result['valid']:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'error': 'Validation failed',
-                    'message': validation_result['message']
-                })
-            }
+            return response_encoder.build_response(400, {
+                'error': 'Validation failed',
+                'message': validation_result['message']
+            }, event)
         
-        # Process the valid request using AI
-        try:
-            response_data = process_person_data(request_body)
-        except Exception as e:
-            logger.error(f"Error in AI processing: {str(e)}")
-            return {
-                'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
+        deadline = resolve_deadline(request_body, context)
+        admission = None
+        reserved = False
+        if Config.ADMISSION_ENABLED:
+            request_body, admission, admission_response = admit_request(request_body, deadline, event)
+            if admission_response is not None:
+                return admission_response
+            # decide() took the in-flight slot of the admitted request
+            reserved = True
+
+        # Process the valid request using AI, profiled when the environment or the request asks for it
+        # running() is entered first so the reserved slot is released even if profiling fails to start
+        with estimator.admission_controller.running(reserved), \
+                profiling.transaction(request_body.get('transactionId'), enabled=profiling.is_requested(request_body)):
+            try:
+                response_data = process_person_data(request_body, deadline=deadline)
+                if admission is not None:
+                    response_data = {**response_data, 'admission': admission}
+            except Exception as e:
+                logger.error(f"Error in AI processing: {str(e)}")
+                open_error = circuit_breaker.find_open_error(e)
+                if open_error is not None:
+                    return response_encoder.build_response(503, {
+                        'error': 'Service temporarily unavailable',
+                        'message': str(open_error),
+                        'retryAfterSeconds': round(open_error.retry_after)
+                    }, event, headers={'Retry-After': str(max(1, round(open_error.retry_after)))})
+                return response_encoder.build_response(500, {
                     'error': 'Internal server error during AI processing',
                     'message': str(e)
-                })
-            }
-       
-        # Return successful response
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps(response_data)
-        }
+                }, event)
+
+            # Return successful response
+            return response_encoder.build_response(200, response_data, event)
        
     except Exception as e:
         logger.error(f"Unexpected error in lambda_handler: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'error': 'Internal server error',
-                'message': str(e)
-            })
-        }
\ No newline at end of file
+        return response_encoder.build_response(500, {
+            'error': 'Internal server error',
+            'message': str(e)
+        }, event)
\ No newline at end of file
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Local load test for lambda_handler
+
+Starts local stand-ins for the OpenAI-compatible LLMaaS endpoint and the Tavily API,
+points Config.LLMAAS_BASEURL and Config.TAVILY_BASEURL at them, fires concurrent
+requests at lambda_handler and reports throughput, latency percentiles and errors.
+No real quota is used.
+
+Example:
+    python loadtest.py --requests 200 --concurrency 20 --llm-latency lognormal:1.5,0.5 \
+        --tavily-latency uniform:0.2,0.8 --llm-429-rate 0.05 --tavily-error-rate 0.02
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Placeholder keys so the stand-ins are never called with real credentials
+os.environ["TAVILY_API_KEY"] = "loadtest"
+os.environ["LLMAAS_OPENAI_API_KEY"] = "loadtest"
+
+from config import Config
+from ai_counter import LatencyTracker
+
+SAMPLE_PROFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sampledata_r2.json")
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """
+    Parse a latency distribution spec into a sampler returning seconds
+
+    Supported specs:
+        fixed:S, uniform:MIN,MAX, exp:MEAN, lognormal:MEDIAN,SIGMA
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",") if value]
+    if kind == "fixed" and len(values) == 1:
+        return lambda: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "exp" and len(values) == 1:
+        return lambda: random.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+    if kind == "lognormal" and len(values) == 2:
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    raise argparse.ArgumentTypeError(f"Invalid latency spec: {spec}")
+
+
+class ServiceProfile:
+    """Latency and failure behaviour of one stand-in service"""
+
+    def __init__(self, latency: Callable[[], float], error_rate: float, rate_limit_rate: float, retry_after: Optional[float]):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+
+
+class StandInStats:
+    """Thread-safe counters of stand-in requests and injected failures, per endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Counter] = {}
+
+    def record(self, endpoint: str, outcome: str):
+        with self._lock:
+            self._counters.setdefault(endpoint, Counter())[outcome] += 1
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {endpoint: dict(counter) for endpoint, counter in self._counters.items()}
+
+
+class StandInServer:
+    """
+    One local HTTP server answering /chat/completions, /search and /extract
+
+    The LLM stand-in asks for search_calls searches on the first turn after a human
+    message and answers with the sample profile afterwards, so each request makes
+    the same number of LLM and Tavily calls as a short real run.
+    """
+
+    def __init__(self, llm: ServiceProfile, tavily: ServiceProfile, search_calls: int = 2):
+        with open(SAMPLE_PROFILE) as f:
+            profile = json.load(f)["InfoSectionList"]
+        self.answer = "```json\n" + json.dumps(profile) + "\n```"
+        self.llm = llm
+        self.tavily = tavily
+        self.search_calls = search_calls
+        self.stats = StandInStats()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def chat_completion(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        messages = body.get("messages", [])
+        last_human = max((index for index, message in enumerate(messages) if message.get("role") == "user"), default=-1)
+        searched = any(message.get("role") == "tool" for message in messages[last_human + 1:])
+        if body.get("tools") and not searched:
+            # Derive the queries from the prompt so different names miss the search cache
+            seed = hashlib.sha1(json.dumps(messages[last_human] if messages else {}).encode()).hexdigest()[:8]
+            message = {"role": "assistant", "content": None, "tool_calls": [
+                {"id": f"call_{seed}_{index}", "type": "function",
+                 "function": {"name": "tavily_search", "arguments": json.dumps({"query": f"{seed} profile {index}"})}}
+                for index in range(self.search_calls)
+            ]}
+        else:
+            message = {"role": "assistant", "content": self.answer}
+        return {
+            "id": "chatcmpl-loadtest",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "loadtest"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": message}],
+            "usage": {"prompt_tokens": 1000, "completion_tokens": 500, "total_tokens": 1500},
+        }
+
+    @staticmethod
+    def search(body: Dict[str, Any]) -> Dict[str, Any]:
+        query = body.get("query", "")
+        return {"query": query, "response_time": 0.1, "results": [
+            {"url": f"https://example.org/{query.replace(' ', '-')}/{index}", "title": f"{query} result {index}",
+             "content": f"{query}: graduated from university in 1984 and served as ambassador from 2017 to 2019.",
+             "score": 0.9 - index * 0.1}
+            for index in range(body.get("max_results") or 5)
+        ]}
+
+    @staticmethod
+    def extract(body: Dict[str, Any]) -> Dict[str, Any]:
+        urls = body.get("urls") or []
+        urls = [urls] if isinstance(urls, str) else urls
+        content = "Graduated from university in 1984.\nServed as ambassador to the United Nations from 2017 to 2019.\n"
+        return {"results": [{"url": url, "raw_content": content * 5} for url in urls], "failed_results": []}
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                endpoint = self.path.rstrip("/").rsplit("/", 1)[-1]
+                profile = stand_in.llm if endpoint == "completions" else stand_in.tavily
+                time.sleep(max(0.0, profile.latency()))
+
+                draw = random.random()
+                if draw < profile.rate_limit_rate:
+                    stand_in.stats.record(endpoint, "429")
+                    headers = {"Retry-After": str(profile.retry_after)} if profile.retry_after is not None else {}
+                    return self._send(429, {"error": {"message": "Rate limit exceeded"}, "detail": {"error": "Rate limit exceeded"}}, headers)
+                if draw < profile.rate_limit_rate + profile.error_rate:
+                    stand_in.stats.record(endpoint, "500")
+                    return self._send(500, {"error": {"message": "Injected failure"}, "detail": {"error": "Injected failure"}})
+
+                if endpoint == "completions":
+                    payload = stand_in.chat_completion(body)
+                elif endpoint == "search":
+                    payload = stand_in.search(body)
+                elif endpoint == "extract":
+                    payload = stand_in.extract(body)
+                else:
+                    stand_in.stats.record(endpoint, "404")
+                    return self._send(404, {"detail": {"error": f"Unknown endpoint {self.path}"}})
+                stand_in.stats.record(endpoint, "200")
+                self._send(200, payload)
+
+            def _send(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class MockContext:
+    """Minimal Lambda context with a fixed timeout measured from creation"""
+
+    def __init__(self, timeout_seconds: float):
+        self.deadline = time.monotonic() + timeout_seconds
+        self.aws_request_id = "loadtest"
+
+    def get_remaining_time_in_millis(self) -> int:
+        return int(max(0.0, self.deadline - time.monotonic()) * 1000)
+
+
+def run_load(lambda_handler, requests: int, concurrency: int, lambda_timeout: float,
+             unique_names: bool = True, extra_fields: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Fire requests at lambda_handler from concurrency threads and collect per-request outcomes
+
+    Returns:
+        dict: Throughput, latency percentiles, status codes and error messages
+    """
+    latencies = LatencyTracker(max_samples=max(1, requests))
+    statuses: Counter = Counter()
+    errors: Counter = Counter()
+    partial = 0
+    lock = threading.Lock()
+
+    def one_request(index: int):
+        nonlocal partial
+        event = {
+            "name": f"Load Test Person {index}" if unique_names else "Load Test Person",
+            "country": "Singapore",
+            "designation": "Minister",
+            "transactionId": f"LOADTEST-{index}",
+            **(extra_fields or {}),
+        }
+        start = time.perf_counter()
+        try:
+            response = lambda_handler(event, MockContext(lambda_timeout))
+            status = str(response.get("statusCode"))
+            body = json.loads(response.get("body") or "{}")
+        except Exception as e:
+            status, body = "exception", {"message": f"{e.__class__.__name__}: {str(e)}"}
+        elapsed = time.perf_counter() - start
+        latencies.record("all", elapsed)
+        latencies.record(status, elapsed)
+        with lock:
+            statuses[status] += 1
+            if status != "200":
+                errors[str(body.get("message", body.get("error", "")))[:160]] += 1
+            elif body.get("partial"):
+                partial += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="loadtest") as executor:
+        list(executor.map(one_request, range(requests)))
+    wall = time.perf_counter() - start
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "wall_seconds": wall,
+        "throughput_rps": requests / wall if wall else 0.0,
+        "latency_seconds": {
+            "p50": latencies.percentile("all", 50),
+            "p95": latencies.percentile("all", 95),
+            "p99": latencies.percentile("all", 99),
+            "max": latencies.percentile("all", 100),
+        },
+        "latency_by_status": latencies.get_stats(),
+        "status_codes": dict(statuses),
+        "partial_responses": partial,
+        "errors": dict(errors.most_common()),
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    latency = report["latency_seconds"]
+    print("=" * 60)
+    print(f"Requests: {report['requests']}  Concurrency: {report['concurrency']}  Wall: {report['wall_seconds']:.1f}s")
+    print(f"Throughput: {report['throughput_rps']:.2f} req/s")
+    print(f"Latency p50/p95/p99/max: {latency['p50']:.2f}s / {latency['p95']:.2f}s / {latency['p99']:.2f}s / {latency['max']:.2f}s")
+    print(f"Status codes: {report['status_codes']}  Partial responses: {report['partial_responses']}")
+    for message, count in report["errors"].items():
+        print(f"  {count:5d}  {message}")
+    print("Stand-in calls:")
+    for endpoint, outcomes in report["stand_in"].items():
+        print(f"  {endpoint:12s} {outcomes}")
+    print("Client retries:")
+    for target, counters in report["transport"]["targets"].items():
+        print(f"  {target:12s} attempts={counters['attempts']} retries={counters['retries']} "
+              f"exhausted={counters['retries_exhausted']} backoff={counters['backoff_seconds']:.1f}s")
+    checkpoints = report["checkpoints"]
+    print(f"Checkpoints held: {checkpoints['threads']} threads, {checkpoints['approx_bytes'] / 1e6:.1f} MB, "
+          f"evictions {checkpoints['evictions']}")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test lambda_handler against local LLMaaS and Tavily stand-ins")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--lambda-timeout", type=float, default=900, help="Simulated Lambda timeout in seconds")
+    parser.add_argument("--llm-latency", type=parse_latency, default="lognormal:1.0,0.5")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-429-rate", type=float, default=0.0)
+    parser.add_argument("--tavily-latency", type=parse_latency, default="uniform:0.3,1.0")
+    parser.add_argument("--tavily-error-rate", type=float, default=0.0)
+    parser.add_argument("--tavily-429-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=None, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--search-calls", type=int, default=2, help="Searches the LLM stand-in requests per request")
+    parser.add_argument("--pipeline-mode", choices=["single", "two_phase"], default=Config.PIPELINE_MODE)
+    parser.add_argument("--profile", choices=sorted(Config.EXECUTION_PROFILES), help="Execution profile of the requests")
+    parser.add_argument("--same-name", action="store_true", help="Use one name for every request so caches are hit")
+    parser.add_argument("--throttle", type=float, default=Config.THROTTLESPEED, help="Seconds between LLM turns")
+    parser.add_argument("--log-level", default="WARNING", help="Log level of the application under test")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    stand_in = StandInServer(
+        llm=ServiceProfile(args.llm_latency, args.llm_error_rate, args.llm_429_rate, args.retry_after),
+        tavily=ServiceProfile(args.tavily_latency, args.tavily_error_rate, args.tavily_429_rate, args.retry_after),
+        search_calls=args.search_calls,
+    )
+    stand_in.start()
+    # Stand-in runs must not feed the estimator history, search stats or caches of real runs
+    state_dir = tempfile.TemporaryDirectory(prefix="loadtest-")
+
+    # Must be set before ai is imported: its default arguments are bound at import time
+    Config.ESTIMATE_HISTORY_PATH = os.path.join(state_dir.name, "run_history.json")
+    Config.SEARCH_STATS_PATH = os.path.join(state_dir.name, "search_stats.json")
+    Config.NAME_VARIANT_CACHE_PATH = os.path.join(state_dir.name, "name_variants.json")
+    Config.JOB_SQLITE_PATH = os.path.join(state_dir.name, "profile_jobs.sqlite3")
+    Config.LLMAAS_BASEURL = stand_in.url
+    Config.TAVILY_BASEURL = stand_in.url
+    Config.PIPELINE_MODE = args.pipeline_mode
+    Config.THROTTLESPEED = args.throttle
+    for execution_profile in Config.EXECUTION_PROFILES.values():
+        execution_profile["throttle"] = min(execution_profile["throttle"], args.throttle)
+
+    import checkpoint_store
+    import transport
+    from lambda_function import lambda_handler
+    # Every module import reconfigures the root logger, so set the level once they are all loaded
+    logging.getLogger().setLevel(args.log_level.upper())
+
+    print(f"Stand-ins listening on {stand_in.url}, running {args.requests} requests at concurrency {args.concurrency}")
+    try:
+        report = run_load(lambda_handler, args.requests, args.concurrency, args.lambda_timeout,
+                          unique_names=not args.same_name, extra_fields={"profile": args.profile} if args.profile else None)
+    finally:
+        stand_in.stop()
+        state_dir.cleanup()
+    report["stand_in"] = stand_in.stats.get_stats()
+    report["transport"] = transport.get_transport_stats()
+    report["checkpoints"] = checkpoint_store.checkpointer.get_stats()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+import json
+import os
+import re
+import threading
+import unicodedata
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+#Logging
+import customLogging
+
+#Custom imports
+from config import Config
+
+logger = customLogging.safe_logger_setup()
+
+# Countries where the family name is written first
+FAMILY_FIRST_COUNTRIES = {"korea", "china", "taiwan", "japan", "vietnam", "viet nam", "hungary", "mongolia", "cambodia"}
+
+# Countries whose names are usually written in a non-Latin script and romanised in several ways;
+# with FAMILY_FIRST_COUNTRIES, the only ones whose Latin-script names are looked up with the model
+TRANSLITERATION_COUNTRIES = {
+    "hong kong", "macau", "singapore", "thailand", "laos", "myanmar", "india", "pakistan", "bangladesh", "nepal",
+    "sri lanka", "afghanistan", "iran", "iraq", "saudi arabia", "united arab emirates", "uae", "qatar", "kuwait",
+    "bahrain", "oman", "yemen", "jordan", "syria", "lebanon", "egypt", "libya", "israel", "russia", "ukraine",
+    "belarus", "kazakhstan", "kyrgyzstan", "tajikistan", "serbia", "bulgaria", "north macedonia", "greece",
+    "georgia", "armenia", "ethiopia",
+}
+
+# Common alternative romanisations of family names (lower case -> variants)
+FAMILY_NAME_ROMANISATIONS: Dict[str, List[str]] = {
+    "cho": ["Jo", "Joh"], "jo": ["Cho"], "lee": ["Yi", "Rhee", "Ri"], "yi": ["Lee"], "rhee": ["Lee", "Yi"],
+    "park": ["Bak", "Pak"], "kim": ["Gim"], "choi": ["Choe"], "jung": ["Chung", "Jeong"], "chung": ["Jung", "Jeong"],
+    "jeong": ["Jung", "Chung"], "kang": ["Gang"], "yoon": ["Yun"], "yun": ["Yoon"], "shin": ["Sin"], "han": ["Hahn"],
+    "oh": ["O"], "lim": ["Im"], "im": ["Lim"], "ryu": ["Yoo", "Yu"], "yoo": ["Ryu", "Yu"],
+    "zhang": ["Chang", "Cheung"], "wang": ["Wong"], "chen": ["Chan", "Chin"], "li": ["Lee"], "liu": ["Lau"],
+    "huang": ["Wong"], "zhou": ["Chow", "Chou"], "wu": ["Ng", "Woo"], "xu": ["Hsu", "Tsui"], "zhao": ["Chao", "Chiu"],
+    "nguyen": ["Nguyễn"], "tran": ["Trần"], "le": ["Lê"],
+    "mohammed": ["Muhammad", "Mohamed", "Mohammad"], "muhammad": ["Mohammed", "Mohamed", "Mohammad"],
+    "mohamed": ["Mohammed", "Muhammad"], "abdul": ["Abdel", "Abd al"], "abdel": ["Abdul", "Abd al"],
+    "hussein": ["Husain", "Hussain"], "husain": ["Hussein", "Hussain"], "al": ["El"],
+}
+
+JSON_BLOCK_PATTERN = re.compile(r"\{.*\}", re.DOTALL)
+
+
+def is_family_first(countryName: str) -> bool:
+    country = (countryName or "").lower()
+    return any(name in country for name in FAMILY_FIRST_COUNTRIES)
+
+
+def needs_model_lookup(countryName: str) -> bool:
+    """True for countries whose names have native-script forms or competing romanisations worth asking the model for"""
+    country = " ".join(re.findall(r"[a-z]+", (countryName or "").lower()))
+    return is_family_first(countryName) or \
+        any(re.search(rf"\b{re.escape(name)}\b", country) for name in TRANSLITERATION_COUNTRIES)
+
+
+def is_native_script(name: str) -> bool:
+    """True when the name contains letters of a non-Latin script"""
+    return any(ch.isalpha() and not unicodedata.name(ch, "").startswith("LATIN") for ch in name)
+
+
+def split_family_name(name: str, countryName: str):
+    """Return (family name, given name tokens), the family name coming first in family-first countries"""
+    tokens = name.split()
+    if not tokens:
+        return "", []
+    family_index = 0 if is_family_first(countryName) and len(tokens) > 1 else len(tokens) - 1
+    return tokens[family_index], tokens[:family_index] + tokens[family_index + 1:]
+
+
+def romanisation_variants(name: str, countryName: str, family_romanisations: Optional[List[str]] = None) -> List[str]:
+    """
+    Deterministic spelling variants of a romanised name
+
+    Covers hyphenation of given names (Tae-yul, Taeyul, Tae Yul), common alternative
+    romanisations of the family name, including those the model returned for the
+    family name before (family_romanisations), and, for family-first countries, the
+    western name order.
+    """
+    family, given = split_family_name(name, countryName)
+    if not family:
+        return []
+    family_first = is_family_first(countryName) and bool(given)
+
+    given_forms = {" ".join(given)}
+    if any("-" in token for token in given):
+        given_forms.add(" ".join(token.replace("-", "") for token in given))
+        given_forms.add(" ".join(token.replace("-", " ").title() for token in given))
+    family_forms = [family] + FAMILY_NAME_ROMANISATIONS.get(family.lower(), []) + list(family_romanisations or [])
+
+    variants = []
+    reordered = []
+    for family_form in family_forms:
+        for given_form in sorted(given_forms):
+            if not given_form:
+                variants.append(family_form)
+            elif family_first:
+                variants.append(f"{family_form} {given_form}")
+                reordered.append(f"{given_form} {family_form}")
+            else:
+                variants.append(f"{given_form} {family_form}")
+    # Western order is the least distinctive, so it comes last and is cut first
+    variants += reordered
+    seen = {name.lower()}
+    unique = []
+    for variant in variants:
+        if variant.lower() not in seen:
+            seen.add(variant.lower())
+            unique.append(variant)
+    return unique
+
+
+LLM_VARIANT_KEYS = ("native", "romanised", "family_native", "family_romanised")
+
+
+def parse_llm_variants(text: str) -> Dict[str, List[str]]:
+    """Parse the {"native": [...], "romanised": [...], "family_native": [...], "family_romanised": [...]}
+    reply of the variant prompt, tolerating code fences"""
+    match = JSON_BLOCK_PATTERN.search(text or "")
+    empty = {key: [] for key in LLM_VARIANT_KEYS}
+    if not match:
+        return empty
+    try:
+        payload = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return empty
+    if not isinstance(payload, dict):
+        return empty
+    parsed = {}
+    for key in LLM_VARIANT_KEYS:
+        values = payload.get(key) or []
+        parsed[key] = [value.strip() for value in values if isinstance(value, str) and value.strip()] \
+            if isinstance(values, list) else []
+    return parsed
+
+
+class NameVariantCache:
+    """
+    Thread-safe cache of name variants keyed on (name, country), persisted as JSON
+
+    Family names are cached under their own (family name, country) keys, so that
+    everyone sharing a family name benefits from one model lookup.
+
+    Args:
+        path: JSON file the cache is loaded from and saved to; None keeps it in memory
+        max_entries: Oldest entries are dropped beyond this size
+    """
+
+    def __init__(self, path: Optional[str] = Config.NAME_VARIANT_CACHE_PATH,
+                 max_entries: int = Config.NAME_VARIANT_CACHE_MAXENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries: Optional[Dict[str, Dict]] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(name: str, countryName: str) -> str:
+        return f"{' '.join(name.lower().split())}|{' '.join((countryName or '').lower().split())}"
+
+    @classmethod
+    def make_family_key(cls, family: str, countryName: str) -> str:
+        return f"family:{cls.make_key(family, countryName)}"
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._entries is None:
+            self._entries = {}
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path, encoding="utf-8") as f:
+                        self._entries = json.load(f)
+                    logger.info(f"Loaded {len(self._entries)} cached name variants from {self.path}")
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Could not load name variant cache {self.path}: {str(e)}")
+        return self._entries
+
+    def _get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._load().get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def get(self, name: str, countryName: str) -> Optional[Dict]:
+        return self._get(self.make_key(name, countryName))
+
+    def get_family(self, family: str, countryName: str) -> Optional[Dict]:
+        return self._get(self.make_family_key(family, countryName))
+
+    def put(self, name: str, countryName: str, variants: Dict[str, List[str]]):
+        self._put(self.make_key(name, countryName), variants)
+
+    def put_family(self, family: str, countryName: str, variants: Dict[str, List[str]]):
+        self._put(self.make_family_key(family, countryName), variants)
+
+    def _put(self, key: str, variants: Dict[str, List[str]]):
+        with self._lock:
+            entries = self._load()
+            entries.pop(key, None)
+            entries[key] = {**variants, "updated": datetime.now(timezone.utc).isoformat()}
+            while len(entries) > self.max_entries:
+                entries.pop(next(iter(entries)))
+            self._save(entries)
+
+    def _save(self, entries: Dict[str, Dict]):
+        if not self.path:
+            return
+        temporary = f"{self.path}.tmp"
+        try:
+            with open(temporary, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(temporary, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save name variant cache {self.path}: {str(e)}")
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._load()), "hits": self.hits, "misses": self.misses}
+
+
+name_variant_cache = NameVariantCache()
+
+
+def expand_name(name: str, countryName: str, llm: Optional[Callable[[str], str]] = None,
+                cache: NameVariantCache = name_variant_cache) -> Dict[str, List[str]]:
+    """
+    Return native-script forms and romanisation variants of a name
+
+    Cached results are returned without any model call. On a cache miss the
+    deterministic variants are combined with the native-script forms and extra
+    romanisations returned by llm(prompt). Only names from countries that
+    needs_model_lookup accepts are looked up; others get the deterministic variants
+    alone, uncached as they are cheap to rebuild. Names that are already written in a
+    non-Latin script, and names whose family name the model found to have no
+    native-script form before, need no model call either. Without llm, e.g. when the run
+    deadline is close, only the deterministic variants are returned and nothing is
+    cached, so that a later request can still ask the model.
+
+    Args:
+        name: Profile name as given in the request
+        countryName: Country of the profile
+        llm: Function sending a prompt to the model and returning its text, or None
+    Returns:
+        dict: {"native": [...], "romanised": [...]}
+    """
+    cached = cache.get(name, countryName)
+    if cached is not None:
+        return {"native": cached.get("native", []), "romanised": cached.get("romanised", [])}
+
+    family, _ = split_family_name(name, countryName)
+    family_entry = cache.get_family(family, countryName) if family else None
+    family_romanisations = family_entry.get("romanised", []) if family_entry else []
+    variants = {"native": [], "romanised": romanisation_variants(name, countryName, family_romanisations)}
+    if is_native_script(name):
+        variants["native"] = [name]
+    elif not needs_model_lookup(countryName):
+        # e.g. an English name: the rule-based variants are all there is to find
+        return {key: values[:Config.NAME_VARIANT_MAX] for key, values in variants.items()}
+    elif family_entry is not None and not family_entry.get("native"):
+        logger.info(f"Family name {family} ({countryName}) has no native-script form, skipping the model lookup")
+    elif llm is not None:
+        try:
+            reply = parse_llm_variants(llm(Config.NAME_VARIANT_PROMPT.format(name=name, countryName=countryName,
+                                                                             family=family)))
+        except Exception as e:
+            # Not cached, so the next request for this name tries the model again
+            logger.warning(f"Name variant lookup failed for {name}: {str(e)}")
+            return variants
+        cache.put_family(family, countryName, {"native": reply["family_native"][:Config.NAME_VARIANT_MAX],
+                                               "romanised": reply["family_romanised"][:Config.NAME_VARIANT_MAX]})
+        variants["native"] = reply["native"]
+        # The model's spellings are the ones in actual use, so they come before the generated ones
+        generated = romanisation_variants(name, countryName, family_romanisations + reply["family_romanised"])
+        known = {variant.lower() for variant in reply["romanised"]} | {name.lower()}
+        variants["romanised"] = [variant for variant in reply["romanised"] if variant.lower() != name.lower()] + \
+                                [variant for variant in generated if variant.lower() not in known]
+    else:
+        return {key: values[:Config.NAME_VARIANT_MAX] for key, values in variants.items()}
+
+    variants = {key: values[:Config.NAME_VARIANT_MAX] for key, values in variants.items()}
+    cache.put(name, countryName, variants)
+    logger.info(f"Name variants for {name} ({countryName}): {variants}")
+    return variants
+
+
+def format_variants(variants: Dict[str, List[str]]) -> str:
+    """Render variants as the prompt hint, or an empty string when there are none"""
+    names = variants.get("native", []) + variants.get("romanised", [])
+    if not names:
+        return ""
+    return f" Also search using these name variants: {', '.join(names)}."
+
+
+def search_queries(variants: Dict[str, List[str]], countryName: str, limit: int = Config.NAME_VARIANT_SEARCHES) -> List[str]:
+    """
+    Extra search queries for the top variants
+
+    Native-script forms are searched on their own, as they rarely collide with other
+    people; romanised variants are qualified with the country.
+    """
+    queries = variants.get("native", []) + [f"{variant} {countryName}".strip() for variant in variants.get("romanised", [])]
+    return queries[:max(0, limit)]
@@ -0,0 +1,231 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+#Logging
+import customLogging
+
+#Custom imports
+from config import Config
+from prompt_template import SECTION_TEMPLATES
+
+logger = customLogging.safe_logger_setup()
+
+MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3, "apr": 4, "april": 4,
+    "may": 5, "jun": 6, "june": 6, "jul": 7, "july": 7, "aug": 8, "august": 8, "sep": 9, "sept": 9,
+    "september": 9, "oct": 10, "october": 10, "nov": 11, "november": 11, "dec": 12, "december": 12,
+}
+MONTH_NAMES = ["", "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+MONTH_PATTERN = r"(" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\.?"
+PRESENT_WORDS = {"present", "current", "now", "ongoing", "today", "incumbent"}
+
+DATE_PATTERNS = [
+    (re.compile(r"^(\d{4})-(\d{1,2})-(\d{1,2})$"), ("y", "m", "d")),
+    (re.compile(r"^(\d{1,2})[./\s-](\d{1,2})[./\s-](\d{4})$"), ("d", "m", "y")),
+    (re.compile(r"^(\d{1,2})(?:st|nd|rd|th)?\s+" + MONTH_PATTERN + r",?\s+(\d{4})$", re.I), ("d", "M", "y")),
+    (re.compile(r"^" + MONTH_PATTERN + r"\s+(\d{1,2})(?:st|nd|rd|th)?,?\s+(\d{4})$", re.I), ("M", "d", "y")),
+    (re.compile(r"^" + MONTH_PATTERN + r",?\s+(\d{4})$", re.I), ("M", "y")),
+    (re.compile(r"^(\d{4})-(\d{1,2})$"), ("y", "m")),
+    (re.compile(r"^(\d{1,2})[/.-](\d{4})$"), ("m", "y")),
+    (re.compile(r"^(?:c\.\s*|circa\s+)?(\d{4})$", re.I), ("y",)),
+]
+TRAILING_PERIOD = re.compile(r"\(([^()]*)\)\s*$")
+RANGE_SEPARATOR = re.compile(r"\s+(?:-|to|until)\s+|\s*[–—]\s*", re.I)
+COMPACT_RANGE = re.compile(r"^([^-\s]+(?:\s+\d{4})?)\s*-\s*(\S+(?:\s+\d{4})?)$")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = {"of", "the", "and", "for", "to", "in", "at", "on", "a", "an", "de", "du"}
+
+# (year, month, day); month and day are 0 when unknown
+ParsedDate = Tuple[int, int, int]
+
+
+def parse_date(text: str) -> Optional[ParsedDate]:
+    """Parse a single date in any of the common formats the model produces"""
+    text = text.strip().rstrip(".")
+    for pattern, order in DATE_PATTERNS:
+        match = pattern.match(text)
+        if not match:
+            continue
+        parts = dict(zip(order, match.groups()))
+        year = int(parts["y"])
+        month = MONTHS[parts["M"].lower()] if "M" in parts else int(parts.get("m", 0))
+        day = int(parts.get("d", 0))
+        if 0 <= month <= 12 and 0 <= day <= 31:
+            return year, month, day if month else 0
+    return None
+
+
+def format_date(date: ParsedDate) -> str:
+    """Render a parsed date in the canonical form: "DD Mon YYYY", "Mon YYYY" or "YYYY" """
+    year, month, day = date
+    if month and day:
+        return f"{day:02d} {MONTH_NAMES[month]} {year}"
+    if month:
+        return f"{MONTH_NAMES[month]} {year}"
+    return str(year)
+
+
+def _split_period(period: str) -> List[str]:
+    parts = RANGE_SEPARATOR.split(period)
+    if len(parts) == 1:
+        match = COMPACT_RANGE.match(period.strip())
+        if match and not DATE_PATTERNS[0][0].match(period.strip()) and not DATE_PATTERNS[5][0].match(period.strip()):
+            parts = [match.group(1), match.group(2)]
+    return [part.strip() for part in parts]
+
+
+def normalise_period(period: str) -> Tuple[str, Optional[ParsedDate], Optional[ParsedDate]]:
+    """
+    Normalise a "(Start - End)" period string
+
+    Returns:
+        tuple: (canonical period text, parsed start, parsed end); "Present" parses as year 9999
+    """
+    parts = _split_period(period)
+    rendered = []
+    parsed = []
+    for part in parts[:2]:
+        if part.lower() in PRESENT_WORDS:
+            rendered.append("Present")
+            parsed.append((9999, 12, 31))
+            continue
+        date = parse_date(part)
+        rendered.append(format_date(date) if date else part)
+        parsed.append(date)
+    start = parsed[0] if parsed else None
+    end = parsed[1] if len(parsed) > 1 else start
+    if len(parts) > 2:
+        return period, start, end
+    return " - ".join(rendered), start, end
+
+
+def _tokens(text: str) -> frozenset:
+    return frozenset(token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS)
+
+
+class Entry:
+    """A field with its precomputed normalised tokens, dates and bucket key"""
+
+    __slots__ = ("field", "position", "title", "details", "start", "end", "bucket")
+
+    def __init__(self, field: Dict[str, Any], position: int):
+        self.field = field
+        self.position = position
+        value = field.get("value", "")
+        match = TRAILING_PERIOD.search(value)
+        self.start = self.end = None
+        if match:
+            period, self.start, self.end = normalise_period(match.group(1))
+            details = value[:match.start()].rstrip()
+            field["value"] = f"{details} ({period})"
+        else:
+            details = value
+        self.title = _tokens(field.get("name", ""))
+        self.details = _tokens(details)
+        if self.start:
+            self.bucket = (self.start[0], self.end[0] if self.end else 0, "")
+        else:
+            # Undated entries only meet entries of the same organisation, keeping buckets small
+            organisation = " ".join(TOKEN_PATTERN.findall(details.split(",")[0].lower()))
+            self.bucket = (0, 0, organisation)
+
+    def similar(self, other: "Entry") -> bool:
+        """
+        Same title and largely the same details
+
+        Titles must match exactly, since distinct roles of one period often share most
+        words ("Minister" and "Vice Minister" of the same ministry). Details may be
+        a shortened form of the other entry's, which the richer entry then replaces.
+        """
+        if self.title != other.title:
+            return False
+        if not self.details or not other.details:
+            return self.details == other.details
+        overlap = len(self.details & other.details)
+        return overlap / min(len(self.details), len(other.details)) >= Config.POSTPROCESS_SIMILARITY
+
+    def richness(self) -> int:
+        return len(self.field.get("value", "")) + (10 if self.start else 0)
+
+
+def _describe(entry: Entry) -> str:
+    return f"\"{entry.field.get('name', '')}: {entry.field.get('value', '')}\""
+
+
+def _deduplicate(entries: List[Entry], seen: Dict[Tuple, List[Entry]]) -> List[Entry]:
+    """
+    Drop entries that duplicate an entry of a higher-priority section (seen) or of the same section
+
+    Entries are only compared within their bucket (same start and end year), so the
+    cost stays linear in the number of entries for realistic profiles. Within a
+    section the richer of two duplicates is kept, at the position of the first.
+    """
+    kept: List[Optional[Entry]] = []
+    local: Dict[Tuple, List[int]] = {}
+    for entry in entries:
+        original = next((other for other in seen.get(entry.bucket, []) if entry.similar(other)), None)
+        if original is not None:
+            logger.info(f"Dropping {_describe(entry)} as a duplicate of {_describe(original)}")
+            continue
+        duplicate = next((index for index in local.get(entry.bucket, []) if entry.similar(kept[index])), None)
+        if duplicate is None:
+            local.setdefault(entry.bucket, []).append(len(kept))
+            kept.append(entry)
+        elif entry.richness() > kept[duplicate].richness():
+            logger.info(f"Dropping {_describe(kept[duplicate])} as a duplicate of {_describe(entry)}")
+            entry.position = kept[duplicate].position
+            kept[duplicate] = entry
+        else:
+            logger.info(f"Dropping {_describe(entry)} as a duplicate of {_describe(kept[duplicate])}")
+    return kept
+
+
+def _sort_key(entry: Entry):
+    end = entry.end or entry.start
+    if end is None:
+        # Undated entries keep their order at the end
+        return (1, 0, 0, entry.position)
+    sign = -1 if Config.POSTPROCESS_NEWEST_FIRST else 1
+    return (0, sign * (end[0] * 100 + end[1]), sign * (entry.start[0] * 100 + entry.start[1]), entry.position)
+
+
+def postprocess_profile(formatMsg: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normalise dates, de-duplicate entries within and across sections and sort them chronologically
+
+    Args:
+        formatMsg: Transaction formatted response from embed_in_transaction_format
+    Returns:
+        The same response with its InfoSectionList cleaned in place
+    """
+    labels = {template["label"]: sectionName for sectionName, template in SECTION_TEMPLATES.items()}
+    sections = formatMsg.get("InfoSectionList", [])
+    by_name = {labels.get(section.get("label")): section for section in sections}
+
+    # Normalise single dates (DTT fields)
+    for section in sections:
+        for field in section.get("fields", []):
+            if field.get("type") == "DTT" and isinstance(field.get("value"), str):
+                date = parse_date(field["value"])
+                if date:
+                    field["value"] = format_date(date)
+
+    # De-duplicate list sections; earlier sections in the priority list win across sections
+    seen: Dict[Tuple, List[Entry]] = {}
+    removed = 0
+    for sectionName in Config.POSTPROCESS_DEDUP_SECTIONS:
+        section = by_name.get(sectionName)
+        if not section:
+            continue
+        entries = [Entry(field, position) for position, field in enumerate(section.get("fields", []))]
+        kept = _deduplicate(entries, seen if sectionName in Config.POSTPROCESS_CROSS_SECTIONS else {})
+        removed += len(entries) - len(kept)
+        if sectionName in Config.POSTPROCESS_CROSS_SECTIONS:
+            for entry in kept:
+                seen.setdefault(entry.bucket, []).append(entry)
+        if sectionName in Config.POSTPROCESS_SORT_SECTIONS:
+            kept.sort(key=_sort_key)
+        section["fields"] = [entry.field for entry in kept]
+
+    logger.info(f"Post-processing removed {removed} duplicate entries")
+    return formatMsg
@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+#Logging
+import customLogging
+
+#Custom imports
+from config import Config
+from prompt_template import SECTION_TEMPLATES
+
+logger = customLogging.safe_logger_setup()
+
+SECTION_NAMES_BY_LABEL = {template["label"]: sectionName for sectionName, template in SECTION_TEMPLATES.items()}
+
+# Sections whose field names are fixed by the template; a regenerated value replaces the old one
+FIXED_FIELD_SECTIONS = {"main_particulars"}
+
+
+def section_name_of(section: Dict[str, Any]) -> Optional[str]:
+    """Map an InfoSectionList entry back to its SECTION_TEMPLATES key via its label"""
+    return SECTION_NAMES_BY_LABEL.get(section.get("label"))
+
+
+def normalise_freshness(freshness: Optional[Dict[str, str]]) -> Dict[str, datetime]:
+    """Parse a {section name or label: ISO timestamp} mapping, ignoring unparseable entries"""
+    parsed = {}
+    for key, value in (freshness or {}).items():
+        sectionName = SECTION_NAMES_BY_LABEL.get(key, key)
+        try:
+            timestamp = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            logger.warning(f"Ignoring invalid freshness timestamp for {key}: {value}")
+            continue
+        parsed[sectionName] = timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def select_stale_sections(sectionNameList: List[str], previous_sections: List[Dict[str, Any]],
+                          freshness: Optional[Dict[str, str]] = None, requested: Optional[List[str]] = None,
+                          now: Optional[datetime] = None) -> List[str]:
+    """
+    Decide which sections have to be regenerated
+
+    A section is stale when it is missing from the previous profile, has no freshness
+    timestamp, is older than Config.SECTION_MAX_AGE_DAYS or is explicitly requested.
+
+    Args:
+        sectionNameList: Sections the refreshed profile should contain
+        previous_sections: Previous InfoSectionList
+        freshness: {section name or label: ISO timestamp of last generation}
+        requested: Sections to regenerate regardless of age
+    Returns:
+        List of section names to regenerate, in sectionNameList order
+    """
+    now = now or datetime.now(timezone.utc)
+    timestamps = normalise_freshness(freshness)
+    present = {section_name_of(section) for section in previous_sections}
+    requested = set(requested or [])
+
+    stale = []
+    for sectionName in sectionNameList:
+        max_age = timedelta(days=Config.SECTION_MAX_AGE_DAYS.get(sectionName, Config.SECTION_DEFAULT_MAX_AGE_DAYS))
+        if sectionName in requested or sectionName not in present or sectionName not in timestamps \
+                or now - timestamps[sectionName] > max_age:
+            stale.append(sectionName)
+    logger.info(f"Stale sections: {stale} of {sectionNameList}")
+    return stale
+
+
+def merge_section(previous: Optional[Dict[str, Any]], regenerated: Dict[str, Any], sectionName: Optional[str]) -> Dict[str, Any]:
+    """
+    Merge a regenerated section with its previous version
+
+    Fixed-field sections take each regenerated non-empty value and keep the other previous
+    fields. List sections (career, appointments, ...) are replaced by the regenerated
+    version, since a previous entry may be outdated rather than missing, e.g. an
+    appointment that has since ended; a list section that came back empty keeps its
+    previous entries.
+    """
+    if previous is None:
+        return regenerated
+    if sectionName in FIXED_FIELD_SECTIONS:
+        new_values = {field["name"]: field for field in regenerated.get("fields", []) if field.get("value")}
+        fields = [new_values.pop(field["name"], field) for field in previous.get("fields", [])]
+        fields.extend(new_values.values())
+    elif regenerated.get("fields"):
+        fields = regenerated["fields"]
+    else:
+        logger.warning(f"Regenerated section {sectionName} is empty, keeping its previous entries")
+        fields = previous.get("fields", [])
+    return {**regenerated, "fields": fields}
+
+
+def merge_sections(sectionNameList: List[str], previous_sections: List[Dict[str, Any]],
+                   regenerated_sections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Combine the previous InfoSectionList with the regenerated sections
+
+    Previous sections outside sectionNameList, e.g. sections the execution profile does
+    not generate, are carried through unchanged after them.
+
+    Returns:
+        List of sections in sectionNameList order, then the other previous sections in their order
+    """
+    previous_by_name = {section_name_of(section): section for section in previous_sections}
+    regenerated_by_name = {section_name_of(section): section for section in regenerated_sections}
+
+    merged = []
+    for sectionName in sectionNameList:
+        if sectionName in regenerated_by_name:
+            merged.append(merge_section(previous_by_name.get(sectionName), regenerated_by_name[sectionName], sectionName))
+        elif sectionName in previous_by_name:
+            merged.append(previous_by_name[sectionName])
+    merged.extend(section for section in previous_sections if section_name_of(section) not in sectionNameList)
+    return merged
+
+
+def update_freshness(freshness: Optional[Dict[str, str]], regenerated: List[str], now: Optional[datetime] = None) -> Dict[str, str]:
+    """Return the freshness mapping with regenerated sections stamped at now"""
+    now = now or datetime.now(timezone.utc)
+    updated = {sectionName: timestamp.isoformat() for sectionName, timestamp in normalise_freshness(freshness).items()}
+    for sectionName in regenerated:
+        updated[sectionName] = now.isoformat()
+    return updated
@@ -0,0 +1,190 @@
+import cProfile
+import contextvars
+import functools
+import json
+import os
+import pstats
+import re
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Optional
+
+#Logging
+import customLogging
+
+#Custom imports
+from config import Config
+
+logger = customLogging.safe_logger_setup()
+
+# Function locations (file path or built-in method name) counted towards each category
+PROFILE_CATEGORIES = {
+    "network": ("/socket.py", "/ssl.py", "/selectors.py", "/http/client.py", "/httpx/", "/httpcore/", "/h11/",
+                "/urllib3/", "/requests/", "_ssl.", "_socket.", "select."),
+    "tiktoken": ("/tiktoken/", "CoreBPE"),
+    "logging": ("/logging/", "customLogging.py"),
+    "json": ("/json/", "_json.", "orjson", "jsonplus.py", "ormsgpack"),
+    "thread_wait": ("_thread.lock", "_thread.RLock"),
+    "sleep": ("time.sleep",),  # throttling and retry backoff
+}
+
+# The profiler of the transaction running in this context, None when profiling is off
+_active: contextvars.ContextVar[Optional["TransactionProfiler"]] = contextvars.ContextVar("profiler", default=None)
+_NO_SPAN = nullcontext()
+
+
+def is_requested(event: Optional[Dict[str, Any]] = None) -> bool:
+    """True when the environment or the request's "profiling" flag asks for a profile"""
+    return Config.PROFILING_ENABLED or (isinstance(event, dict) and bool(event.get("profiling")))
+
+
+def classify(filename: str, function_name: str) -> str:
+    location = f"{filename}:{function_name}"
+    for category, patterns in PROFILE_CATEGORIES.items():
+        if any(pattern in location for pattern in patterns):
+            return category
+    return "other"
+
+
+class TransactionProfiler:
+    """
+    CPU profile and wall-clock spans of one transaction
+
+    cProfile covers the thread that started the transaction; work done in tool or
+    worker threads shows up there as thread_wait and is timed by the spans, which
+    follow the transaction into threads that copy the context.
+
+    Args:
+        transaction_id: Names the artefacts
+        output_dir: Directory receiving <transactionId>.prof and <transactionId>.json
+    """
+
+    def __init__(self, transaction_id: str, output_dir: str = Config.PROFILING_DIR):
+        self.transaction_id = transaction_id or "unknown"
+        self.output_dir = output_dir
+        self.spans: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._profile: Optional[cProfile.Profile] = None
+        self._token = None
+
+    def add_span(self, name: str, seconds: float):
+        with self._lock:
+            span_totals = self.spans.setdefault(name, {"count": 0, "total_seconds": 0.0})
+            span_totals["count"] += 1
+            span_totals["total_seconds"] += seconds
+
+    def start(self):
+        self._token = _active.set(self)
+        self._profile = cProfile.Profile()
+        try:
+            self._profile.enable()
+        except ValueError as e:
+            # Another profiler already owns the interpreter; keep the wall-clock spans only
+            logger.warning(f"CPU profiling unavailable for Transaction No {self.transaction_id}: {str(e)}")
+            self._profile = None
+        self._wall_started = time.perf_counter()
+        self._cpu_started = time.thread_time()
+
+    def stop(self) -> Dict[str, Any]:
+        """Stop profiling, write the artefacts and return the summary"""
+        cpu_seconds = time.thread_time() - self._cpu_started
+        wall_seconds = time.perf_counter() - self._wall_started
+        if self._profile is not None:
+            self._profile.disable()
+        _active.reset(self._token)
+
+        summary = {
+            "transactionId": self.transaction_id,
+            "wall_seconds": round(wall_seconds, 4),
+            "cpu_seconds": round(cpu_seconds, 4),
+            "categories": {},
+            "spans": {name: {"count": totals["count"], "total_seconds": round(totals["total_seconds"], 4)}
+                      for name, totals in sorted(self.spans.items())},
+            "top_functions": [],
+        }
+        stats = pstats.Stats(self._profile) if self._profile is not None and self._profile.getstats() else None
+        if stats is not None:
+            categories = dict.fromkeys(list(PROFILE_CATEGORIES) + ["other"], 0.0)
+            for (filename, _, function_name), (_, _, own_seconds, _, _) in stats.stats.items():
+                categories[classify(filename, function_name)] += own_seconds
+            summary["categories"] = {category: round(seconds, 4) for category, seconds in categories.items()}
+            ranked = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+            summary["top_functions"] = [
+                {"function": f"{filename}:{line}({function_name})", "calls": calls,
+                 "own_seconds": round(own_seconds, 4), "cumulative_seconds": round(cumulative_seconds, 4)}
+                for (filename, line, function_name), (_, calls, own_seconds, cumulative_seconds, _)
+                in ranked[:Config.PROFILING_TOP_FUNCTIONS]
+            ]
+        self._write(summary, stats)
+        logger.info(f"Profile of Transaction No {self.transaction_id}: {summary['wall_seconds']}s wall, "
+                    f"categories {summary['categories']}, spans {summary['spans']}")
+        return summary
+
+    def _write(self, summary: Dict[str, Any], stats: Optional[pstats.Stats]):
+        stem = os.path.join(self.output_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", self.transaction_id))
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            if stats is not None:
+                stats.dump_stats(f"{stem}.prof")
+            with open(f"{stem}.json", "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+        except OSError as e:
+            logger.warning(f"Could not write profile of Transaction No {self.transaction_id}: {str(e)}")
+
+
+@contextmanager
+def transaction(transaction_id: str, enabled: Optional[bool] = None):
+    """
+    Profile the block as one transaction when enabled
+
+    Does nothing when profiling is disabled or a transaction profile is already
+    running in this context, so nested hooks (lambda_handler, process_messages)
+    produce a single profile.
+
+    Args:
+        transaction_id: Names the artefacts
+        enabled: Overrides Config.PROFILING_ENABLED, e.g. with is_requested(event)
+    """
+    if _active.get() is not None or not (Config.PROFILING_ENABLED if enabled is None else enabled):
+        yield None
+        return
+    profiler = TransactionProfiler(transaction_id)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+
+
+def profiled(func):
+    """
+    Decorator profiling a call as one transaction named by its transaction_id keyword
+
+    Enabled by Config.PROFILING_ENABLED for direct callers; inside an already profiled
+    transaction, or with profiling off, it only calls func.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _active.get() is not None or not Config.PROFILING_ENABLED:
+            return func(*args, **kwargs)
+        with transaction(kwargs.get("transaction_id", "")):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def span(name: str):
+    """Time the block under name in the running transaction profile; a shared no-op otherwise"""
+    profiler = _active.get()
+    if profiler is None:
+        return _NO_SPAN
+    return _timed_span(profiler, name)
+
+
+@contextmanager
+def _timed_span(profiler: TransactionProfiler, name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.add_span(name, time.perf_counter() - started)
@@ -0,0 +1,133 @@
+import base64
+import gzip
+import json
+from typing import Any, Dict, Optional
+
+#Logging
+import customLogging
+
+#Custom imports
+from config import Config
+
+logger = customLogging.safe_logger_setup()
+
+# Optional accelerators; the stdlib is used when they are not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BASE_HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*'
+}
+
+
+def dumps(data: Any, compact: bool = Config.RESPONSE_COMPACT) -> bytes:
+    """
+    Serialise a response body to UTF-8 JSON
+
+    Args:
+        data: JSON-serialisable response body
+        compact: Drop insignificant whitespace and keep non-ASCII characters unescaped
+    Returns:
+        bytes: Encoded JSON
+    """
+    if not compact:
+        return json.dumps(data).encode('utf-8')
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into {coding: q-value}"""
+    codings = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        codings[coding.lower()] = quality
+    return codings
+
+
+def choose_encoding(header: Optional[str]) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header, preferring br when brotli is installed"""
+    codings = parse_accept_encoding(header)
+    available = (['br'] if brotli is not None else []) + ['gzip']
+    best, best_quality = None, 0.0
+    for coding in available:
+        quality = codings.get(coding, codings.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def request_header(event: Optional[Dict[str, Any]], name: str) -> Optional[str]:
+    """Case-insensitive lookup of a request header in a Lambda event"""
+    headers = (event or {}).get('headers') or {}
+    if not isinstance(headers, dict):
+        return None
+    for key, value in headers.items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+
+def build_response(status_code: int, data: Any, event: Optional[Dict[str, Any]] = None,
+                   headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Build the Lambda proxy response, compressed when the caller accepts it
+
+    Bodies of at least Config.RESPONSE_COMPRESS_MIN_BYTES are gzip or br encoded
+    according to the Accept-Encoding header of the event and returned base64
+    encoded with isBase64Encoded set.
+
+    Args:
+        status_code: HTTP status code
+        data: JSON-serialisable response body
+        event: Incoming Lambda event, used for its headers
+        headers: Extra response headers, e.g. Retry-After
+    Returns:
+        dict: statusCode, headers, body and isBase64Encoded
+    """
+    body = dumps(data)
+    headers = {**BASE_HEADERS, **(headers or {})}
+    encoding = None
+    if Config.RESPONSE_COMPRESSION and len(body) >= Config.RESPONSE_COMPRESS_MIN_BYTES:
+        encoding = choose_encoding(request_header(event, 'Accept-Encoding'))
+        headers['Vary'] = 'Accept-Encoding'
+
+    if encoding is None:
+        return {
+            'statusCode': status_code,
+            'headers': headers,
+            'body': body.decode('utf-8'),
+            'isBase64Encoded': False
+        }
+
+    if encoding == 'br':
+        compressed = brotli.compress(body, quality=Config.RESPONSE_BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(body, compresslevel=Config.RESPONSE_GZIP_LEVEL)
+    logger.info(f"Response body {len(body)} bytes, {encoding} {len(compressed)} bytes")
+    headers['Content-Encoding'] = encoding
+    return {
+        'statusCode': status_code,
+        'headers': headers,
+        'body': base64.b64encode(compressed).decode('ascii'),
+        'isBase64Encoded': True
+    }
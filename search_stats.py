@@ -0,0 +1,283 @@
+import json
+import math
+import os
+import re
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+#Logging
+import customLogging
+
+#Custom imports
+from config import Config
+from profile_refresh import FIXED_FIELD_SECTIONS
+
+logger = customLogging.safe_logger_setup()
+
+ANY_COUNTRY = "*"
+
+# Per-section observations kept as exponentially weighted moving averages
+TRACKED = ("tool_rounds", "searches", "cited_urls", "cited_urls_per_search", "fields", "limited")
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]{3,}")
+STOPWORDS = {"the", "and", "for", "with", "from", "present", "txt", "dtt"}
+
+
+def _tokens(text: str) -> set:
+    return {token for token in TOKEN_PATTERN.findall(str(text).lower()) if token not in STOPWORDS}
+
+
+def section_yield(sections: Dict[str, List[Dict[str, Any]]], results: List[Dict[str, Any]],
+                  cited_urls: Optional[List[str]] = None, name: str = "") -> Dict[str, Dict[str, int]]:
+    """
+    Filled fields and cited search results per section of one run
+
+    A cited result counts for a section when its title and content contain at least
+    Config.SEARCH_STATS_MATCH of the words of one of the section's filled fields. The
+    reference section counts every cited result. The words of the profile name are
+    ignored, as nearly every result contains them.
+
+    Args:
+        sections: Filled fields per section name
+        results: Search results of the run (url, title, content)
+        cited_urls: URLs listed in the reference section of the answer; None counts every result as cited
+        name: Profile name
+    Returns:
+        dict: {section name: {"fields": filled fields, "cited_urls": cited results supporting the section}}
+    """
+    if cited_urls is not None:
+        cited = {url.strip().rstrip("/") for url in cited_urls}
+        results = [result for result in results if result["url"].rstrip("/") in cited]
+    result_tokens = [_tokens(f"{result.get('title', '')} {result.get('content', '')}") for result in results]
+    name_tokens = _tokens(name)
+
+    yields = {}
+    for sectionName, fields in sections.items():
+        filled = [field for field in fields if field.get("value")]
+        if sectionName == "reference":
+            supported = len(results)
+        else:
+            # Field names are titles in list sections but only labels ("Birth Date") in fixed-field sections
+            titled = sectionName not in FIXED_FIELD_SECTIONS
+            field_tokens = [tokens for tokens in
+                            (_tokens(f"{field.get('name', '') if titled else ''} {field['value']}") - name_tokens
+                             for field in filled) if tokens]
+            supported = sum(1 for tokens in result_tokens
+                            if any(len(words & tokens) >= Config.SEARCH_STATS_MATCH * len(words) for words in field_tokens))
+        yields[sectionName] = {"fields": len(filled), "cited_urls": supported}
+    return yields
+
+
+class SearchStats:
+    """
+    Thread-safe search yield statistics per section and country, persisted as JSON
+
+    Every graph run searches for all of its sections at once, so the rounds and
+    searches of a run are shared by its sections, while the yield, i.e. the fields
+    filled and the cited results supporting them, is recorded per section (see
+    section_yield), both for the run's country and for all countries.
+
+    Args:
+        path: JSON file the statistics are loaded from and saved to; None keeps them in memory
+        alpha: Weight of the newest run in the moving averages
+    """
+
+    def __init__(self, path: Optional[str] = Config.SEARCH_STATS_PATH, alpha: float = Config.SEARCH_STATS_ALPHA):
+        self.path = path
+        self.alpha = alpha
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(sectionName: str, countryName: str) -> str:
+        return f"{sectionName}|{' '.join((countryName or ANY_COUNTRY).lower().split())}"
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            self._entries = {}
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path, encoding="utf-8") as f:
+                        self._entries = json.load(f)
+                    logger.info(f"Loaded search statistics of {len(self._entries)} sections from {self.path}")
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Could not load search statistics {self.path}: {str(e)}")
+        return self._entries
+
+    def _save(self, entries: Dict[str, Dict[str, Any]]):
+        if not self.path:
+            return
+        temporary = f"{self.path}.tmp"
+        try:
+            with open(temporary, "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+            os.replace(temporary, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save search statistics {self.path}: {str(e)}")
+
+    def _update(self, entries: Dict[str, Dict[str, Any]], key: str, observation: Dict[str, float]):
+        entry = entries.get(key)
+        if entry is None:
+            entries[key] = {**observation, "runs": 1}
+        else:
+            for name, value in observation.items():
+                entry[name] = (1 - self.alpha) * entry.get(name, value) + self.alpha * value
+            entry["runs"] += 1
+        entries[key]["updated"] = datetime.now(timezone.utc).isoformat()
+
+    def record_run(self, sectionNameList: List[str], countryName: str, tool_rounds: int, searches: int, limited: bool,
+                   yields: Dict[str, Dict[str, int]]):
+        """
+        Record one graph run
+
+        Args:
+            sectionNameList: Sections the run was asked to fill
+            countryName: Country of the profile
+            tool_rounds: Assistant turns that called the search tool
+            searches: Successful search calls
+            limited: The run was stopped by its tool-round limit
+            yields: Filled fields and cited results per section name (section_yield)
+        """
+        with self._lock:
+            entries = self._load()
+            for sectionName in sectionNameList:
+                section = yields.get(sectionName, {})
+                cited_urls = section.get("cited_urls", 0)
+                observation = {
+                    "tool_rounds": tool_rounds,
+                    "searches": searches,
+                    "cited_urls": cited_urls,
+                    "cited_urls_per_search": cited_urls / searches if searches else 0.0,
+                    "fields": section.get("fields", 0),
+                    "limited": 1.0 if limited else 0.0,
+                }
+                for country in (countryName, ANY_COUNTRY):
+                    self._update(entries, self.make_key(sectionName, country), observation)
+            self._save(entries)
+
+    def get_entry(self, sectionName: str, countryName: str) -> Optional[Dict[str, Any]]:
+        """Statistics of the section for the country, or for all countries when the country has too few runs"""
+        with self._lock:
+            entries = self._load()
+            for country in (countryName, ANY_COUNTRY):
+                entry = entries.get(self.make_key(sectionName, country))
+                # Entries written before a tracked figure existed do not count as history
+                if entry is not None and entry["runs"] >= Config.SEARCH_ADAPTIVE_MIN_RUNS and \
+                        all(name in entry for name in TRACKED):
+                    return dict(entry)
+        return None
+
+    @staticmethod
+    def recommend_section(entry: Dict[str, Any]) -> Dict[str, int]:
+        """
+        Search limits one section has been needing
+
+        max_results follows the cited results a search has been contributing to the
+        section. max_tool_rounds follows the rounds runs have been taking; runs cut
+        short by the round limit add a round only while the section is still being
+        filled, since more searches do not help a section that yields nothing. Both
+        get headroom so that a limit being saturated grows again.
+        """
+        headroom = Config.SEARCH_ADAPTIVE_HEADROOM
+        rounds = math.ceil(entry["tool_rounds"] * headroom)
+        if entry["limited"] > 0.5 and entry["fields"] >= 1:
+            rounds += 1
+        return {"max_results": math.ceil(entry["cited_urls_per_search"] * headroom), "max_tool_rounds": rounds}
+
+    def recommend(self, sectionNameList: List[str], countryName: str) -> Optional[Dict[str, int]]:
+        """
+        Search limits covering the most demanding of the sections
+
+        A run searches for all of its sections, so a request for main_particulars only
+        gets the few results that section needs, while one including career or
+        appointments gets the depth those need.
+
+        Returns:
+            dict: max_results and max_tool_rounds, or None while no section has enough history
+        """
+        recommended = [self.recommend_section(entry) for entry in
+                       (self.get_entry(sectionName, countryName) for sectionName in sectionNameList) if entry]
+        if not recommended:
+            return None
+        return {name: max(section[name] for section in recommended) for name in ("max_results", "max_tool_rounds")}
+
+    def countries(self) -> List[str]:
+        """Countries with recorded runs, most runs first"""
+        with self._lock:
+            runs: Dict[str, int] = {}
+            for key, entry in self._load().items():
+                country = key.split("|", 1)[1]
+                if country != ANY_COUNTRY:
+                    runs[country] = max(runs.get(country, 0), entry["runs"])
+        return sorted(runs, key=runs.get, reverse=True)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._load())}
+
+
+search_stats = SearchStats()
+
+
+def _clamp(value: int, lower: int, upper: int) -> int:
+    return max(lower, min(upper, value))
+
+
+def adapt_profile(execution_profile: Dict[str, Any], sectionNameList: List[str], countryName: str,
+                  stats: SearchStats = search_stats) -> Dict[str, Any]:
+    """
+    Return the execution profile with max_results and max_tool_rounds adapted to the search history
+
+    The adapted values stay within the Config.SEARCH_ADAPTIVE_* bounds and never exceed
+    the limits the profile sets itself, so adaptation only trims searches a profile allows;
+    a profile without a tool-round limit keeps none.
+
+    Args:
+        execution_profile: Config.EXECUTION_PROFILES entry
+        sectionNameList: Sections of the request
+        countryName: Country of the profile
+    Returns:
+        dict: Adapted copy of the profile, or the profile itself without enough history
+    """
+    if not Config.SEARCH_ADAPTIVE_ENABLED:
+        return execution_profile
+    recommended = stats.recommend(sectionNameList, countryName)
+    if recommended is None:
+        return execution_profile
+
+    results_ceiling = min(execution_profile["max_results"], Config.SEARCH_ADAPTIVE_MAX_RESULTS)
+    adapted = {
+        **execution_profile,
+        "max_results": _clamp(recommended["max_results"], min(Config.SEARCH_ADAPTIVE_MIN_RESULTS, results_ceiling),
+                              results_ceiling),
+    }
+    rounds_ceiling = execution_profile["max_tool_rounds"]
+    if rounds_ceiling is not None:
+        adapted["max_tool_rounds"] = _clamp(recommended["max_tool_rounds"],
+                                            min(Config.SEARCH_ADAPTIVE_MIN_ROUNDS, rounds_ceiling), rounds_ceiling)
+    logger.info(f"Adaptive search limits for {sectionNameList} ({countryName}): max_results {adapted['max_results']}, "
+                f"max_tool_rounds {adapted['max_tool_rounds']}")
+    return adapted
+
+
+def warmup_profiles(execution_profiles: List[Dict[str, Any]], limit: int,
+                    stats: SearchStats = search_stats) -> List[Dict[str, Any]]:
+    """
+    The distinct adapted profiles requests are expected to run with, for warming their graphs
+
+    Each profile is adapted as for a request with its own sections, first without a known
+    country, then for the countries with the most history, until limit profiles are found.
+
+    Args:
+        execution_profiles: Config.EXECUTION_PROFILES entries
+        limit: Maximum number of profiles returned, e.g. the size of the graph cache
+    """
+    adapted_profiles: Dict[str, Dict[str, Any]] = {}
+    for countryName in [ANY_COUNTRY] + stats.countries():
+        for execution_profile in execution_profiles:
+            adapted = adapt_profile(execution_profile, list(execution_profile["sections"]), countryName, stats=stats)
+            adapted_profiles.setdefault(json.dumps(adapted, sort_keys=True, default=str), adapted)
+            if len(adapted_profiles) >= limit:
+                return list(adapted_profiles.values())
+    return list(adapted_profiles.values())
@@ -0,0 +1,35 @@
+import pytest
+
+import ai_counter
+from ai_counter import LatencyTracker, get_guardrail_latency_cost
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    tracker = LatencyTracker()
+    monkeypatch.setattr(ai_counter, "latency_tracker", tracker)
+    return tracker
+
+
+def test_guardrail_overhead_is_compared_per_token(tracker):
+    # Relaxed gathering turns are long, enforced format calls short but slower per token
+    for _ in range(4):
+        tracker.record("llm:guardrail:relaxed", 4.0, tokens=8000)
+        tracker.record("llm:guardrail:enforced", 1.5, tokens=2000)
+    tracker.record("llm:tavily", 0.5)
+
+    cost = get_guardrail_latency_cost("relaxed")
+    assert set(cost) == {"relaxed", "enforced"}
+    assert cost["relaxed"]["overhead_seconds"] == 0
+    assert cost["enforced"]["seconds_per_1k_tokens"] == pytest.approx(0.75)
+    assert cost["enforced"]["overhead_seconds"] == pytest.approx(0.5)
+    assert cost["enforced"]["overhead_share"] == pytest.approx(1 / 3)
+
+
+def test_guardrail_overhead_is_unknown_without_baseline_or_tokens(tracker):
+    tracker.record("llm:guardrail:enforced", 1.0, tokens=1000)
+    tracker.record("llm:guardrail:default", 1.0)
+    cost = get_guardrail_latency_cost("relaxed")
+    assert cost["enforced"]["overhead_seconds"] is None
+    assert cost["default"]["seconds_per_1k_tokens"] is None
+    ai_counter.log_guardrail_latency_cost("relaxed")
@@ -0,0 +1,87 @@
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import END, START, MessagesState, StateGraph
+
+from checkpoint_store import BlobStore, BoundedMemorySaver, ContentAddressedSerializer
+
+LARGE = "search result " * 200
+
+
+def build_graph(checkpointer):
+    def respond(state):
+        return {"messages": [AIMessage(content=LARGE)]}
+
+    graph = StateGraph(MessagesState)
+    graph.add_node("respond", respond)
+    graph.add_edge(START, "respond")
+    graph.add_edge("respond", END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+def run(graph, thread_id, text="hello"):
+    return graph.invoke({"messages": [HumanMessage(content=text)]}, {"configurable": {"thread_id": thread_id}})
+
+
+def test_serializer_round_trips_large_contents_through_the_blob_store():
+    store = BlobStore()
+    serializer = ContentAddressedSerializer(store, min_chars=100)
+    messages = [HumanMessage(content="short"), AIMessage(content=LARGE), AIMessage(content=LARGE)]
+
+    restored = serializer.loads_typed(serializer.dumps_typed(messages))
+    assert [message.content for message in restored] == ["short", LARGE, LARGE]
+    assert len(store) == 1
+    assert messages[1].content == LARGE
+
+
+def test_least_recently_used_threads_are_evicted():
+    saver = BoundedMemorySaver(max_threads=2, max_bytes=10 ** 9, ttl_seconds=3600)
+    graph = build_graph(saver)
+    run(graph, "a")
+    run(graph, "b")
+    graph.get_state({"configurable": {"thread_id": "a"}})
+    run(graph, "c")
+
+    assert set(saver.storage) == {"a", "c"}
+    assert saver.get_stats()["evictions"]["lru"] == 1
+
+
+def test_idle_threads_expire():
+    saver = BoundedMemorySaver(max_threads=10, max_bytes=10 ** 9, ttl_seconds=0.05)
+    graph = build_graph(saver)
+    run(graph, "a")
+    time.sleep(0.06)
+    run(graph, "b")
+
+    assert set(saver.storage) == {"b"}
+    assert saver.get_stats()["evictions"]["ttl"] == 1
+
+
+def test_running_thread_may_exceed_the_byte_ceiling_alone():
+    saver = BoundedMemorySaver(max_threads=10, max_bytes=1, ttl_seconds=3600)
+    graph = build_graph(saver)
+    run(graph, "a")
+    assert set(saver.storage) == {"a"}
+    run(graph, "b")
+
+    assert set(saver.storage) == {"b"}
+    assert saver.get_stats()["evictions"]["bytes"] == 1
+
+
+def test_threads_share_blobs_until_the_last_one_is_evicted():
+    store = BlobStore()
+    saver = BoundedMemorySaver(max_threads=10, max_bytes=10 ** 9, ttl_seconds=3600, blob_store=store)
+    graph = build_graph(saver)
+    run(graph, "a")
+    run(graph, "b")
+    assert len(store) == 1
+
+    result = run(graph, "a", text="again")
+    assert result["messages"][1].content == LARGE
+    assert len(store) == 1
+
+    saver.delete_thread("a")
+    assert len(store) == 1
+    saver.delete_thread("b")
+    assert len(store) == 0
+    assert saver.get_stats()["blob_bytes"] == 0
@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+from circuit_breaker import (CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, ProfileFallbackCache,
+                             find_open_error)
+
+
+def make_breaker(**overrides):
+    settings = {"window": 4, "min_calls": 4, "failure_rate": 0.5, "open_seconds": 60, "half_open_probes": 1}
+    return CircuitBreaker("test", **{**settings, **overrides})
+
+
+def fail(breaker, times):
+    for _ in range(times):
+        breaker.before_call()
+        breaker.record_failure()
+
+
+def test_circuit_opens_at_the_failure_rate_after_min_calls():
+    breaker = make_breaker()
+    fail(breaker, 1)
+    breaker.before_call()
+    breaker.record_success()
+    fail(breaker, 1)
+    assert breaker.state == CLOSED
+
+    fail(breaker, 1)
+    assert breaker.state == OPEN
+    assert breaker.is_open()
+    with pytest.raises(CircuitOpenError) as raised:
+        breaker.before_call()
+    assert raised.value.retry_after > 0
+    assert breaker.get_stats()["rejected"] == 1
+
+
+def test_successes_keep_the_circuit_closed():
+    breaker = make_breaker()
+    for outcome in (True, True, True, False, True, True, True, False):
+        breaker.before_call()
+        breaker.record_success() if outcome else breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_half_open_probe_closes_the_circuit_on_success():
+    breaker = make_breaker(open_seconds=0.05)
+    fail(breaker, 4)
+    time.sleep(0.06)
+    assert not breaker.is_open()
+
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.get_stats()["window_calls"] == 1
+
+
+def test_failed_probe_opens_the_circuit_again():
+    breaker = make_breaker(open_seconds=0.05)
+    fail(breaker, 4)
+    time.sleep(0.06)
+
+    fail(breaker, 1)
+    assert breaker.state == OPEN
+    assert breaker.get_stats()["opened"] == 2
+
+
+def test_open_error_is_found_behind_wrapping_exceptions():
+    try:
+        try:
+            raise CircuitOpenError("llmaas", 10)
+        except CircuitOpenError as e:
+            raise RuntimeError("graph failed") from e
+    except RuntimeError as wrapped:
+        error = wrapped
+    assert find_open_error(error).dependency == "llmaas"
+    assert find_open_error(ValueError("other")) is None
+    assert find_open_error(None) is None
+
+
+def test_fallback_cache_evicts_the_least_recently_stored_profile():
+    cache = ProfileFallbackCache(max_entries=2)
+    key = ProfileFallbackCache.make_key(" John  Smith", "SG", None, "fast")
+    assert key == ProfileFallbackCache.make_key("john smith", "sg", "", "FAST")
+
+    cache.put("a", {"profile": 1})
+    cache.put("b", {"profile": 2})
+    cache.put("a", {"profile": 3})
+    cache.put("c", {"profile": 4})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"profile": 3}
+    assert cache.get("c") == {"profile": 4}
@@ -0,0 +1,81 @@
+import json
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+import ai
+from config import Config
+
+SECTIONS = [
+    {"label": "Main Particulars", "type": "TAB", "fields": [{"name": "Name", "value": "Cho Tae-yul", "type": "TXT"}]},
+    {"label": "Career", "type": "TAB", "fields": [{"name": "Foreign Minister", "value": "MOFA [2024]", "type": "TXT"}]},
+    {"label": "Education", "type": "TAB", "fields": [{"name": "BA", "value": "Seoul National University", "type": "TXT"}]},
+]
+
+
+class RecordingModel:
+    """Chat model stand-in returning a fixed reply and keeping the messages it was sent"""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.received = None
+
+    def invoke(self, messages):
+        self.received = list(messages)
+        return self.reply.model_copy()
+
+
+def transcript():
+    return {"messages": [
+        HumanMessage(content="Profile Cho Tae-yul"),
+        AIMessage(content="", tool_calls=[{"name": "tavily_search", "args": {"query": "Cho Tae-yul"}, "id": "call-1"}]),
+        ToolMessage(content="Cho Tae-yul is the foreign minister", tool_call_id="call-1"),
+    ]}
+
+
+def make_node():
+    searching = RecordingModel(AIMessage(content="", tool_calls=[
+        {"name": "tavily_search", "args": {"query": "Cho Tae-yul career"}, "id": "call-2"}]))
+    final = RecordingModel(AIMessage(content=json.dumps(SECTIONS)))
+    node = ai.create_assistant_node(searching, throttleSec=0, final_model=final)
+    return node, searching, final
+
+
+def test_deadline_forces_a_final_answer_without_tools():
+    node, searching, final = make_node()
+    config = {"configurable": {"deadline": time.monotonic() + Config.DEADLINE_FINAL_ANSWER_RESERVE - 1}}
+    assert ai.deadline_reached(config)
+
+    response = node(transcript(), config)["messages"][0]
+    assert searching.received is None
+    assert final.received[-1].content == Config.DEADLINE_FINAL_ANSWER_PROMPT
+    assert not response.tool_calls
+    assert response.response_metadata["deadline_forced"] is True
+    assert response.response_metadata["forced_reason"] == "deadline"
+
+
+def test_searches_continue_before_the_deadline():
+    node, searching, final = make_node()
+    config = {"configurable": {"deadline": time.monotonic() + Config.DEADLINE_FINAL_ANSWER_RESERVE + 60}}
+    assert not ai.deadline_reached(config)
+    assert not ai.deadline_reached({"configurable": {}})
+
+    response = node(transcript(), config)["messages"][0]
+    assert final.received is None
+    assert response.tool_calls
+    assert "deadline_forced" not in response.response_metadata
+
+
+def test_truncated_answer_is_salvaged_to_its_complete_sections():
+    text = "```json\n" + json.dumps(SECTIONS)
+    truncated = text[:text.index('"Seoul National')]
+
+    assert ai.salvage_sections(truncated) == SECTIONS[:2]
+    wrapper = ai.embed_partial_result(truncated, "T1", partial=True)
+    assert wrapper == {"TransactionId": "T1", "InfoSectionList": SECTIONS[:2], "partial": True}
+
+
+def test_complete_deadline_answer_is_kept_and_marked_partial():
+    wrapper = ai.embed_partial_result(json.dumps(SECTIONS), "T1", partial=True)
+    assert wrapper["InfoSectionList"] == SECTIONS and wrapper["partial"] is True
+    assert ai.salvage_sections("no sections at all") == []
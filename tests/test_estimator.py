@@ -0,0 +1,169 @@
+import threading
+
+import pytest
+
+from config import Config
+from estimator import ADMIT, DOWNGRADE, QUEUE, REJECT, AdmissionController, RunHistory
+
+USAGE = {"input_tokens": 3000, "output_tokens": 300, "tool_rounds": 2}
+
+
+@pytest.fixture
+def history():
+    return RunHistory(path=None, alpha=0.5)
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    """Start every test with all admission limits off"""
+    for name in ("ADMISSION_MAX_REQUEST_TOKENS", "ADMISSION_MAX_REQUEST_COST", "ADMISSION_MAX_CONCURRENT",
+                 "ADMISSION_MAX_REQUESTS_PER_MINUTE", "ADMISSION_MAX_TOKENS_PER_MINUTE", "ADMISSION_MAX_COST_PER_MINUTE"):
+        monkeypatch.setattr(Config, name, None)
+    monkeypatch.setattr(Config, "ADMISSION_QUEUE_ENABLED", False)
+    monkeypatch.setattr(Config, "ESTIMATE_MIN_RUNS", 1)
+    return monkeypatch
+
+
+def test_estimate_falls_back_from_sections_to_profile_to_defaults(history, limits):
+    assert history.estimate("fast", ["career"])["basis"] == "default"
+
+    history.record("fast", ["career", "reference"], USAGE, wall_seconds=20)
+    exact = history.estimate("fast", ["reference", "career"])
+    assert exact["basis"] == "sections"
+    assert exact["tokens"] == 3300
+
+    per_profile = history.estimate("fast", ["career", "reference", "education", "remarks"])
+    assert per_profile["basis"] == "profile"
+    assert per_profile["input_tokens"] == 6000
+    assert per_profile["wall_seconds"] == 40
+
+    assert history.estimate("thorough", ["career"])["basis"] == "all_profiles"
+
+
+def test_history_is_averaged_and_persisted(tmp_path, limits):
+    path = str(tmp_path / "history.json")
+    history = RunHistory(path=path, alpha=0.5)
+    history.record("fast", ["career"], USAGE, wall_seconds=10)
+    history.record("fast", ["career"], {**USAGE, "input_tokens": 1000}, wall_seconds=30)
+
+    estimate = RunHistory(path=path).estimate("fast", ["career"])
+    assert estimate["input_tokens"] == 2000
+    assert estimate["wall_seconds"] == 20
+
+
+def test_history_entries_need_enough_runs(history, limits):
+    limits.setattr(Config, "ESTIMATE_MIN_RUNS", 2)
+    history.record("fast", ["career"], USAGE, wall_seconds=10)
+    assert history.estimate("fast", ["career"])["basis"] == "default"
+
+
+def test_request_within_limits_is_admitted(history, limits):
+    decision = AdmissionController(history).decide("balanced")
+    assert decision["action"] == ADMIT
+    assert decision["profile"] == "balanced"
+
+
+def test_request_over_budget_is_downgraded_to_a_cheaper_profile(history, limits):
+    controller = AdmissionController(history)
+    fast_tokens = controller.decide("fast")["estimate"]["tokens"]
+    limits.setattr(Config, "ADMISSION_MAX_REQUEST_TOKENS", fast_tokens)
+
+    decision = controller.decide("thorough")
+    assert decision["action"] == DOWNGRADE
+    assert decision["profile"] == "fast"
+    assert decision["reason"] == "request_tokens"
+
+
+def test_request_over_budget_with_every_profile_is_rejected_without_retry(history, limits):
+    limits.setattr(Config, "ADMISSION_MAX_REQUEST_TOKENS", 1)
+    decision = AdmissionController(history).decide("balanced")
+    assert decision["action"] == REJECT
+    assert "retryAfterSeconds" not in decision
+
+
+def test_deadline_alone_does_not_reject(history, limits):
+    decision = AdmissionController(history).decide("fast", deadline=0)
+    assert decision["action"] == ADMIT
+    assert decision["reason"] == "time_budget"
+
+
+def test_rate_limited_request_is_rejected_with_retry_after(history, limits):
+    limits.setattr(Config, "ADMISSION_MAX_REQUESTS_PER_MINUTE", 1)
+    controller = AdmissionController(history)
+    assert controller.decide("fast")["action"] == ADMIT
+
+    decision = controller.decide("fast")
+    assert decision["action"] == REJECT
+    assert decision["reason"] == "request_rate"
+    assert decision["retryAfterSeconds"] >= 1
+
+
+def test_rate_limited_request_is_queued_only_with_a_shared_job_backend(history, limits):
+    limits.setattr(Config, "ADMISSION_MAX_REQUESTS_PER_MINUTE", 1)
+    limits.setattr(Config, "ADMISSION_QUEUE_ENABLED", True)
+    controller = AdmissionController(history)
+    controller.decide("fast")
+
+    limits.setattr(Config, "JOB_BACKEND", "memory")
+    assert controller.decide("fast")["action"] == REJECT
+    limits.setattr(Config, "JOB_BACKEND", "sqlite")
+    assert controller.decide("fast")["action"] == QUEUE
+
+
+def test_decide_reserves_the_in_flight_slot_until_the_request_finishes(history, limits):
+    limits.setattr(Config, "ADMISSION_MAX_CONCURRENT", 1)
+    controller = AdmissionController(history)
+    assert controller.decide("fast")["action"] == ADMIT
+    assert controller.get_stats()["in_flight"] == 1
+    assert controller.decide("fast")["reason"] == "concurrency"
+
+    with pytest.raises(RuntimeError):
+        with controller.running(reserved=True):
+            raise RuntimeError("failed run")
+    assert controller.get_stats()["in_flight"] == 0
+    assert controller.decide("fast")["action"] == ADMIT
+
+
+def test_unreserved_runs_are_counted_while_running(history, limits):
+    controller = AdmissionController(history)
+    with controller.running():
+        assert controller.get_stats()["in_flight"] == 1
+    assert controller.get_stats()["in_flight"] == 0
+
+
+def test_burst_does_not_pass_the_concurrency_limit(history, limits):
+    limits.setattr(Config, "ADMISSION_MAX_CONCURRENT", 3)
+    controller = AdmissionController(history)
+    start = threading.Barrier(20)
+    actions = []
+
+    def request():
+        start.wait()
+        actions.append(controller.decide("fast")["action"])
+
+    threads = [threading.Thread(target=request) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert actions.count(ADMIT) == 3
+    assert actions.count(REJECT) == 17
+    assert controller.get_stats()["in_flight"] == 3
+
+
+def test_handler_releases_the_reserved_slot_when_profiling_fails(history, limits):
+    import lambda_function
+    import profiling
+
+    controller = AdmissionController(history)
+    limits.setattr(lambda_function.estimator, "admission_controller", controller)
+    limits.setattr(Config, "ADMISSION_ENABLED", True)
+
+    def broken_transaction(*args, **kwargs):
+        raise OSError("profile directory is not writable")
+    limits.setattr(profiling, "transaction", broken_transaction)
+
+    response = lambda_function.lambda_handler({"name": "Cho Tae-yul", "country": "South Korea", "transactionId": "T1"}, None)
+    assert response["statusCode"] == 500
+    assert controller.get_stats()["in_flight"] == 0
@@ -0,0 +1,59 @@
+import pytest
+
+from evidence_store import BM25Index, EvidenceStore, chunk_text, strip_boilerplate
+
+
+def words(count):
+    return " ".join(f"w{index}" for index in range(count))
+
+
+@pytest.mark.parametrize("count", [1, 4, 5, 7, 10, 23])
+def test_chunks_overlap_and_cover_every_word(count):
+    chunks = [chunk.split() for chunk in chunk_text(words(count), chunk_words=4, overlap=1)]
+    assert all(1 <= len(chunk) <= 4 for chunk in chunks)
+    assert chunks[0][0] == "w0" and chunks[-1][-1] == f"w{count - 1}"
+    for previous, current in zip(chunks, chunks[1:]):
+        assert previous[-1] == current[0]
+        assert len(previous) == 4
+
+
+def test_short_and_empty_texts():
+    assert chunk_text(words(3), chunk_words=4, overlap=1) == [words(3)]
+    assert chunk_text("  \n ", chunk_words=4, overlap=1) == []
+
+
+def test_boilerplate_and_repeated_lines_are_dropped():
+    page = "\n".join([
+        "Skip to content",
+        "## Cho Tae-yul was appointed [foreign minister](https://example.org) in 2024",
+        "Share this article on social media now",
+        "Cho Tae-yul was appointed foreign minister in 2024",
+        "Home",
+        "1960",
+    ])
+    assert strip_boilerplate(page).splitlines() == ["Cho Tae-yul was appointed foreign minister in 2024", "1960"]
+
+
+def test_bm25_ranks_rare_terms_and_frequency_above_common_terms():
+    index = BM25Index()
+    index.add("the minister of the ministry", {"url": "common"})
+    index.add("ambassador ambassador to japan", {"url": "frequent"})
+    index.add("ambassador to the united nations in new york city for many years", {"url": "long"})
+    index.add("the weather in seoul", {"url": "unrelated"})
+
+    ranked = [result["url"] for result in index.search("ambassador the")]
+    assert ranked[:2] == ["frequent", "long"]
+    assert "unrelated" in ranked and ranked.index("unrelated") > 1
+    assert [result["url"] for result in index.search("ambassador", k=1)] == ["frequent"]
+    assert index.search("astronaut") == []
+    assert BM25Index().search("ambassador") == []
+
+
+def test_section_evidence_prefers_chunks_about_the_section():
+    store = EvidenceStore()
+    store.add_search_results([
+        {"url": "https://a", "title": "Biography", "content": "He graduated from Seoul National University with a bachelor degree"},
+        {"url": "https://b", "title": "News", "content": "He was appointed ambassador and served as deputy minister"},
+    ])
+    assert store.top_chunks("university degree graduated", k=1)[0]["url"] == "https://a"
+    assert store.top_chunks("ambassador minister served", k=1)[0]["url"] == "https://b"
@@ -0,0 +1,92 @@
+import contextvars
+import threading
+import time
+
+import pytest
+
+import ai_counter
+from hedging import HedgePolicy
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def warmed_policy(latency=0.05, **kwargs):
+    """Policy with a full latency history, so that hedging can start"""
+    policy = HedgePolicy(min_samples=5, min_delay=0.0, **kwargs)
+    for _ in range(5):
+        policy.invoke(lambda: None)
+        policy._latencies[-1] = latency
+    return policy
+
+
+def test_calls_run_inline_until_there_is_history():
+    policy = HedgePolicy(min_samples=5)
+    assert policy.invoke(threading.current_thread) is threading.current_thread()
+    assert policy.get_stats()["hedges"] == 0
+
+
+def test_calls_run_inline_without_budget():
+    policy = warmed_policy(budget_ratio=0.0)
+    assert policy.invoke(threading.current_thread) is threading.current_thread()
+
+
+def test_slow_call_is_hedged_and_the_hedge_wins():
+    policy = warmed_policy(budget_ratio=1.0)
+    attempts = []
+
+    def call():
+        attempts.append(time.monotonic())
+        time.sleep(0.5 if len(attempts) == 1 else 0.01)
+        return len(attempts)
+
+    started = time.monotonic()
+    with ai_counter.track_run_usage() as usage:
+        assert policy.invoke(call) == 2
+    assert time.monotonic() - started < 0.3
+    stats = policy.get_stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+    assert usage["hedges"] == 1 and usage["hedge_wins"] == 1
+
+
+def test_primary_and_hedge_keep_the_callers_context():
+    policy = warmed_policy(budget_ratio=1.0)
+    seen = []
+
+    def call():
+        seen.append(request_id.get())
+        time.sleep(0.2)
+        return request_id.get()
+
+    request_id.set("txn-1")
+    assert policy.invoke(call) == "txn-1"
+    assert seen == ["txn-1", "txn-1"]
+
+
+def test_hedge_pool_does_not_cap_primary_calls():
+    policy = warmed_policy(latency=10.0, budget_ratio=1.0, max_workers=1)
+    barrier = threading.Barrier(3, timeout=2)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(policy.invoke(barrier.wait))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == [0, 1, 2]
+
+
+def test_error_of_both_attempts_is_raised():
+    policy = warmed_policy(budget_ratio=1.0)
+
+    def call():
+        time.sleep(0.1)
+        raise RuntimeError("down")
+
+    with pytest.raises(RuntimeError):
+        policy.invoke(call)
+
+
+def test_hedge_delay_follows_the_percentile():
+    policy = HedgePolicy(percentile=50, min_samples=3, min_delay=0.0)
+    assert policy.hedge_delay() is None
+    policy._latencies.extend([1.0, 2.0, 3.0])
+    assert policy.hedge_delay() == 2.0
@@ -0,0 +1,115 @@
+import time
+
+import pytest
+
+import job_queue
+from job_queue import FAILED, SUCCEEDED, JobBackend, JobQueue, MemoryJobBackend, SQLiteJobBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryJobBackend()
+    return SQLiteJobBackend(path=str(tmp_path / "jobs.sqlite3"), poll_interval=0.05)
+
+
+def wait_for(queue, job_id, timeout=5):
+    give_up = time.monotonic() + timeout
+    while time.monotonic() < give_up:
+        job = queue.poll(job_id)
+        if job["status"] in (SUCCEEDED, FAILED):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        JobBackend()
+
+
+def test_jobs_are_claimed_once_in_submission_order(backend):
+    backend.enqueue("a", {"name": "first"})
+    backend.enqueue("b", {"name": "second"})
+    assert backend.claim() == ("a", {"name": "first"})
+    assert backend.claim() == ("b", {"name": "second"})
+    assert backend.claim() is None
+    assert backend.get("a")["status"] == job_queue.RUNNING
+
+
+def test_finished_jobs_are_pruned(backend):
+    backend.enqueue("a", {})
+    backend.update("a", status=SUCCEEDED, result={"ok": True})
+    backend.enqueue("b", {})
+    time.sleep(0.01)
+    backend.prune(0)
+    assert backend.get("a") is None
+    assert backend.get("b")["status"] == job_queue.QUEUED
+
+
+def test_drain_reports_per_section_progress_and_result(backend):
+    snapshots = []
+
+    def runner(request, deadline=None, progress=None):
+        progress("sections", total=2)
+        progress("section_done", name="career")
+        snapshots.append(backend.get(job_id)["progress"])
+        progress("section_done", name="career")
+        progress("section_done", name="education")
+        return {"InfoSectionList": []}
+
+    queue = JobQueue(runner, backend=backend, workers=0)
+    job_id = queue.submit({"transactionId": "t1"})
+    assert queue.drain() == 1
+    assert snapshots[0]["sections_done"] == 1 and snapshots[0]["completed_sections"] == ["career"]
+    job = queue.poll(job_id)
+    assert job["status"] == SUCCEEDED and "request" not in job
+    assert job["progress"]["completed_sections"] == ["career", "education"]
+    assert job["progress"]["stage"] == "done"
+
+
+def test_failed_runner_marks_the_job_failed(backend):
+    def runner(request, deadline=None, progress=None):
+        raise RuntimeError("pipeline down")
+
+    queue = JobQueue(runner, backend=backend, workers=0)
+    job_id = queue.submit({})
+    queue.drain()
+    job = queue.poll(job_id)
+    assert job["status"] == FAILED and job["error"] == "pipeline down"
+
+
+class FlakyBackend(MemoryJobBackend):
+    """Fails to store the first result, as a backend outage would"""
+
+    def __init__(self):
+        super().__init__()
+        self.failed = False
+
+    def update(self, job_id, **fields):
+        if fields.get("status") == SUCCEEDED and not self.failed:
+            self.failed = True
+            raise OSError("backend unavailable")
+        super().update(job_id, **fields)
+
+
+def test_worker_survives_a_backend_error():
+    backend = FlakyBackend()
+    queue = JobQueue(lambda request, deadline=None, progress=None: {"InfoSectionList": []}, backend=backend, workers=1)
+    queue.submit({})
+    time.sleep(0.3)
+    assert backend.failed
+    job_id = queue.submit({})
+    assert wait_for(queue, job_id)["status"] == SUCCEEDED
+    assert len(queue._threads) == 1
+
+
+def test_dead_workers_are_replaced():
+    queue = JobQueue(lambda request, deadline=None, progress=None: {"InfoSectionList": []},
+                     backend=MemoryJobBackend(), workers=1)
+    queue._threads.append(job_queue.threading.Thread(target=lambda: None))
+    queue._threads[0].start()
+    queue._threads[0].join()
+    job_id = queue.submit({})
+    assert wait_for(queue, job_id)["status"] == SUCCEEDED
+    assert all(thread.is_alive() for thread in queue._threads)
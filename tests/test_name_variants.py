@@ -0,0 +1,111 @@
+import json
+
+import name_variants
+from name_variants import NameVariantCache, expand_name
+
+
+def reply(native=(), romanised=(), family_native=(), family_romanised=()):
+    return json.dumps({"native": list(native), "romanised": list(romanised), "family_native": list(family_native),
+                       "family_romanised": list(family_romanised)})
+
+
+class FakeModel:
+    def __init__(self, text):
+        self.text = text
+        self.prompts = []
+
+    def __call__(self, prompt):
+        self.prompts.append(prompt)
+        return self.text
+
+
+def test_romanisation_variants_cover_hyphens_family_forms_and_order():
+    variants = name_variants.romanisation_variants("Cho Tae-yul", "Korea")
+    assert "Cho Taeyul" in variants and "Jo Tae-yul" in variants and "Tae-yul Cho" in variants
+    assert variants.index("Jo Tae-yul") < variants.index("Tae-yul Cho")
+    assert "Cho Tae-yul" not in variants
+
+
+def test_family_name_is_last_outside_family_first_countries():
+    assert name_variants.split_family_name("Mohammed bin Abdul", "Saudi Arabia") == ("Abdul", ["Mohammed", "bin"])
+    assert name_variants.split_family_name("Cho Tae-yul", "Korea") == ("Cho", ["Tae-yul"])
+
+
+def test_model_reply_is_cached_per_name_and_family():
+    cache = NameVariantCache(path=None)
+    model = FakeModel("```json\n" + reply(["조태열"], ["Jo Taeyul"], ["조"], ["Joh"]) + "\n```")
+    variants = expand_name("Cho Tae-yul", "Korea", llm=model, cache=cache)
+    assert variants["native"] == ["조태열"]
+    assert variants["romanised"][0] == "Jo Taeyul" and "Joh Tae-yul" in variants["romanised"]
+    assert "family name Cho" in model.prompts[0]
+    assert expand_name("cho  tae-yul", "korea", llm=model, cache=cache) == variants
+    assert len(model.prompts) == 1
+    assert cache.get_family("Cho", "Korea")["native"] == ["조"]
+
+
+def test_latin_script_family_skips_the_model_for_the_next_person():
+    cache = NameVariantCache(path=None)
+    model = FakeModel(reply([], ["Mohamed Salah"], [], ["Saleh"]))
+    expand_name("Mohammed Salah", "Egypt", llm=model, cache=cache)
+    variants = expand_name("Ahmed Salah", "Egypt", llm=model, cache=cache)
+    assert len(model.prompts) == 1
+    assert variants == {"native": [], "romanised": ["Ahmed Saleh"]}
+
+
+def test_non_latin_family_still_asks_the_model_for_the_full_name():
+    cache = NameVariantCache(path=None)
+    model = FakeModel(reply(["조태열"], [], ["조"], []))
+    expand_name("Cho Tae-yul", "Korea", llm=model, cache=cache)
+    expand_name("Cho Hyun", "Korea", llm=model, cache=cache)
+    assert len(model.prompts) == 2
+
+
+def test_without_model_nothing_is_cached():
+    cache = NameVariantCache(path=None)
+    variants = expand_name("Cho Tae-yul", "Korea", llm=None, cache=cache)
+    assert variants["native"] == [] and variants["romanised"]
+    assert cache.get("Cho Tae-yul", "Korea") is None
+
+
+def test_failed_lookup_is_retried_later():
+    cache = NameVariantCache(path=None)
+
+    def failing(prompt):
+        raise TimeoutError("slow")
+
+    expand_name("Cho Tae-yul", "Korea", llm=failing, cache=cache)
+    model = FakeModel(reply(["조태열"]))
+    assert expand_name("Cho Tae-yul", "Korea", llm=model, cache=cache)["native"] == ["조태열"]
+
+
+def test_native_script_names_need_no_model():
+    model = FakeModel(reply())
+    assert expand_name("조태열", "Korea", llm=model, cache=NameVariantCache(path=None))["native"] == ["조태열"]
+    assert model.prompts == []
+
+
+def test_names_outside_transliterating_countries_get_rule_based_variants_only():
+    cache = NameVariantCache(path=None)
+    model = FakeModel(reply())
+    variants = expand_name("Mary-Anne Smith", "United Kingdom", llm=model, cache=cache)
+    assert model.prompts == []
+    assert "Mary Anne Smith" in variants["romanised"]
+    assert cache.get("Mary-Anne Smith", "United Kingdom") is None
+    assert not name_variants.needs_model_lookup("Romania")
+    assert name_variants.needs_model_lookup("Sultanate of Oman")
+    assert name_variants.needs_model_lookup("Republic of Korea")
+
+
+def test_cache_persists_and_evicts_oldest(tmp_path):
+    path = str(tmp_path / "variants.json")
+    cache = NameVariantCache(path=path, max_entries=2)
+    for name in ("A One", "B Two", "C Three"):
+        cache.put(name, "X", {"native": [], "romanised": []})
+    reloaded = NameVariantCache(path=path)
+    assert reloaded.get("A One", "X") is None and reloaded.get("C Three", "X") is not None
+
+
+def test_search_queries_prefer_native_forms():
+    variants = {"native": ["조태열"], "romanised": ["Jo Taeyul", "Cho Taeyul"]}
+    assert name_variants.search_queries(variants, "Korea", limit=2) == ["조태열", "Jo Taeyul Korea"]
+    assert name_variants.search_queries(variants, "Korea", limit=0) == []
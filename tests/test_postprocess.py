@@ -0,0 +1,82 @@
+import pytest
+
+import postprocess
+
+
+def field(name, value, type="TXT"):
+    return {"name": name, "value": value, "type": type}
+
+
+def profile(**sections):
+    labels = {"main_particulars": "Main Particulars", "career": "Career", "appointments": "Appointments",
+              "education": "Education"}
+    return {"InfoSectionList": [{"label": labels[name], "type": "TAB", "fields": fields} for name, fields in sections.items()]}
+
+
+def values(result, index=0):
+    return [(entry["name"], entry["value"]) for entry in result["InfoSectionList"][index]["fields"]]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2021-03-05", (2021, 3, 5)),
+    ("5 March 2021", (2021, 3, 5)),
+    ("Mar. 5th, 2021", (2021, 3, 5)),
+    ("Jan 2021", (2021, 1, 0)),
+    ("2021", (2021, 0, 0)),
+    ("sometime", None),
+])
+def test_parse_date(text, expected):
+    assert postprocess.parse_date(text) == expected
+
+
+def test_normalise_period():
+    assert postprocess.normalise_period("January 2021 to present")[0] == "Jan 2021 - Present"
+    assert postprocess.normalise_period("2018–2021")[1:] == ((2018, 0, 0), (2021, 0, 0))
+
+
+def test_distinct_roles_of_the_same_period_are_kept():
+    result = postprocess.postprocess_profile(profile(career=[
+        field("Minister", "Ministry of Foreign Affairs (Jan 2021 - Present)"),
+        field("Vice Minister", "Ministry of Foreign Affairs (2021 - Present)"),
+        field("Deputy Minister for Political Affairs", "Ministry of Foreign Affairs (2021 - Present)"),
+    ]))
+    assert [name for name, _ in values(result)] == ["Minister", "Vice Minister", "Deputy Minister for Political Affairs"]
+
+
+def test_same_role_with_shorter_details_keeps_the_richer_entry():
+    result = postprocess.postprocess_profile(profile(career=[
+        field("Ambassador to Japan", "Embassy in Tokyo (2018 - 2021)"),
+        field("Ambassador to Japan", "Embassy of South Korea in Tokyo, Japan (2018 - 2021)"),
+    ]))
+    assert values(result) == [("Ambassador to Japan", "Embassy of South Korea in Tokyo, Japan (2018 - 2021)")]
+
+
+def test_same_title_at_different_organisations_is_kept():
+    result = postprocess.postprocess_profile(profile(career=[
+        field("Director", "Asia Pacific Bureau (2010 - 2012)"),
+        field("Director", "North American Bureau (2010 - 2012)"),
+    ]))
+    assert len(values(result)) == 2
+
+
+def test_appointment_repeating_a_career_entry_is_dropped():
+    result = postprocess.postprocess_profile(profile(
+        career=[field("Foreign Minister", "Ministry of Foreign Affairs, South Korea (2021 - Present)")],
+        appointments=[field("Foreign Minister", "Ministry of Foreign Affairs (2021 - present)"),
+                      field("Chair", "ASEAN Regional Forum (2023 - 2024)")],
+    ))
+    assert values(result, 1) == [("Chair", "ASEAN Regional Forum (2023 - 2024)")]
+
+
+def test_entries_are_sorted_newest_first_with_undated_last():
+    result = postprocess.postprocess_profile(profile(career=[
+        field("Adviser", "Think tank"),
+        field("Director-General", "Ministry of Foreign Affairs (2013 - 2018)"),
+        field("Foreign Minister", "Ministry of Foreign Affairs (2021 - Present)"),
+    ]))
+    assert [name for name, _ in values(result)] == ["Foreign Minister", "Director-General", "Adviser"]
+
+
+def test_single_dates_are_normalised():
+    result = postprocess.postprocess_profile(profile(main_particulars=[field("Birth Date", "1960-03-21", "DTT")]))
+    assert values(result) == [("Birth Date", "21 Mar 1960")]
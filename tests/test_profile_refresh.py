@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta, timezone
+
+import profile_refresh
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def field(name, value):
+    return {"name": name, "value": value, "type": "TXT"}
+
+
+def section(label, *fields):
+    return {"label": label, "type": "TAB", "fields": list(fields)}
+
+
+PREVIOUS = [
+    section("Main Particulars", field("Name", "Cho Tae-yul"), field("Designation", "Foreign Minister")),
+    section("Career", field("Foreign Minister", "Ministry of Foreign Affairs, South Korea (2021 - Present)"),
+            field("Ambassador to Japan", "Embassy of South Korea in Tokyo, Japan (2018 - 2021)")),
+    section("Education", field("Bachelor's Degree", "Seoul National University (1980 - 1984)")),
+    section("Languages", field("Korean", "Native")),
+    section("Remarks", field("Note", "Met the delegation in 2024")),
+]
+
+
+def test_stale_sections_are_missing_old_undated_or_requested():
+    freshness = {
+        "main_particulars": (NOW - timedelta(days=1)).isoformat(),
+        "Career": (NOW - timedelta(days=31)).isoformat(),
+        "education": "not a date",
+        "languages": (NOW - timedelta(days=10)).isoformat(),
+    }
+    stale = profile_refresh.select_stale_sections(
+        ["main_particulars", "education", "career", "appointments", "languages"], PREVIOUS, freshness,
+        requested=["languages"], now=NOW)
+    assert stale == ["education", "career", "appointments", "languages"]
+
+
+def test_regenerated_list_section_replaces_outdated_entries():
+    regenerated = [section("Career", field("Foreign Minister", "Ministry of Foreign Affairs, South Korea (2021 - 2024)"),
+                           field("Ambassador to Japan", "Embassy of South Korea in Tokyo, Japan (2018 - 2021)"))]
+    merged = profile_refresh.merge_sections(["main_particulars", "career"], PREVIOUS, regenerated)
+    career = merged[1]
+    assert [entry["value"] for entry in career["fields"]] == [
+        "Ministry of Foreign Affairs, South Korea (2021 - 2024)", "Embassy of South Korea in Tokyo, Japan (2018 - 2021)"]
+
+
+def test_empty_regenerated_list_section_keeps_previous_entries():
+    merged = profile_refresh.merge_sections(["career"], PREVIOUS[:2], [section("Career")])
+    assert merged[0]["fields"] == PREVIOUS[1]["fields"]
+
+
+def test_fixed_field_section_takes_new_values_and_keeps_the_rest():
+    regenerated = [section("Main Particulars", field("Designation", "Former Foreign Minister"), field("Name", ""),
+                           field("Country", "South Korea"))]
+    merged = profile_refresh.merge_sections(["main_particulars"], PREVIOUS[:1], regenerated)
+    assert merged[0]["fields"] == [field("Name", "Cho Tae-yul"), field("Designation", "Former Foreign Minister"),
+                                   field("Country", "South Korea")]
+
+
+def test_sections_outside_the_profile_are_carried_through():
+    # The fast profile generates main_particulars, career and reference only
+    merged = profile_refresh.merge_sections(["main_particulars", "career", "reference"], PREVIOUS, [])
+    assert [entry["label"] for entry in merged] == ["Main Particulars", "Career", "Education", "Languages", "Remarks"]
+    assert merged[2:] == PREVIOUS[2:]
+
+
+def test_update_freshness_stamps_regenerated_sections_only():
+    freshness = {"Education": "2025-01-01T00:00:00Z"}
+    updated = profile_refresh.update_freshness(freshness, ["career"], now=NOW)
+    assert updated == {"education": "2025-01-01T00:00:00+00:00", "career": NOW.isoformat()}
+
+
+def test_refresh_only_stamps_sections_the_model_returned(monkeypatch):
+    import lambda_function
+
+    regenerated = {"InfoSectionList": [section("Career", field("Prime Minister", "Government of South Korea (2025 - Present)"))],
+                   "partial": True}
+    monkeypatch.setattr(lambda_function, "run_pipeline", lambda *args, **kwargs: regenerated)
+    monkeypatch.setattr(lambda_function.Config, "POSTPROCESS_ENABLED", False)
+    old = (NOW - timedelta(days=1)).isoformat()
+    request_body = {"previousInfoSectionList": PREVIOUS, "refreshSections": ["career", "education"],
+                    "sectionFreshness": {"career": old, "education": old}}
+
+    response = lambda_function.refresh_person_data("Cho Tae-yul", "South Korea", "", "T1", ["career", "education"],
+                                                   request_body)
+    assert response["RegeneratedSections"] == ["career"]
+    assert response["SectionFreshness"]["education"] == old
+    assert response["SectionFreshness"]["career"] != old
+    assert response["partial"] is True
@@ -0,0 +1,70 @@
+import base64
+import gzip
+import json
+
+import pytest
+
+import response_encoder
+from config import Config
+from response_encoder import build_response, choose_encoding, dumps, parse_accept_encoding, request_header
+
+LARGE = {"InfoSectionList": [{"label": "Career", "fields": [{"name": "Minister", "value": "Ministry of Trade " * 100}]}]}
+
+
+@pytest.fixture
+def gzip_only(monkeypatch):
+    monkeypatch.setattr(response_encoder, "brotli", None)
+
+
+def test_compact_bodies_keep_the_same_json():
+    data = {"name": "Zoë", "values": [1, 2.5, None, True]}
+    assert json.loads(dumps(data)) == data
+    assert b" " not in dumps(data)
+    assert json.loads(dumps(data, compact=False)) == data
+
+
+def test_accept_encoding_q_values_are_parsed():
+    assert parse_accept_encoding("gzip;q=0.5, BR, deflate;q=x") == {"gzip": 0.5, "br": 1.0, "deflate": 0.0}
+    assert parse_accept_encoding(None) == {}
+
+
+def test_encoding_follows_the_callers_preference(gzip_only):
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("*") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("br") is None
+    assert choose_encoding(None) is None
+
+
+def test_request_headers_are_matched_case_insensitively():
+    event = {"headers": {"accept-encoding": "gzip"}}
+    assert request_header(event, "Accept-Encoding") == "gzip"
+    assert request_header({"headers": None}, "Accept-Encoding") is None
+    assert request_header(None, "Accept-Encoding") is None
+
+
+def test_large_body_is_gzip_encoded_when_accepted(gzip_only):
+    response = build_response(200, LARGE, {"headers": {"Accept-Encoding": "gzip"}}, headers={"Retry-After": "5"})
+
+    assert response["isBase64Encoded"] is True
+    assert response["headers"]["Content-Encoding"] == "gzip"
+    assert response["headers"]["Vary"] == "Accept-Encoding"
+    assert response["headers"]["Retry-After"] == "5"
+    assert json.loads(gzip.decompress(base64.b64decode(response["body"]))) == LARGE
+
+
+def test_small_or_unaccepted_bodies_are_sent_as_text(gzip_only, monkeypatch):
+    small = build_response(400, {"error": "Validation failed"}, {"headers": {"Accept-Encoding": "gzip"}})
+    assert small["isBase64Encoded"] is False
+    assert "Content-Encoding" not in small["headers"]
+    assert json.loads(small["body"]) == {"error": "Validation failed"}
+
+    plain = build_response(200, LARGE, {"headers": {}})
+    assert plain["isBase64Encoded"] is False
+    assert plain["headers"]["Vary"] == "Accept-Encoding"
+    assert json.loads(plain["body"]) == LARGE
+
+    monkeypatch.setattr(Config, "RESPONSE_COMPRESSION", False)
+    disabled = build_response(200, LARGE, {"headers": {"Accept-Encoding": "gzip"}})
+    assert disabled["isBase64Encoded"] is False
+    assert "Vary" not in disabled["headers"]
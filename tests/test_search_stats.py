@@ -0,0 +1,118 @@
+import pytest
+
+from config import Config
+from search_stats import SearchStats, adapt_profile, section_yield, warmup_profiles
+
+RESULTS = [
+    {"url": "https://a", "title": "Cho Tae-yul appointed foreign minister", "content": "Ministry of Foreign Affairs 2024"},
+    {"url": "https://b", "title": "Biography", "content": "Cho Tae-yul was born on 21 Mar 1960 and studied at Seoul National University"},
+    {"url": "https://c", "title": "Weather", "content": "Rain in Seoul"},
+]
+
+
+def field(name, value):
+    return {"name": name, "value": value, "type": "TXT"}
+
+
+def test_section_yield_attributes_cited_results_to_sections():
+    sections = {
+        "main_particulars": [field("Name", "Cho Tae-yul"), field("Birth Date", "21 Mar 1960"), field("Marital Status", "")],
+        "education": [field("Bachelor's Degree", "Seoul National University")],
+        "career": [field("Foreign Minister", "Ministry of Foreign Affairs (2024 - Present)")],
+        "reference": [field("A", "https://a"), field("B", "https://b")],
+    }
+    yields = section_yield(sections, RESULTS, cited_urls=["https://a", " https://b/"], name="Cho Tae-yul")
+    assert yields == {
+        "main_particulars": {"fields": 2, "cited_urls": 1},
+        "education": {"fields": 1, "cited_urls": 1},
+        "career": {"fields": 1, "cited_urls": 1},
+        "reference": {"fields": 2, "cited_urls": 2},
+    }
+
+
+def test_uncited_results_do_not_count():
+    sections = {"education": [field("Degree", "Seoul National University")]}
+    assert section_yield(sections, RESULTS, cited_urls=["https://a"])["education"]["cited_urls"] == 0
+    assert section_yield(sections, RESULTS)["education"]["cited_urls"] == 1
+
+
+def record(stats, sections, yields, tool_rounds=4, searches=8, limited=False, country="Korea", runs=5):
+    for _ in range(runs):
+        stats.record_run(sections, country, tool_rounds=tool_rounds, searches=searches, limited=limited, yields=yields)
+
+
+def test_recommendations_differ_per_section():
+    stats = SearchStats(path=None, alpha=1.0)
+    record(stats, ["main_particulars", "career"], {"main_particulars": {"fields": 4, "cited_urls": 8},
+                                                   "career": {"fields": 10, "cited_urls": 48}})
+    assert stats.recommend(["main_particulars"], "Korea") == {"max_results": 2, "max_tool_rounds": 5}
+    assert stats.recommend(["main_particulars", "career"], "Korea") == {"max_results": 8, "max_tool_rounds": 5}
+
+
+def test_limited_runs_add_a_round_only_while_the_section_fills():
+    stats = SearchStats(path=None, alpha=1.0)
+    record(stats, ["languages", "career"], {"languages": {"fields": 0, "cited_urls": 0},
+                                            "career": {"fields": 3, "cited_urls": 8}}, limited=True)
+    assert stats.recommend(["languages"], "Korea")["max_tool_rounds"] == 5
+    assert stats.recommend(["career"], "Korea")["max_tool_rounds"] == 6
+
+
+def test_history_needs_enough_runs_and_falls_back_to_all_countries():
+    stats = SearchStats(path=None, alpha=1.0)
+    record(stats, ["career"], {"career": {"fields": 3, "cited_urls": 8}}, runs=Config.SEARCH_ADAPTIVE_MIN_RUNS - 1)
+    assert stats.recommend(["career"], "Korea") is None
+    record(stats, ["career"], {"career": {"fields": 3, "cited_urls": 8}}, country="Japan", runs=1)
+    assert stats.get_entry("career", "Korea")["runs"] == Config.SEARCH_ADAPTIVE_MIN_RUNS
+    assert stats.recommend(["career"], "Singapore") is not None
+
+
+def test_entries_without_the_tracked_figures_are_ignored():
+    stats = SearchStats(path=None)
+    stats._entries = {SearchStats.make_key("career", "*"): {"runs": 50, "tool_rounds": 3, "unique_urls_per_search": 4}}
+    assert stats.recommend(["career"], "Korea") is None
+
+
+def test_statistics_are_persisted(tmp_path):
+    path = str(tmp_path / "stats.json")
+    record(SearchStats(path=path), ["career"], {"career": {"fields": 3, "cited_urls": 8}})
+    assert SearchStats(path=path).get_entry("career", "Korea")["runs"] == 5
+
+
+@pytest.fixture
+def history():
+    stats = SearchStats(path=None, alpha=1.0)
+    record(stats, ["career"], {"career": {"fields": 3, "cited_urls": 8}}, tool_rounds=8)
+    return stats
+
+
+def test_adapt_profile_trims_within_the_profile_limits(history):
+    thorough = Config.EXECUTION_PROFILES["thorough"]
+    adapted = adapt_profile(thorough, ["career"], "Korea", stats=history)
+    assert adapted["max_results"] == Config.SEARCH_ADAPTIVE_MIN_RESULTS
+    assert adapted["max_tool_rounds"] == 10
+    fast = adapt_profile(Config.EXECUTION_PROFILES["fast"], ["career"], "Korea", stats=history)
+    assert fast["max_tool_rounds"] == 2
+
+
+def test_adapt_profile_keeps_unlimited_rounds_unlimited(history):
+    adapted = adapt_profile(Config.EXECUTION_PROFILES["balanced"], ["career"], "Korea", stats=history)
+    assert adapted["max_tool_rounds"] is None
+    assert adapted["max_results"] == Config.SEARCH_ADAPTIVE_MIN_RESULTS
+
+
+def test_adapt_profile_without_history_returns_the_profile():
+    profile = Config.EXECUTION_PROFILES["balanced"]
+    assert adapt_profile(profile, ["career"], "Korea", stats=SearchStats(path=None)) is profile
+
+
+def test_warmup_profiles_are_the_adapted_profiles_requests_use(history):
+    record(history, ["main_particulars", "career", "reference"], {"career": {"fields": 9, "cited_urls": 40}},
+           country="Japan", tool_rounds=2, runs=6)
+    assert history.countries() == ["japan", "korea"]
+
+    profiles = [Config.EXECUTION_PROFILES["fast"], Config.EXECUTION_PROFILES["thorough"]]
+    warmed = warmup_profiles(profiles, limit=10, stats=history)
+    for country in ("Japan", "Korea", "Singapore"):
+        for profile in profiles:
+            assert adapt_profile(profile, list(profile["sections"]), country, stats=history) in warmed
+    assert len(warmup_profiles(profiles, limit=1, stats=history)) == 1
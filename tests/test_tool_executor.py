@@ -0,0 +1,180 @@
+import json
+import threading
+import time
+
+import pytest
+import requests
+from langchain_core.messages import AIMessage
+from langchain_core.tools import BaseTool, tool
+from langchain_tavily import TavilySearch
+from langgraph.graph import END, START, MessagesState, StateGraph
+from requests.adapters import BaseAdapter
+
+import circuit_breaker
+import transport
+from tool_executor import ConcurrentToolNode, RateLimiter, SearchCache
+
+calls = []
+calls_lock = threading.Lock()
+
+
+@tool
+def slow_search(query: str) -> str:
+    """Search that takes a while"""
+    with calls_lock:
+        calls.append(query)
+    time.sleep(0.3)
+    return f"result for {query}"
+
+
+@tool
+def stuck_search(query: str) -> str:
+    """Search that never returns in time"""
+    time.sleep(1.0)
+    return "late"
+
+
+def make_turn(tool_name, queries):
+    return {"messages": [AIMessage(content="", tool_calls=[
+        {"name": tool_name, "args": {"query": query}, "id": f"call-{index}"} for index, query in enumerate(queries)])]}
+
+
+def make_node(tools, **kwargs):
+    return ConcurrentToolNode(tools, cache=SearchCache(), rate_limiter=RateLimiter(0), **kwargs)
+
+
+def run_turn(node, tool_name, queries):
+    """Run the node as the only step of a graph and return its tool messages"""
+    builder = StateGraph(MessagesState)
+    builder.add_node("tools", node)
+    builder.add_edge(START, "tools")
+    builder.add_edge("tools", END)
+    return builder.compile().invoke(make_turn(tool_name, queries))["messages"][1:]
+
+
+def setup_function():
+    calls.clear()
+
+
+def test_calls_of_one_turn_run_concurrently_in_order():
+    node = make_node([slow_search], max_workers=4)
+    started = time.monotonic()
+    messages = run_turn(node, "slow_search", ["a", "b", "c"])
+    assert time.monotonic() - started < 0.8
+    assert [message.content for message in messages] == ["result for a", "result for b", "result for c"]
+    assert [message.tool_call_id for message in messages] == ["call-0", "call-1", "call-2"]
+
+
+def test_duplicate_calls_run_once_and_cached_calls_not_at_all():
+    node = make_node([slow_search])
+    messages = run_turn(node, "slow_search", ["Same  query", "same query"])
+    assert calls == ["Same  query"]
+    assert [message.tool_call_id for message in messages] == ["call-0", "call-1"]
+    run_turn(node, "slow_search", ["SAME QUERY"])
+    assert len(calls) == 1
+
+
+def test_timed_out_calls_return_errors_and_replace_a_saturated_pool():
+    node = make_node([stuck_search], max_workers=2, call_timeout=0.2, max_abandoned=2)
+    first_pool = node.executor
+    messages = run_turn(node, "stuck_search", ["x", "y"])
+    assert all(message.status == "error" and "timed out" in message.content for message in messages)
+    assert node.executor is not first_pool
+
+
+class SizedSearch(BaseTool):
+    """Search whose result count is set on the instance, like TavilySearch"""
+
+    name: str = "sized_search"
+    description: str = "Search returning max_results results"
+    max_results: int = 5
+
+    def _run(self, query: str) -> str:
+        with calls_lock:
+            calls.append(query)
+        return ",".join(str(index) for index in range(self.max_results))
+
+
+def test_cache_is_not_shared_between_tool_settings():
+    cache = SearchCache()
+    fast = ConcurrentToolNode([SizedSearch(max_results=2)], cache=cache, rate_limiter=RateLimiter(0))
+    thorough = ConcurrentToolNode([SizedSearch(max_results=4)], cache=cache, rate_limiter=RateLimiter(0))
+    assert run_turn(fast, "sized_search", ["q"])[0].content == "0,1"
+    assert run_turn(thorough, "sized_search", ["q"])[0].content == "0,1,2,3"
+    assert run_turn(fast, "sized_search", ["q"])[0].content == "0,1"
+    assert calls == ["q", "q"]
+
+
+class StubAdapter(BaseAdapter):
+    """requests adapter answering every request with one status and JSON payload"""
+
+    def __init__(self, status_code, payload):
+        super().__init__()
+        self.status_code = status_code
+        self.payload = payload
+        self.sent = 0
+
+    def send(self, request, **kwargs):
+        self.sent += 1
+        response = requests.Response()
+        response.status_code = self.status_code
+        response._content = json.dumps(self.payload).encode("utf-8")
+        response.headers["Content-Type"] = "application/json"
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def tavily(monkeypatch):
+    """Route Tavily calls to a StubAdapter behind a fresh breaker; returns a function setting the answer"""
+    monkeypatch.setitem(circuit_breaker.breakers, "tavily", circuit_breaker.CircuitBreaker("tavily", open_seconds=60))
+    session = requests.Session()
+    monkeypatch.setattr(transport, "_tavily_session", session)
+
+    def answer(status_code, payload):
+        adapter = StubAdapter(status_code, payload)
+        session.mount("https://", adapter)
+        return adapter
+    return answer
+
+
+def search_tool(tool_class=transport.PooledTavilySearch):
+    return tool_class(max_results=2, api_wrapper=transport.PooledTavilySearchAPIWrapper(tavily_api_key="key"))
+
+
+SEARCH_PAYLOAD = {"query": "q", "results": [{"title": "Profile", "url": "https://example.org", "content": "Minister"}]}
+
+
+@pytest.mark.parametrize("tool_class", [transport.PooledTavilySearch, TavilySearch])
+def test_failed_tavily_search_is_not_cached(tavily, tool_class):
+    tavily(400, {"detail": {"error": "Invalid API key"}})
+    cache = SearchCache()
+    node = ConcurrentToolNode([search_tool(tool_class)], cache=cache, rate_limiter=RateLimiter(0))
+
+    message = run_turn(node, "tavily_search", ["q"])[0]
+    assert "Invalid API key" in message.content
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_open_circuit_serves_the_last_cached_search(tavily):
+    adapter = tavily(200, SEARCH_PAYLOAD)
+    cache = SearchCache(ttl_seconds=0)
+    node = ConcurrentToolNode([search_tool()], cache=cache, rate_limiter=RateLimiter(0))
+    good = run_turn(node, "tavily_search", ["q"])[0]
+    assert "Minister" in good.content
+
+    breaker = circuit_breaker.get_breaker("tavily")
+    for _ in range(breaker.min_calls):
+        breaker.record_failure()
+    assert breaker.is_open()
+
+    served = run_turn(node, "tavily_search", ["q"])[0]
+    assert served.content == good.content
+    assert served.status == "success"
+    assert adapter.sent == 1
+    assert breaker.get_stats()["rejected"] == 1
+    assert run_turn(node, "tavily_search", ["q"])[0].content == good.content
@@ -0,0 +1,111 @@
+import types
+
+import httpx
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+import circuit_breaker
+import transport
+
+
+class StubAdapter(BaseAdapter):
+    """requests adapter answering with the given statuses in turn, the last one repeated"""
+
+    def __init__(self, *responses):
+        super().__init__()
+        self.responses = list(responses)
+        self.sent = 0
+
+    def send(self, request, **kwargs):
+        status_code, headers = self.responses[min(self.sent, len(self.responses) - 1)]
+        self.sent += 1
+        response = requests.Response()
+        response.status_code = status_code
+        response.headers.update(headers)
+        response._content = b"{}"
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record backoff sleeps instead of sleeping, behind a fresh breaker per dependency"""
+    delays = []
+    monkeypatch.setattr(transport, "time", types.SimpleNamespace(sleep=delays.append))
+    for name in ("llmaas", "tavily"):
+        monkeypatch.setitem(circuit_breaker.breakers, name, circuit_breaker.CircuitBreaker(name, min_calls=100))
+    return delays
+
+
+def mock_transport(*responses):
+    """RetryTransport over an httpx.MockTransport answering with the given (status, headers) in turn"""
+    sent = []
+
+    def handler(request):
+        status_code, headers = responses[min(len(sent), len(responses) - 1)]
+        sent.append(request)
+        return httpx.Response(status_code, headers=headers)
+
+    retrying = transport.RetryTransport("llmaas", max_retries=2)
+    retrying._transport = httpx.MockTransport(handler)
+    return httpx.Client(transport=retrying, base_url="https://llmaas.test"), sent
+
+
+def tavily_session(monkeypatch, *responses):
+    adapter = StubAdapter(*responses)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    monkeypatch.setattr(transport, "_tavily_session", session)
+    return adapter
+
+
+def test_backoff_honours_retry_after_within_the_cap():
+    assert transport.backoff_delay(0, "3", cap=10) == 3
+    assert transport.backoff_delay(0, "120", cap=10) == 10
+    assert 0 <= transport.backoff_delay(3, "Wed, 21 Oct 2015 07:28:00 GMT", base=0.5, cap=10) <= 4
+
+
+def test_httpx_retries_429_and_5xx_until_success(sleeps):
+    client, sent = mock_transport((429, {"Retry-After": "2"}), (503, {}), (200, {}))
+    assert client.post("/chat").status_code == 200
+    assert len(sent) == 3
+    assert len(sleeps) == 2 and sleeps[0] == 2
+
+
+def test_httpx_does_not_retry_4xx(sleeps):
+    client, sent = mock_transport((400, {}), (200, {}))
+    assert client.post("/chat").status_code == 400
+    assert len(sent) == 1 and sleeps == []
+    assert circuit_breaker.get_breaker("llmaas").get_stats()["failures"] == 0
+
+
+def test_httpx_gives_up_after_the_retry_limit(sleeps):
+    client, sent = mock_transport((502, {}))
+    assert client.post("/chat").status_code == 502
+    assert len(sent) == 3 and len(sleeps) == 2
+    assert circuit_breaker.get_breaker("llmaas").get_stats()["failures"] == 1
+
+
+def test_requests_retries_429_and_5xx_until_success(sleeps, monkeypatch):
+    adapter = tavily_session(monkeypatch, (429, {"Retry-After": "1"}), (500, {}), (200, {}))
+    response = transport.post_with_retry("https://tavily.test/search", max_retries=3, json={})
+    assert response.status_code == 200
+    assert adapter.sent == 3 and sleeps[0] == 1
+
+
+def test_requests_does_not_retry_4xx(sleeps, monkeypatch):
+    adapter = tavily_session(monkeypatch, (401, {}), (200, {}))
+    assert transport.post_with_retry("https://tavily.test/search", max_retries=3, json={}).status_code == 401
+    assert adapter.sent == 1 and sleeps == []
+
+
+def test_requests_gives_up_after_the_retry_limit(sleeps, monkeypatch):
+    adapter = tavily_session(monkeypatch, (503, {}))
+    assert transport.post_with_retry("https://tavily.test/search", max_retries=1, json={}).status_code == 503
+    assert adapter.sent == 2 and len(sleeps) == 1
+    assert circuit_breaker.get_breaker("tavily").get_stats()["failures"] == 1
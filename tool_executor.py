@@ -0,0 +1,246 @@
+import contextvars
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables.config import get_config_list
+from langgraph.prebuilt import ToolNode
+
+#Logging
+import customLogging
+
+#Custom imports
+from config import Config
+
+logger = customLogging.safe_logger_setup()
+
+
+# Tool instance attributes that change what a search returns without being call arguments
+TOOL_SETTINGS = ("max_results", "search_depth", "topic")
+
+
+class SearchCache:
+    """Thread-safe TTL cache of tool results keyed on tool name, arguments and tool settings"""
+
+    def __init__(self, ttl_seconds: float = Config.SEARCH_CACHE_TTL, max_entries: int = Config.SEARCH_CACHE_MAXENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(tool_name: str, args: Dict[str, Any], settings: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Build a cache key that ignores argument order and query casing/whitespace
+
+        settings are the TOOL_SETTINGS of the tool instance, so that e.g. a 5-result basic
+        search of the fast profile is not served to a graph asking for 10 advanced results.
+        """
+        normalised = dict(args)
+        if isinstance(normalised.get("query"), str):
+            normalised["query"] = " ".join(normalised["query"].lower().split())
+        return f"{tool_name}:{json.dumps(normalised, sort_keys=True, default=str)}:{json.dumps(settings or {}, sort_keys=True, default=str)}"
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def get_stale(self, key: str) -> Optional[Any]:
+        """Return an entry even when it has expired, for use while the search dependency is down"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry is not None else None
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            if len(self._entries) >= self.max_entries and key not in self._entries:
+                # Drop the oldest entry (dicts keep insertion order)
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (time.monotonic(), value)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class RateLimiter:
+    """Enforce a minimum interval between call starts across all worker threads"""
+
+    def __init__(self, min_interval: float = Config.TAVILY_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.min_interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+# Shared across graphs so that warm containers reuse results and respect one rate limit
+search_cache = SearchCache()
+tavily_rate_limiter = RateLimiter()
+
+
+def _is_error_result(message: ToolMessage) -> bool:
+    """
+    Whether a tool message reports a failure rather than a result
+
+    Besides error status, recognises the {"error": ...} payload stock Tavily tools return
+    instead of raising, both as JSON and as the repr ToolNode makes of a dict holding
+    an exception, e.g. "{'error': CircuitOpenError(...)}".
+    """
+    if getattr(message, "status", None) == "error":
+        return True
+    if isinstance(message.content, str) and message.content.startswith("{'error':"):
+        return True
+    try:
+        payload = json.loads(message.content) if isinstance(message.content, str) else None
+    except ValueError:
+        return False
+    return isinstance(payload, dict) and "error" in payload
+
+
+class ConcurrentToolNode(ToolNode):
+    """
+    ToolNode that runs all tool calls of one assistant turn on a bounded worker pool
+
+    Results are returned in the order of the tool calls. Identical calls within a turn
+    are executed once, cached results are served without a network round-trip and
+    every call that does go out waits for the shared rate limiter. A call that fails,
+    e.g. while the Tavily circuit is open, is answered with its last cached result,
+    expired or not, when there is one.
+
+    A call that times out cannot be interrupted and keeps its worker until the HTTP
+    client gives up. Once max_abandoned such calls are still running, the pool is
+    replaced so that new turns get free workers; the old threads exit when their
+    calls return.
+    """
+
+    def __init__(self, tools, max_workers: int = Config.TOOL_MAX_WORKERS, call_timeout: float = Config.TOOL_CALL_TIMEOUT,
+                 cache: Optional[SearchCache] = search_cache, rate_limiter: Optional[RateLimiter] = tavily_rate_limiter,
+                 max_abandoned: int = Config.TOOL_MAX_ABANDONED, **kwargs):
+        super().__init__(tools, **kwargs)
+        self.max_workers = max_workers
+        self.call_timeout = call_timeout
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.max_abandoned = max(1, min(max_abandoned, max_workers))
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        self._abandoned: set = set()
+        self._pool_lock = threading.Lock()
+
+    def _abandon(self, future):
+        """Track a timed-out call that still holds a worker, replacing the pool once too many do"""
+        with self._pool_lock:
+            if future.done():
+                return
+            self._abandoned.add(future)
+            if len(self._abandoned) < self.max_abandoned:
+                future.add_done_callback(self._abandoned.discard)
+                return
+            logger.warning(f"{len(self._abandoned)} timed-out tool calls still hold workers, replacing the tool worker pool")
+            self._abandoned.clear()
+            self.executor.shutdown(wait=False)
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool")
+
+    def _tool_settings(self, tool_name: str) -> Dict[str, Any]:
+        tool = self.tools_by_name.get(tool_name)
+        return {name: getattr(tool, name) for name in TOOL_SETTINGS if getattr(tool, name, None) is not None}
+
+    def _run_limited(self, call, input_type, config, started: Dict[int, float], index: int) -> ToolMessage:
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+        started[index] = time.monotonic()
+        return self._run_one(call, input_type, config)
+
+    def _wait_with_timeouts(self, futures: Dict[int, Any], started: Dict[int, float]) -> set:
+        """Wait for all futures, giving each call its own timeout from the moment it started. Returns timed-out indexes"""
+        timed_out = set()
+        pending = {index: future for index, future in futures.items()}
+        while pending:
+            now = time.monotonic()
+            for index in list(pending):
+                if pending[index].done():
+                    del pending[index]
+                elif index in started and now - started[index] >= self.call_timeout:
+                    timed_out.add(index)
+                    del pending[index]
+            if pending:
+                wait(set(pending.values()), timeout=0.1, return_when=FIRST_COMPLETED)
+        return timed_out
+
+    def _func(self, input, config, *, store=None) -> Any:
+        tool_calls, input_type = self._parse_input(input, store)
+        logger.info(f"Executing {len(tool_calls)} tool call(s) concurrently")
+        start = time.monotonic()
+
+        outputs: List[Optional[ToolMessage]] = [None] * len(tool_calls)
+        futures = {}
+        started: Dict[int, float] = {}
+        pending_keys = {}
+        # One config per call, as the stock ToolNode does, so each tool run gets its own run id and callbacks
+        config_list = get_config_list(config, len(tool_calls))
+        keys = [SearchCache.make_key(call["name"], call.get("args", {}), self._tool_settings(call["name"]))
+                for call in tool_calls]
+        for index, call in enumerate(tool_calls):
+            key = keys[index]
+            cached = self.cache.get(key) if self.cache else None
+            if cached is not None:
+                logger.info(f"Search cache hit for tool call {call['id']}")
+                outputs[index] = ToolMessage(content=cached, name=call["name"], tool_call_id=call["id"])
+            elif key in pending_keys:
+                futures[index] = futures[pending_keys[key]]
+            else:
+                pending_keys[key] = index
+                # Run in a copy of the caller's context so per-transaction state (profiling spans) follows the call
+                futures[index] = self.executor.submit(contextvars.copy_context().run, self._run_limited, call, input_type,
+                                                      config_list[index], started, index)
+
+        timed_out = self._wait_with_timeouts({index: futures[index] for index in pending_keys.values()}, started)
+        for index in timed_out:
+            self._abandon(futures[index])
+
+        for index, future in futures.items():
+            call = tool_calls[index]
+            if pending_keys[keys[index]] in timed_out:
+                # The worker thread cannot be interrupted; its late result is discarded
+                logger.warning(f"Tool call {call['id']} timed out after {self.call_timeout} seconds")
+                outputs[index] = ToolMessage(content=f"Error: {call['name']} timed out after {self.call_timeout} seconds",
+                                             name=call["name"], tool_call_id=call["id"], status="error")
+                continue
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Tool call {call['id']} failed: {str(e)}")
+                result = ToolMessage(content=f"Error: {repr(e)}", name=call["name"], tool_call_id=call["id"], status="error")
+            if _is_error_result(result) and self.cache:
+                stale = self.cache.get_stale(keys[index])
+                if stale is not None:
+                    logger.warning(f"Tool call {call['id']} failed, serving the last cached result")
+                    outputs[index] = ToolMessage(content=stale, name=call["name"], tool_call_id=call["id"])
+                    continue
+            if pending_keys[keys[index]] != index:
+                # Duplicate call within this turn: reuse the result under this call's own id
+                result = ToolMessage(content=result.content, name=call["name"], tool_call_id=call["id"], status=result.status)
+            elif self.cache and not _is_error_result(result):
+                self.cache.put(keys[index], result.content)
+            outputs[index] = result
+
+        logger.info(f"Tool round completed in {time.monotonic() - start:.2f} seconds")
+        return self._combine_tool_outputs(outputs, input_type)
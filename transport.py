@@ -0,0 +1,373 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from langchain_core.tools import ToolException
+from langchain_tavily import TavilyExtract, TavilySearch
+from langchain_tavily._utilities import TavilyExtractAPIWrapper, TavilySearchAPIWrapper
+
+#Logging
+import customLogging
+
+#Custom imports
+from config import Config
+import profiling
+import circuit_breaker
+
+logger = customLogging.safe_logger_setup()
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+LLM_TIMEOUT = httpx.Timeout(Config.HTTP_READ_TIMEOUT, connect=Config.HTTP_CONNECT_TIMEOUT)
+
+
+class TransportMetrics:
+    """Thread-safe request and retry counters, grouped by dependency name"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, Any]] = {}
+
+    def _target(self, target: str) -> Dict[str, Any]:
+        return self._counters.setdefault(target, {
+            "requests": 0,
+            "attempts": 0,
+            "retries": 0,
+            "retries_exhausted": 0,
+            "transport_errors": 0,
+            "backoff_seconds": 0.0,
+            "status_codes": {},
+        })
+
+    def record_attempt(self, target: str, status_code: Optional[int] = None, error: bool = False):
+        with self._lock:
+            counters = self._target(target)
+            counters["attempts"] += 1
+            if error:
+                counters["transport_errors"] += 1
+            if status_code is not None:
+                counters["status_codes"][status_code] = counters["status_codes"].get(status_code, 0) + 1
+
+    def record_request(self, target: str):
+        with self._lock:
+            self._target(target)["requests"] += 1
+
+    def record_retry(self, target: str, delay: float):
+        with self._lock:
+            counters = self._target(target)
+            counters["retries"] += 1
+            counters["backoff_seconds"] += delay
+
+    def record_exhausted(self, target: str):
+        with self._lock:
+            self._target(target)["retries_exhausted"] += 1
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {target: {**counters, "status_codes": dict(counters["status_codes"])}
+                    for target, counters in self._counters.items()}
+
+
+transport_metrics = TransportMetrics()
+
+
+def backoff_delay(attempt: int, retry_after: Optional[str] = None,
+                  base: float = Config.HTTP_BACKOFF_BASE, cap: float = Config.HTTP_BACKOFF_MAX) -> float:
+    """
+    Compute the wait before the next attempt using full-jitter exponential backoff
+
+    Args:
+        attempt: Zero-based index of the attempt that just failed
+        retry_after: Value of the Retry-After header, honoured when it is a number of seconds
+    Returns:
+        float: Seconds to sleep
+    """
+    if retry_after:
+        try:
+            return min(cap, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RetryTransport(httpx.BaseTransport):
+    """
+    httpx transport with a keep-alive connection pool and bounded retries on 429/5xx and connection errors
+
+    Each request goes through the circuit breaker of target and fails fast with
+    circuit_breaker.CircuitOpenError while that circuit is open.
+    """
+
+    def __init__(self, target: str, max_retries: int = Config.HTTP_MAX_RETRIES, limits: Optional[httpx.Limits] = None):
+        self.target = target
+        self.max_retries = max_retries
+        self._transport = httpx.HTTPTransport(limits=limits or httpx.Limits(), retries=0)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        breaker = circuit_breaker.get_breaker(self.target)
+        breaker.before_call()
+        try:
+            response = self._send_with_retries(request, breaker)
+        except circuit_breaker.CircuitOpenError:
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        if response.status_code in RETRY_STATUS_CODES:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    def _send_with_retries(self, request: httpx.Request, breaker: circuit_breaker.CircuitBreaker) -> httpx.Response:
+        transport_metrics.record_request(self.target)
+        for attempt in range(self.max_retries + 1):
+            try:
+                with profiling.span(f"network:{self.target}"):
+                    response = self._transport.handle_request(request)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError) as e:
+                transport_metrics.record_attempt(self.target, error=True)
+                if attempt >= self.max_retries:
+                    transport_metrics.record_exhausted(self.target)
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning(f"{self.target} transport error ({e.__class__.__name__}), retrying in {delay:.2f} seconds")
+            else:
+                transport_metrics.record_attempt(self.target, status_code=response.status_code)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    return response
+                if attempt >= self.max_retries:
+                    transport_metrics.record_exhausted(self.target)
+                    return response
+                delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+                response.close()
+                logger.warning(f"{self.target} returned HTTP {response.status_code}, retrying in {delay:.2f} seconds")
+            if breaker.is_open():
+                # Other requests have opened the circuit meanwhile; stop retrying
+                raise breaker.open_error()
+            transport_metrics.record_retry(self.target, delay)
+            time.sleep(delay)
+
+    def open_connection(self, url: str):
+        """Open a pooled keep-alive connection to url with a HEAD request, bypassing retries and the circuit breaker"""
+        response = self._transport.handle_request(httpx.Request("HEAD", url))
+        response.read()
+        response.close()
+
+    def close(self):
+        self._transport.close()
+
+    def get_pool_stats(self) -> Dict[str, int]:
+        connections = getattr(self._transport._pool, "connections", [])
+        return {
+            "connections": len(connections),
+            "idle_connections": sum(1 for connection in connections if connection.is_idle()),
+        }
+
+
+_clients_lock = threading.Lock()
+_llm_http_client: Optional[httpx.Client] = None
+_tavily_session: Optional[requests.Session] = None
+
+
+def get_llm_http_client() -> httpx.Client:
+    """Return the process-wide pooled httpx client used for LLMaaS calls"""
+    global _llm_http_client
+    with _clients_lock:
+        if _llm_http_client is None:
+            logger.info("Creating pooled LLMaaS HTTP client")
+            limits = httpx.Limits(
+                max_connections=Config.HTTP_POOL_MAXSIZE,
+                max_keepalive_connections=Config.HTTP_POOL_MAXSIZE,
+                keepalive_expiry=Config.HTTP_KEEPALIVE_EXPIRY,
+            )
+            _llm_http_client = httpx.Client(
+                transport=RetryTransport("llmaas", limits=limits),
+                timeout=LLM_TIMEOUT,
+            )
+        return _llm_http_client
+
+
+def get_tavily_session() -> requests.Session:
+    """Return the process-wide pooled requests session used for Tavily calls"""
+    global _tavily_session
+    with _clients_lock:
+        if _tavily_session is None:
+            logger.info("Creating pooled Tavily HTTP session")
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=Config.HTTP_POOL_MAXSIZE, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _tavily_session = session
+        return _tavily_session
+
+
+def post_with_retry(url: str, target: str = "tavily", max_retries: int = Config.HTTP_MAX_RETRIES, **kwargs) -> requests.Response:
+    """
+    POST through the pooled Tavily session, retrying 429/5xx and connection errors with jittered backoff
+
+    The call goes through the circuit breaker of target and raises
+    circuit_breaker.CircuitOpenError without a request while that circuit is open.
+
+    Args:
+        url: Full request URL
+        target: Dependency name used in the metrics
+        kwargs: Passed on to requests (json, headers, ...)
+    Returns:
+        requests.Response: The last response received
+    """
+    breaker = circuit_breaker.get_breaker(target)
+    breaker.before_call()
+    try:
+        response = _post_with_retries(url, target, max_retries, breaker, **kwargs)
+    except circuit_breaker.CircuitOpenError:
+        raise
+    except Exception:
+        breaker.record_failure()
+        raise
+    if response.status_code in RETRY_STATUS_CODES:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return response
+
+
+def _post_with_retries(url: str, target: str, max_retries: int, breaker: circuit_breaker.CircuitBreaker,
+                       **kwargs) -> requests.Response:
+    session = get_tavily_session()
+    kwargs.setdefault("timeout", (Config.HTTP_CONNECT_TIMEOUT, Config.TAVILY_READ_TIMEOUT))
+    transport_metrics.record_request(target)
+    for attempt in range(max_retries + 1):
+        try:
+            with profiling.span(f"network:{target}"):
+                response = session.post(url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            transport_metrics.record_attempt(target, error=True)
+            if attempt >= max_retries:
+                transport_metrics.record_exhausted(target)
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"{target} transport error ({e.__class__.__name__}), retrying in {delay:.2f} seconds")
+        else:
+            transport_metrics.record_attempt(target, status_code=response.status_code)
+            if response.status_code not in RETRY_STATUS_CODES:
+                return response
+            if attempt >= max_retries:
+                transport_metrics.record_exhausted(target)
+                return response
+            delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+            logger.warning(f"{target} returned HTTP {response.status_code}, retrying in {delay:.2f} seconds")
+        if breaker.is_open():
+            # Other requests have opened the circuit meanwhile; stop retrying
+            raise breaker.open_error()
+        transport_metrics.record_retry(target, delay)
+        time.sleep(delay)
+
+
+def _tavily_post(endpoint: str, api_key: str, params: Dict[str, Any]) -> Dict:
+    """Call a Tavily endpoint and raise the same errors as the stock langchain_tavily wrappers"""
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "X-Client-Source": "langchain-tavily",
+    }
+    params = {k: v for k, v in params.items() if v is not None}
+    response = post_with_retry(f"{Config.TAVILY_BASEURL}/{endpoint}", json=params, headers=headers)
+    if response.status_code != 200:
+        detail = response.json().get("detail", {})
+        error_message = detail.get("error") if isinstance(detail, dict) else "Unknown error"
+        raise ValueError(f"Error {response.status_code}: {error_message}")
+    return response.json()
+
+
+class PooledTavilySearchAPIWrapper(TavilySearchAPIWrapper):
+    """Tavily search wrapper that goes through the pooled, retrying session"""
+
+    def raw_results(self, query: str, **kwargs) -> Dict:
+        return _tavily_post("search", self.tavily_api_key.get_secret_value(), {"query": query, **kwargs})
+
+
+class PooledTavilyExtractAPIWrapper(TavilyExtractAPIWrapper):
+    """Tavily extract wrapper that goes through the pooled, retrying session"""
+
+    def raw_results(self, urls, **kwargs) -> Dict:
+        return _tavily_post("extract", self.tavily_api_key.get_secret_value(), {"urls": urls, **kwargs})
+
+
+class RaisingTavilyTool:
+    """
+    Raise ToolException for the failures the stock Tavily tools return as {"error": exception}
+
+    The stock tools catch HTTP errors, timeouts and CircuitOpenError and return them as
+    a dict, which ToolNode turns into a successful ToolMessage holding the dict's repr.
+    Raising instead gives an error ToolMessage, which is never cached and is answered
+    with the last cached result when there is one. The original error stays the cause.
+    """
+
+    def _run(self, *args, **kwargs):
+        return self._raise_error(super()._run(*args, **kwargs))
+
+    async def _arun(self, *args, **kwargs):
+        return self._raise_error(await super()._arun(*args, **kwargs))
+
+    def _raise_error(self, result):
+        if isinstance(result, dict) and isinstance(result.get("error"), BaseException):
+            raise ToolException(f"{self.name} failed: {result['error']}") from result["error"]
+        return result
+
+
+class PooledTavilySearch(RaisingTavilyTool, TavilySearch):
+    """TavilySearch that raises its failures; pass a PooledTavilySearchAPIWrapper as api_wrapper"""
+
+
+class PooledTavilyExtract(RaisingTavilyTool, TavilyExtract):
+    """TavilyExtract that raises its failures; pass a PooledTavilyExtractAPIWrapper as apiwrapper"""
+
+
+def warm_connections(count: int = Config.WARMUP_CONNECTIONS) -> Dict[str, int]:
+    """
+    Create the shared clients and open count concurrent keep-alive connections to each dependency
+
+    Any HTTP response, whatever its status, leaves a connection in the pool; failures are
+    only counted, so a warm-up never opens a circuit.
+
+    Returns:
+        dict: Connections opened per dependency
+    """
+    llm_transport = get_llm_http_client()._transport
+    tavily_session = get_tavily_session()
+    timeout = (Config.HTTP_CONNECT_TIMEOUT, Config.TAVILY_READ_TIMEOUT)
+    openers = {
+        "llmaas": lambda: llm_transport.open_connection(Config.LLMAAS_BASEURL),
+        "tavily": lambda: tavily_session.head(Config.TAVILY_BASEURL, timeout=timeout).close(),
+    }
+    opened = {}
+    with ThreadPoolExecutor(max_workers=max(1, count) * len(openers)) as executor:
+        futures = {target: [executor.submit(opener) for _ in range(count)] for target, opener in openers.items()}
+        for target, target_futures in futures.items():
+            opened[target] = 0
+            for future in target_futures:
+                try:
+                    future.result()
+                    opened[target] += 1
+                except Exception as e:
+                    logger.warning(f"Could not open a {target} connection during warm-up: {str(e)}")
+    return opened
+
+
+def get_transport_stats() -> Dict[str, Any]:
+    """Return retry metrics, circuit states and current pool sizes of the shared clients"""
+    stats = {"targets": transport_metrics.get_stats(), "circuits": circuit_breaker.get_stats(), "pools": {}}
+    if _llm_http_client is not None:
+        stats["pools"]["llmaas"] = _llm_http_client._transport.get_pool_stats()
+    if _tavily_session is not None:
+        pools = _tavily_session.get_adapter("https://").poolmanager.pools
+        stats["pools"]["tavily"] = {
+            "hosts": len(pools),
+            "connections": sum(pools[key].num_connections for key in pools.keys()),
+        }
+    return stats